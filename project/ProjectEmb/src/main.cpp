@@ -25,6 +25,14 @@ const char* THINGSPEAK_SERVER  = "http://api.thingspeak.com/update";
 unsigned long lastSendMillis      = 0; 
 const unsigned long SEND_INTERVAL = 20000;
 
+// -------------------------------------------------------------
+// CAMERA TRIGGER WEBHOOK (camera/trigger.py TriggerServer)
+// -------------------------------------------------------------
+// A press is pushed to the camera box at once; ThingSpeak (every
+// SEND_INTERVAL) stays as the camera's fallback and de-duplicates it.
+const char* TRIGGER_URL   = "http://10.248.108.149:8088/trigger?source=esp32";
+const char* TRIGGER_TOKEN = "";   // camera TRIGGER_TOKEN, if set
+
 // -------------------------------------------------------------
 // PIN DEFINES
 // -------------------------------------------------------------
@@ -176,6 +184,25 @@ void sendToThingSpeak(int magnetic,
   http.end();
 }
 
+// -------------------------------------------------------------
+// PUSH A PRESS TO THE CAMERA BOX
+// -------------------------------------------------------------
+void sendTrigger() {
+  if (WiFi.status() != WL_CONNECTED) return;
+
+  HTTPClient http;
+  http.setTimeout(2000);
+  http.begin(TRIGGER_URL);
+  if (strlen(TRIGGER_TOKEN) > 0) http.addHeader("X-Trigger-Token", TRIGGER_TOKEN);
+
+  int code = http.POST("");
+  if (code != 202) {
+    Serial.print("Trigger push failed (ThingSpeak fallback will catch it): ");
+    Serial.println(code > 0 ? String(code) : http.errorToString(code));
+  }
+  http.end();
+}
+
 // -------------------------------------------------------------
 // CHECK LOCAL API FOR NEW CLASSIFIED IMAGE
 // -------------------------------------------------------------
@@ -310,6 +337,7 @@ void loop() {
       buttonLatched          = true;   // stays 1 until AI done
       itemProcessed          = true;
       aiDoneForCurrentItem   = false;  // new request
+      sendTrigger();                   // camera captures now, not at the next ThingSpeak poll
     } else {
       Serial.println("⚠ Button pressed with NO item on counter (will be abnormal).");
       // we do NOT latch button in this case
@@ -0,0 +1,234 @@
+import os
+import threading
+import time
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+# Long-lived webcam session for image_classifier_w_reading.py: the device
+# stays open and a background thread keeps the latest frame, so a trigger
+# is a memory copy instead of open + warm-up + release.
+#
+#   camera = CameraService().start()
+#   frame = camera.snapshot()      # BGR ndarray, or None if no fresh frame
+#   camera.stop()
+#
+# python3 camera_service.py simulates a device drop with a fake camera.
+
+CAMERA_INDICES = (0, 1, 2)          # probed in order when the cached index fails
+INDEX_CACHE_PATH = ".camera_index"  # last working index, tried first on (re)connect
+WARMUP_FRAMES = 10                  # discarded after opening while exposure settles
+MAX_FAILED_READS = 5                # consecutive failed reads before reconnecting
+RECONNECT_DELAY = 1.0               # first retry delay; doubles up to MAX_RECONNECT_DELAY
+MAX_RECONNECT_DELAY = 30.0
+MAX_FRAME_AGE = 1.0                 # seconds; older frames are not handed out
+
+
+class CameraService:
+    """
+    Keeps one capture device open and reads it continuously on a thread.
+
+    Frames are decoded into two preallocated buffers: the reader fills the
+    back buffer and swaps it to the front under a lock, and snapshot()
+    copies the front one, so a trigger never waits for the device and
+    never sees a half-written frame. If reads keep failing (unplugged,
+    driver reset) the device is released and reopened with backoff,
+    starting from the last index that worked.
+    """
+
+    def __init__(self, indices=CAMERA_INDICES, index_path=INDEX_CACHE_PATH, warmup_frames=WARMUP_FRAMES,
+                 max_failed_reads=MAX_FAILED_READS, reconnect_delay=RECONNECT_DELAY,
+                 max_reconnect_delay=MAX_RECONNECT_DELAY, open_device=None):
+        if open_device is None:
+            if cv2 is None:
+                raise ImportError("The camera service needs OpenCV: pip install opencv-python")
+            open_device = cv2.VideoCapture
+        self.indices = tuple(indices)
+        self.index_path = index_path
+        self.warmup_frames = warmup_frames
+        self.max_failed_reads = max_failed_reads
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.open_device = open_device
+
+        self.index = None
+        self._device = None
+        self._front = self._back = None
+        self._frame_time = None
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        self.frames = 0
+        self.connects = 0
+        self.failed_reads = 0
+        self.snapshots = 0
+
+    def start(self):
+        """Start the reader thread (no-op if it is already running)."""
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="camera-service", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._release()
+
+    # -------------------------
+    # device
+    # -------------------------
+    def _cached_index(self):
+        try:
+            with open(self.index_path) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _open(self):
+        cached = self._cached_index()
+        order = ([cached] if cached is not None else []) + [i for i in self.indices if i != cached]
+        for index in order:
+            device = self.open_device(index)
+            if device.isOpened():
+                self._device, self.index = device, index
+                self.connects += 1
+                if index != cached:
+                    with open(self.index_path, "w") as f:
+                        f.write(str(index))
+                print(f"📷 Camera {index} opened")
+                return True
+            device.release()
+        return False
+
+    def _release(self):
+        if self._device is not None:
+            self._device.release()
+            self._device = None
+
+    def _read(self):
+        ok, frame = self._device.read(self._back)
+        if not ok or frame is None:
+            return False
+        if frame is not self._back:  # first frame, or the resolution changed
+            self._back = frame
+        return True
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while self._running:
+            if self._device is None:
+                if not self._open():
+                    print(f"⚠️ No camera found on {self.indices}, retrying in {delay:.1f}s")
+                    with self._cond:
+                        self._cond.wait(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    continue
+                delay = self.reconnect_delay
+                for _ in range(self.warmup_frames):
+                    self._read()
+
+            failures = 0
+            while self._running and failures < self.max_failed_reads:
+                if not self._read():
+                    failures += 1
+                    self.failed_reads += 1
+                    continue
+                failures = 0
+                with self._cond:
+                    self._front, self._back = self._back, self._front
+                    self._frame_time = time.monotonic()
+                    self.frames += 1
+                    self._cond.notify_all()
+            if self._running:
+                print(f"⚠️ Camera {self.index} stopped delivering frames, reconnecting")
+                self._release()
+
+    # -------------------------
+    # snapshots
+    # -------------------------
+    def snapshot(self, timeout=2.0, max_age=MAX_FRAME_AGE):
+        """
+        Copy of the latest frame no older than `max_age` seconds, waiting up
+        to `timeout` for one (e.g. right after start or a reconnect).
+        Returns None if none arrives in time.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._frame_time is None or time.monotonic() - self._frame_time > max_age:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    return None
+                self._cond.wait(remaining)
+            self.snapshots += 1
+            return self._front.copy()
+
+    def stats(self):
+        age = None if self._frame_time is None else time.monotonic() - self._frame_time
+        return {
+            "index": self.index,
+            "connected": self._device is not None,
+            "frames": self.frames,
+            "connects": self.connects,
+            "failed_reads": self.failed_reads,
+            "snapshots": self.snapshots,
+            "frame_age_ms": None if age is None else round(age * 1000, 1),
+        }
+
+
+# =========================
+# DROP CHECK
+# =========================
+def simulate_drop():
+    """
+    Run the service against a fake camera, unplug it, plug it back in and
+    report snapshot latency before and after the reconnect.
+    """
+    import sys
+    import tempfile
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.fakes import FakeVideoCapture
+
+    FakeVideoCapture.devices = {1}  # index 0 missing, like a laptop with an external webcam
+    with tempfile.TemporaryDirectory() as tmp:
+        camera = CameraService(index_path=os.path.join(tmp, "index"), open_device=FakeVideoCapture,
+                               reconnect_delay=0.2).start()
+
+        def timed_snapshot():
+            start = time.perf_counter()
+            frame = camera.snapshot(timeout=5.0)
+            return frame, (time.perf_counter() - start) * 1000
+
+        first, first_ms = timed_snapshot()
+        _, warm_ms = timed_snapshot()
+        FakeVideoCapture.unplug()
+        time.sleep(MAX_FRAME_AGE + 0.2)
+        stale = camera.snapshot(timeout=0.1)  # the last frame is too old by now
+        FakeVideoCapture.plug()
+        after, after_ms = timed_snapshot()
+        _, warm_after_ms = timed_snapshot()
+        camera.stop()
+        return {
+            "first_snapshot_ms": round(first_ms, 1),
+            "warm_snapshot_ms": round(warm_ms, 2),
+            "snapshot_while_unplugged": stale is not None,
+            "snapshot_after_replug_ms": round(after_ms, 1),
+            "warm_snapshot_after_replug_ms": round(warm_after_ms, 2),
+            "cached_index": camera._cached_index(),
+            **camera.stats(),
+        }
+
+
+if __name__ == "__main__":
+    # python3 camera_service.py from the camera directory
+    print(simulate_drop())
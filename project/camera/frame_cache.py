@@ -0,0 +1,271 @@
+import collections
+import threading
+import time
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+# Skips classifications a capture does not need, for
+# image_classifier_w_reading.py and multicounter.py:
+#
+#   "empty"      the frame matches a photo of the empty counter (BACKGROUND_PATH)
+#   "unchanged"  the scene has not changed since the last classified frame
+#   "hash"       a perceptual hash (dHash) of the item is within a few bits
+#                of one classified in the last CACHE_TTL seconds (only with
+#                a background: a whole-frame hash is mostly counter, and
+#                different snacks land within a few bits of each other)
+#
+#   cache = FrameCache()
+#   cache.load_background("background.jpg")
+#   reason, result = cache.check(frame)       # (None, None) -> classify it
+#   cache.store(frame, {"label": ..., "raw_text": ..., "source": ..., "confidence": ...})
+#
+# python3 frame_cache.py replays a synthetic counter session and prints hit
+# rates, saved Gemini calls and wrong answers.
+
+THUMB_SIZE = (160, 120)    # px; frame differences and the item crop are taken at this size
+PIXEL_DIFF = 25            # grey levels; a thumbnail pixel differing by more has changed
+CHANGE_FRACTION = 0.01     # scenes with fewer changed pixels than this are "the same"
+HASH_SIZE = 8              # dHash grid: HASH_SIZE x HASH_SIZE bits
+MAX_HASH_DISTANCE = 10     # bits of 64; still the same item (other items measured 23+ apart)
+CACHE_TTL = 600.0          # seconds a cached result stays valid
+CACHE_SIZE = 256           # results kept (least recently used evicted first)
+
+
+def thumbnail(frame):
+    """Small blurred float32 colour copy used for frame differences."""
+    small = cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(small, (3, 3), 0).astype(np.float32)
+
+def changed_mask(a, b, pixel_diff=PIXEL_DIFF):
+    """
+    Pixels of two thumbnails that differ in any channel, after scaling `a`
+    to `b`'s brightness (auto exposure), so a snack the same grey level
+    as the counter but a different colour still counts.
+    """
+    gain = b.mean() / max(float(a.mean()), 1.0)
+    diff = np.abs(a * gain - b)
+    if diff.ndim == 3:
+        diff = diff.max(axis=2)
+    mask = (diff > pixel_diff).astype(np.uint8)
+    return cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))  # drop sensor speckle
+
+def dhash(gray, size=HASH_SIZE):
+    """64-bit difference hash of a greyscale image (brighter-than-right-neighbour bits)."""
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+# =========================
+# FRAME CACHE
+# =========================
+class FrameCache:
+    """
+    Frame-difference gate plus a perceptual-hash result cache.
+
+    With a background set, the hash is taken over the bounding box of what
+    differs from the empty counter, so it describes the item rather than
+    the (much larger, identical) counter around it; without one there is
+    no hash lookup, only the "unchanged" check. Lookups compare
+    against every unexpired entry (a few hundred XOR + popcounts), and a
+    hit refreshes the entry's place in the LRU order but not its TTL, so
+    a result is re-checked with the classifier at least every `ttl`
+    seconds.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_SIZE, max_distance=MAX_HASH_DISTANCE,
+                 change_fraction=CHANGE_FRACTION, pixel_diff=PIXEL_DIFF):
+        if cv2 is None:
+            raise ImportError("The frame cache needs OpenCV: pip install opencv-python")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.change_fraction = change_fraction
+        self.pixel_diff = pixel_diff
+        self.background = None
+        self._entries = collections.OrderedDict()  # hash -> (stored at, result)
+        self._last = None  # (thumbnail, stored at, result) of the last classified frame
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = {"empty": 0, "unchanged": 0, "hash": 0}
+        self.saved_gemini_calls = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def set_background(self, frame):
+        self.background = thumbnail(frame)
+
+    def load_background(self, path):
+        """Use the image at `path` as the empty counter. Returns False if it cannot be read."""
+        frame = cv2.imread(path) if path else None
+        if frame is None:
+            return False
+        self.set_background(frame)
+        return True
+
+    def _fraction(self, mask):
+        return float(mask.mean())
+
+    def _signature(self, frame, thumb):
+        """dHash of the region that differs from the background (the whole frame without one)."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        if self.background is not None:
+            ys, xs = np.nonzero(changed_mask(thumb, self.background, self.pixel_diff))
+            if len(xs):
+                sy = gray.shape[0] / THUMB_SIZE[1]
+                sx = gray.shape[1] / THUMB_SIZE[0]
+                y0, y1 = int(ys.min() * sy), int((ys.max() + 1) * sy)
+                x0, x1 = int(xs.min() * sx), int((xs.max() + 1) * sx)
+                gray = gray[y0:y1, x0:x1]
+        return dhash(gray)
+
+    def check(self, frame, now=None):
+        """
+        (reason, cached result) when `frame` needs no classification, else
+        (None, None). An empty counter returns ("empty", None).
+        """
+        now = time.monotonic() if now is None else now
+        thumb = thumbnail(frame)
+        with self._lock:
+            self.lookups += 1
+            if self.background is not None:
+                if self._fraction(changed_mask(thumb, self.background, self.pixel_diff)) < self.change_fraction:
+                    self.hits["empty"] += 1
+                    return "empty", None
+            if self._last is not None:
+                last_thumb, stored, result = self._last
+                if now - stored <= self.ttl and \
+                        self._fraction(changed_mask(thumb, last_thumb, self.pixel_diff)) < self.change_fraction:
+                    return self._hit("unchanged", result)
+
+            if self.background is None:
+                return None, None
+            signature = self._signature(frame, thumb)
+            best, best_distance = None, self.max_distance + 1
+            for key, (stored, result) in list(self._entries.items()):
+                if now - stored > self.ttl:
+                    del self._entries[key]
+                    self.expired += 1
+                    continue
+                distance = (key ^ signature).bit_count()
+                if distance < best_distance:
+                    best, best_distance = key, distance
+            if best is None:
+                return None, None
+            self._entries.move_to_end(best)
+            self._last = (thumb, self._entries[best][0], self._entries[best][1])
+            return self._hit("hash", self._entries[best][1])
+
+    def _hit(self, reason, result):
+        self.hits[reason] += 1
+        if result.get("source") == "gemini":
+            self.saved_gemini_calls += 1
+        return reason, result
+
+    def store(self, frame, result, now=None):
+        """Remember the classification of `frame` (label, raw_text, source, confidence)."""
+        now = time.monotonic() if now is None else now
+        thumb = thumbnail(frame)
+        with self._lock:
+            self._last = (thumb, now, dict(result))
+            if self.background is None:
+                return
+        signature = self._signature(frame, thumb)
+        with self._lock:
+            self._entries[signature] = (now, dict(result))
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def stats(self):
+        hits = sum(self.hits.values())
+        return {
+            "lookups": self.lookups,
+            **self.hits,
+            "misses": self.lookups - hits,
+            "hit_rate": round(hits / self.lookups, 3) if self.lookups else None,
+            "saved_gemini_calls": self.saved_gemini_calls,
+            "entries": len(self._entries),
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
+
+
+# =========================
+# SESSION REPLAY
+# =========================
+def simulate_session(presses=200, items=3, seed=0, with_background=True):
+    """
+    A synthetic counter: textured background, `items` distinct snacks put
+    down at random positions, with sensor noise and exposure drift between
+    frames. A press is on an empty counter 15% of the time, on the same
+    item as the previous press 50% of the time, otherwise on a random item.
+    Every miss is "classified" with the ground truth (as Gemini would) and
+    stored. Reports the cache stats and how many cached answers were wrong.
+    with_background=False runs without the empty-counter photo.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = 480, 640
+    yy, xx = np.mgrid[0:height, 0:width]
+    background = np.stack([(xx * 0.15 + 60), (yy * 0.1 + 80), np.full_like(xx, 90.0)], axis=2)
+    background += rng.normal(0, 12, (height // 8, width // 8, 1)).repeat(8, 0).repeat(8, 1)
+    snacks = []
+    for _ in range(items):
+        h, w = rng.integers(90, 160), rng.integers(90, 160)
+        texture = rng.integers(0, 256, (h // 10 + 1, w // 10 + 1, 3)).astype(np.float64)
+        snacks.append(cv2.resize(texture, (int(w), int(h)), interpolation=cv2.INTER_NEAREST))
+
+    def frame_of(item, position):
+        frame = background.copy()
+        if item is not None:
+            snack = snacks[item]
+            y, x = position
+            frame[y:y + snack.shape[0], x:x + snack.shape[1]] = snack
+        frame = frame * rng.uniform(0.93, 1.07) + rng.normal(0, 3, frame.shape)
+        return np.clip(frame, 0, 255).astype(np.uint8)
+
+    cache = FrameCache()
+    if with_background:
+        cache.set_background(frame_of(None, None))
+    item, position = None, None
+    wrong, classified, now = 0, 0, 0.0
+    timings = []
+    for _ in range(presses):
+        now += rng.uniform(5, 60)
+        roll = rng.random()
+        if roll < 0.15:
+            item = None
+        elif roll >= 0.65 or item is None:
+            item = int(rng.integers(items))
+            position = (int(rng.integers(40, 300)), int(rng.integers(40, 460)))
+        elif rng.random() < 0.3:  # nudged a little on the counter
+            position = (int(np.clip(position[0] + rng.integers(-8, 9), 40, 300)),
+                        int(np.clip(position[1] + rng.integers(-8, 9), 40, 460)))
+        frame = frame_of(item, position)
+        truth = "NONE" if item is None else f"snack_{item}"
+
+        start = time.perf_counter()
+        reason, result = cache.check(frame, now=now)
+        timings.append(time.perf_counter() - start)
+        if reason is not None:
+            answer = "NONE" if reason == "empty" else result["label"]
+            wrong += answer != truth
+            continue
+        classified += 1
+        cache.store(frame, {"label": truth, "raw_text": truth, "source": "gemini", "confidence": None}, now=now)
+    timings.sort()
+    return {**cache.stats(), "gemini_calls": classified, "wrong_cached_answers": wrong,
+            "check_ms_p50": round(timings[len(timings) // 2] * 1000, 2),
+            "check_ms_max": round(timings[-1] * 1000, 2)}
+
+
+if __name__ == "__main__":
+    # python3 frame_cache.py from the camera directory
+    print(simulate_session())
+    print(simulate_session(with_background=False))
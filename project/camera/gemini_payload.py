@@ -0,0 +1,260 @@
+import base64
+import hashlib
+import json
+import os
+import time
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+
+
+# Builds the generateContent request body for image_classifier_w_reading.py.
+#
+# Reference images are downscaled and re-encoded as JPEG once, cached on
+# disk under REF_CACHE_DIR (keyed by path, size, mtime and the encode
+# settings) and kept as a ready-serialized JSON fragment, so a request only
+# serializes the prompt and the (also downscaled) capture.
+#
+# python3 gemini_payload.py [capture.jpg] compares request sizes with the
+# old full-resolution payload.
+
+REF_MAX_SIDE = 768        # px; longest side of re-encoded reference images
+CAPTURE_MAX_SIDE = 1024   # px; longest side of the capture sent to Gemini
+JPEG_QUALITY = 85
+REF_CACHE_DIR = ".ref_cache"
+
+MIME_TYPES = {
+    ".jpg": "image/jpeg", ".jpeg": "image/jpeg",
+    ".png": "image/png", ".webp": "image/webp",
+}
+
+
+def encode_image(data, max_side, quality=JPEG_QUALITY, mime="image/jpeg"):
+    """
+    (mime, bytes) of an image downscaled so its longest side is at most
+    `max_side` and re-encoded as JPEG. Without OpenCV, or if the bytes do
+    not decode, the original is returned unchanged.
+    """
+    if cv2 is None:
+        return mime, data
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return mime, data
+    return "image/jpeg", encode_frame(image, max_side, quality)
+
+def encode_frame(image, max_side=None, quality=JPEG_QUALITY):
+    """JPEG bytes of a BGR frame, downscaled to at most `max_side` px (if given)."""
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width) if max_side else 1
+    if scale < 1:
+        image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buf.tobytes()
+
+def encode_capture(frame, max_side=CAPTURE_MAX_SIDE, quality=JPEG_QUALITY):
+    """
+    (upload JPEG, Gemini JPEG) for a captured frame, encoded in memory.
+    When the frame already fits in `max_side` (a 640x480 or 1024x768
+    webcam) both are the same buffer, encoded once.
+    """
+    full = encode_frame(frame, quality=quality)
+    if max(frame.shape[:2]) <= max_side:
+        return full, full
+    return full, encode_frame(frame, max_side, quality)
+
+
+# =========================
+# REFERENCE CACHE
+# =========================
+class ReferenceCache:
+    """
+    Reference images from ref/<label>/*, downscaled and encoded once.
+
+    `fragment` is the reference block of the request's parts list, already
+    serialized as JSON (without the enclosing brackets). load() re-checks
+    the files and only re-encodes the ones whose size or mtime changed;
+    encoded copies survive restarts in `cache_dir`.
+    """
+
+    def __init__(self, ref_dir, labels, cache_dir=REF_CACHE_DIR, max_side=REF_MAX_SIDE, quality=JPEG_QUALITY):
+        self.ref_dir = ref_dir
+        self.labels = labels
+        self.cache_dir = cache_dir
+        self.max_side = max_side
+        self.quality = quality
+        self.references = {}  # label -> [{"mimeType", "data"}], the shape REFERENCE_IMAGES had
+        self.fragment = ""
+        self.original_bytes = 0  # raw file bytes, as the old payload sent them
+        self.encoded_bytes = 0
+        self.encoded = 0  # images (re-)encoded by the last load()
+
+    def _key(self, path):
+        st = os.stat(path)
+        ident = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{self.max_side}|{self.quality}"
+        return hashlib.sha1(ident.encode()).hexdigest(), st.st_size
+
+    def _encoded(self, path, mime):
+        key, size = self._key(path)
+        cached = os.path.join(self.cache_dir, key + ".jpg")
+        if os.path.exists(cached):
+            with open(cached, "rb") as f:
+                return "image/jpeg", f.read(), size, key
+        with open(path, "rb") as f:
+            mime, data = encode_image(f.read(), self.max_side, self.quality, mime)
+        self.encoded += 1
+        if mime == "image/jpeg":
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = cached + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, cached)
+        return mime, data, size, key
+
+    def load(self):
+        self.references = {}
+        self.original_bytes = self.encoded_bytes = self.encoded = 0
+        used = set()
+        parts = []
+
+        if not os.path.isdir(self.ref_dir):
+            print(f"Warning: Reference directory '{self.ref_dir}' not found. No reference images loaded.")
+        for label in self.labels:
+            label_dir = os.path.join(self.ref_dir, label)
+            if not os.path.isdir(label_dir):
+                continue
+            refs = []
+            for fname in sorted(os.listdir(label_dir)):
+                fpath = os.path.join(label_dir, fname)
+                if not os.path.isfile(fpath):
+                    continue
+                mime = MIME_TYPES.get(os.path.splitext(fname)[1].lower())
+                if mime is None:
+                    print(f"Skipping unsupported file format: {fpath}")
+                    continue
+                try:
+                    mime, data, size, key = self._encoded(fpath, mime)
+                except Exception as e:
+                    print(f"Error loading ref image '{fpath}': {e}")
+                    continue
+                used.add(key + ".jpg")
+                self.original_bytes += size
+                self.encoded_bytes += len(data)
+                refs.append({"mimeType": mime, "data": base64.b64encode(data).decode("utf-8")})
+            if refs:
+                self.references[label] = refs
+                parts.append({"text": f"Reference images for '{label}':"})
+                parts.extend({"inlineData": ref} for ref in refs)
+                print(f"Loaded {len(refs)} reference images for label '{label}'.")
+
+        self.fragment = json.dumps(parts)[1:-1]
+        self._prune(used)
+        return self
+
+    def _prune(self, used):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name not in used:
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self):
+        return {
+            "images": sum(len(refs) for refs in self.references.values()),
+            "original_kb": round(self.original_bytes / 1024, 1),
+            "encoded_kb": round(self.encoded_bytes / 1024, 1),
+            "reencoded": self.encoded,
+        }
+
+
+# =========================
+# REQUEST BODY
+# =========================
+def build_body(prompt, image_mime, image_data, references_fragment, system_instruction, tools=None):
+    """
+    The generateContent request body as bytes. Only the prompt and the
+    capture are serialized here; the reference block is spliced in as is.
+    """
+    head = json.dumps([
+        {"text": prompt},
+        {"inlineData": {"mimeType": image_mime, "data": base64.b64encode(image_data).decode("utf-8")}},
+    ])[:-1]
+    parts = head + ("," + references_fragment if references_fragment else "") + "]"
+    rest = json.dumps({
+        "systemInstruction": {"parts": [{"text": system_instruction}]},
+        "tools": tools if tools is not None else [{"google_search": {}}],
+    })[1:]
+    return ('{"contents":[{"role":"user","parts":' + parts + "}]," + rest).encode("utf-8")
+
+def response_text(result):
+    """Concatenated text parts of a generateContent response's first candidate."""
+    candidate = (result.get("candidates") or [{}])[0]
+    parts = candidate.get("content", {}).get("parts", [])
+    return "".join(p["text"] for p in parts if "text" in p).strip()
+
+def legacy_body(prompt, image_path, ref_dir, labels, system_instruction):
+    """The old full-resolution payload, for size comparisons."""
+    def part(path):
+        with open(path, "rb") as f:
+            data = base64.b64encode(f.read()).decode("utf-8")
+        return {"inlineData": {"mimeType": MIME_TYPES.get(os.path.splitext(path)[1].lower(), "image/jpeg"),
+                               "data": data}}
+
+    parts = [{"text": prompt}, part(image_path)]
+    for label in labels:
+        label_dir = os.path.join(ref_dir, label)
+        if os.path.isdir(label_dir):
+            parts.append({"text": f"Reference images for '{label}':"})
+            parts.extend(part(os.path.join(label_dir, f)) for f in sorted(os.listdir(label_dir))
+                         if os.path.splitext(f)[1].lower() in MIME_TYPES)
+    payload = {
+        "contents": [{"role": "user", "parts": parts}],
+        "systemInstruction": {"parts": [{"text": system_instruction}]},
+        "tools": [{"google_search": {}}],
+    }
+    return json.dumps(payload).encode("utf-8")
+
+
+if __name__ == "__main__":
+    # python3 gemini_payload.py [capture.jpg] from the camera directory
+    import sys
+    import tempfile
+
+    labels = ["tomato_crackers", "bento", "atori"]
+    uplink_mbit = 10.0  # a typical edge uplink, for the upload-time estimate
+    if len(sys.argv) > 1:
+        capture = sys.argv[1]
+    elif cv2 is None:
+        sys.exit("OpenCV is needed to downscale images: pip install opencv-python")
+    else:
+        capture = os.path.join(tempfile.mkdtemp(), "capture.jpg")
+        frame = (np.random.default_rng(0).random((1080, 1920, 3)) * 255).astype(np.uint8)
+        cv2.imwrite(capture, cv2.GaussianBlur(frame, (31, 31), 0))
+
+    start = time.perf_counter()
+    old = legacy_body("prompt", capture, "ref", labels, "system")
+    old_ms = (time.perf_counter() - start) * 1000
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        cache = ReferenceCache("ref", labels, cache_dir=cache_dir).load()
+        cold_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        cache.load()
+        warm_ms = (time.perf_counter() - start) * 1000
+        print(f"[REFS] {cache.stats()} cold load {cold_ms:.0f} ms, warm load {warm_ms:.0f} ms")
+
+    start = time.perf_counter()
+    with open(capture, "rb") as f:
+        mime, data = encode_image(f.read(), CAPTURE_MAX_SIDE)
+    new = build_body("prompt", mime, data, cache.fragment, "system")
+    new_ms = (time.perf_counter() - start) * 1000
+    json.loads(new)  # well-formed
+
+    for name, body, ms in (("full-resolution", old, old_ms), ("cached/downscaled", new, new_ms)):
+        print(f"{name:>17}: {len(body) / 2**20:6.2f} MB, built in {ms:5.1f} ms, "
+              f"~{len(body) * 8 / (uplink_mbit * 1e6):5.2f} s upload at {uplink_mbit:.0f} Mbit/s")
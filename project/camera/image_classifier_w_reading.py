@@ -1,40 +1,19 @@
-import base64
 import requests
 import sys
 import os
-import json
 import time
 
 # --- ThingSpeak Config ---
 THINGSPEAK_CHANNEL_ID = "" #OBMITTED
 THINGSPEAK_API_KEY = ""   # OBMITTED
+BUTTON_FIELD = 2          # ButtonState
 
-THINGSPEAK_READ_URL = (
-    f"https://api.thingspeak.com/channels/{THINGSPEAK_CHANNEL_ID}/fields/2.json"
-    f"?api_key={THINGSPEAK_API_KEY}&results=1"
-)
-
-def read_button_state():
-    """
-    Returns the latest value of ButtonState (field2) from ThingSpeak.
-    If error, returns 0 (safe default).
-    """
-    try:
-        r = requests.get(THINGSPEAK_READ_URL, timeout=10)
-        if r.status_code != 200:
-            return 0
-
-        data = r.json()
-        feeds = data.get("feeds", [])
-        if not feeds:
-            return 0
-
-        value = feeds[0].get("field2", "0")
-        return int(value) if value and value.isdigit() else 0
-
-    except Exception as e:
-        print("ThingSpeak read error:", e)
-        return 0
+# --- Trigger Config ---
+# The ESP32 calls http://<this box>:TRIGGER_PORT/trigger on a button press;
+# ThingSpeak is polled every THINGSPEAK_POLL_INTERVAL s as a fallback.
+TRIGGER_PORT = 8088
+TRIGGER_TOKEN = ""        # if set, the ESP32 must send ?token=... or X-Trigger-Token
+THINGSPEAK_POLL_INTERVAL = 30.0
 
 
 
@@ -42,6 +21,25 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from google.cloud import storage
 
+# shared helpers live in project/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.outbox import Outbox, FirestoreSink, GCSSink
+from common import metrics
+from gemini_payload import ReferenceCache, build_body, encode_capture, response_text
+from local_classifier import LocalClassifier
+from frame_cache import FrameCache
+from camera_service import CameraService
+from trigger import ThingSpeakPoller, TriggerQueue, TriggerServer
+
+# --- Metrics (Prometheus /metrics on METRICS_PORT + periodic log summary) ---
+METRICS_PORT = 9102
+STAGE_SECONDS = metrics.histogram("camera_stage_seconds", "Time spent in each camera stage", ["stage"])
+CLASSIFICATIONS = metrics.counter("camera_classifications_total", "Classifications by outcome", ["outcome"])
+TRIGGER_SECONDS = metrics.histogram("camera_trigger_seconds", "Time from trigger to frame captured / result",
+                                    ["until"])
+REQUEST_BYTES = metrics.histogram("camera_request_bytes", "Gemini request body size",
+                                  buckets=(2**16, 2**18, 2**19, 2**20, 2**21, 2**22, 2**23, 2**24))
+
 BUCKET_NAME = ""
 
 # Use same Firebase/Google service account JSON
@@ -51,31 +49,6 @@ client = storage.Client.from_service_account_json(
 
 bucket = client.bucket(BUCKET_NAME)
 
-def upload_image_to_gcs(local_path, blob_name):
-    """
-    Uploads an image to Google Cloud Storage and makes it public.
-    local_path: path to JPG/PNG on disk
-    blob_name: where to store inside the bucket (e.g. images/12345.jpg)
-    """
-
-    blob = bucket.blob(blob_name)
-
-    try:
-        blob.upload_from_filename(local_path)
-        blob.make_public()
-
-        print(f"📸 Uploaded image to GCS: gs://{BUCKET_NAME}/{blob_name}")
-        print(f"🌐 Public Image URL: {blob.public_url}")
-
-        return blob.public_url
-
-    except Exception as e:
-        print(f"❌ GCS image upload failed: {e}")
-        return None
-
-
-
-
 try:
     import cv2
 except ImportError:
@@ -104,6 +77,14 @@ SYSTEM_INSTRUCTION = (
 # --- Reference Image Directory ---
 REF_DIR = "ref"
 
+# --- On-box classifier (kNN over ref/ embeddings); Gemini only below LOCAL_CONFIDENCE ---
+USE_LOCAL_CLASSIFIER = True
+LOCAL_CONFIDENCE = 0.8
+
+# --- Frame cache: empty, unchanged or recently classified scenes skip classification ---
+USE_FRAME_CACHE = True
+BACKGROUND_PATH = "background.jpg"  # the empty counter; save one with --save-background
+
 # --- Firebase / Firestore config ---
 FIREBASE_CRED_PATH = ""
 SNACK_COLLECTION = "snack_classifications"
@@ -115,8 +96,19 @@ if not firebase_admin._apps:
 
 db = firestore.client()  # Firestore client
 
+# --- Outbox: Firestore writes / GCS uploads are queued here and sent in the background ---
+OUTBOX_PATH = "camera_outbox.db"
+outbox = Outbox(OUTBOX_PATH, FirestoreSink(db), GCSSink(bucket))
 
-def save_snack_log(label: str, raw_text: str, image_url: str):
+
+@STAGE_SECONDS.time(stage="enqueue")  # an outbox insert; network time is outbox_send_seconds
+def save_snack_log(label: str, raw_text: str, image_url: str, depends_on=None, source="gemini", confidence=None,
+                   counter=None):
+    """
+    Queues the snack log in the outbox; it is written to Firestore once the
+    upload it depends on (if any) has gone through. With several counters
+    (multicounter.py) the document id is <counter>_<ts>.
+    """
     ts = int(time.time())
 
     record_data = {
@@ -124,134 +116,72 @@ def save_snack_log(label: str, raw_text: str, image_url: str):
         "label": label,
         "raw_text": raw_text,
         "image_url": image_url,  # changed
+        "source": source,  # "local", "gemini" or "cache"
     }
+    if confidence is not None:
+        record_data["confidence"] = round(confidence, 4)
+    doc_id = ts
+    if counter is not None:
+        record_data["counter"] = counter
+        doc_id = f"{counter}_{ts}"
 
-    collection = db.collection(SNACK_COLLECTION)
-    doc_ref = collection.document(str(ts))
-    doc_ref.set(record_data)
+    outbox.put_document(SNACK_COLLECTION, doc_id, record_data, depends_on=depends_on)
 
-    print(f"🔥 Saved snack log to Firestore with image URL: {image_url}")
+    print(f"🔥 Queued snack log for Firestore with image URL: {image_url}")
 
 
 
 # ---------------------------------------------------------
 # LOAD LOCAL REFERENCE IMAGES
 # ---------------------------------------------------------
-def load_reference_images():
-    """
-    Loads reference images from:
-
-        ref/<label>/*.jpg|jpeg|png|webp
-
-    Returns:
-        {
-            "label1": [ { "mimeType": "..", "data": "<b64>" }, ... ],
-            "label2": [ ... ]
-        }
-    """
-    references = {}
-
-    if not os.path.isdir(REF_DIR):
-        print(f"Warning: Reference directory '{REF_DIR}' not found. No reference images loaded.")
-        return references
-
-    for label in CLASSIFICATION_LABELS:
-        label_dir = os.path.join(REF_DIR, label)
-        refs = []
-
-        if os.path.isdir(label_dir):
-            for fname in os.listdir(label_dir):
-                fpath = os.path.join(label_dir, fname)
-
-                if not os.path.isfile(fpath):
-                    continue
-
-                ext = os.path.splitext(fname)[1].lower()
-                mime = {
-                    ".jpg": "image/jpeg",
-                    ".jpeg": "image/jpeg",
-                    ".png": "image/png",
-                    ".webp": "image/webp"
-                }.get(ext)
-
-                if mime is None:
-                    print(f"Skipping unsupported file format: {fpath}")
-                    continue
-
-                try:
-                    with open(fpath, "rb") as f:
-                        b64 = base64.b64encode(f.read()).decode("utf-8")
-                    refs.append({"mimeType": mime, "data": b64})
-                except Exception as e:
-                    print(f"Error loading ref image '{fpath}': {e}")
-
-        if refs:
-            references[label] = refs
-            print(f"Loaded {len(refs)} reference images for label '{label}'.")
-
-    return references
-
-
-REFERENCE_IMAGES = load_reference_images()
+# ref/<label>/*.jpg|jpeg|png|webp, downscaled and JPEG-encoded once (cached
+# on disk in gemini_payload.REF_CACHE_DIR) and kept as a pre-serialized
+# JSON fragment of the request's parts list.
+REFERENCE_CACHE = ReferenceCache(REF_DIR, CLASSIFICATION_LABELS).load()
+REFERENCE_IMAGES = REFERENCE_CACHE.references
+print(f"[REFS] {REFERENCE_CACHE.stats()}")
+
+LOCAL_CLASSIFIER = None
+if USE_LOCAL_CLASSIFIER:
+    try:
+        LOCAL_CLASSIFIER = LocalClassifier(REF_DIR, CLASSIFICATION_LABELS, negatives=[BACKGROUND_PATH])
+        LOCAL_CLASSIFIER.refresh()
+    except (ImportError, OSError) as e:  # OSError: encoder weights not cached and no network
+        print(f"Warning: {e}. Every capture will be sent to Gemini.")
 
 
 # ---------------------------------------------------------
 # WEBCAM CAPTURE (auto_capture option)
 # ---------------------------------------------------------
-def capture_image_from_webcam(filename="temp_capture.jpg", auto_capture=False):
-    if cv2 is None:
+# The device is opened once and read continuously by camera_service;
+# a capture just snapshots its latest frame. Frames stay in memory: the
+# capture is JPEG-encoded once (encode_capture) for Gemini and GCS.
+camera_service = CameraService() if cv2 is not None else None
+
+@STAGE_SECONDS.time(stage="capture")
+def capture_frame(auto_capture=False):
+    """The captured BGR frame, or None."""
+    if camera_service is None:
         print("Error: OpenCV is required for webcam capture. Please run: pip install opencv-python")
         sys.exit(1)
-
-    print("\n--- Starting Webcam Capture ---")
-    camera_index = -1
-    MAX_CAMERA_ATTEMPTS = 3
-    cap = None
-
-    for i in range(MAX_CAMERA_ATTEMPTS):
-        print(f"Trying camera index {i}...")
-        cap = cv2.VideoCapture(i)
-        if cap.isOpened():
-            camera_index = i
-            break
-        if cap:
-            cap.release()
-
-    if camera_index == -1:
-        print("Error: Unable to open webcam.")
-        sys.exit(1)
+    camera_service.start()
 
     if auto_capture:
-        # Warm up camera
-        WARMUP_FRAMES = 10
-        for _ in range(WARMUP_FRAMES):
-            ret, frame = cap.read()
-            if not ret:
-                print("Failed to read frame during warm-up.")
-                cap.release()
-                return None
-            # Optional: tiny sleep to allow exposure adjustment
-            time.sleep(0.05)
-
-        # Capture the actual frame
-        ret, frame = cap.read()
-        if not ret:
-            print("Failed to capture frame automatically.")
-            cap.release()
+        frame = camera_service.snapshot()
+        if frame is None:
+            print(f"Failed to capture frame automatically. Camera: {camera_service.stats()}")
             return None
 
-        cv2.imwrite(filename, frame)
-        print(f"✅ Auto-captured and saved image to {filename}")
-        cap.release()
-        cv2.destroyAllWindows()
-        return filename
+        print("✅ Auto-captured frame")
+        return frame
 
 
     # --- Manual capture mode ---
+    print("\n--- Starting Webcam Capture ---")
     print("Press SPACE to capture, ESC to cancel.")
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        frame = camera_service.snapshot()
+        if frame is None:
             print("Failed to capture frame.")
             break
 
@@ -259,90 +189,72 @@ def capture_image_from_webcam(filename="temp_capture.jpg", auto_capture=False):
         key = cv2.waitKey(1)
 
         if key % 256 == 32:  # SPACE
-            cv2.imwrite(filename, frame)
-            print(f"Saved capture to {filename}")
+            print("Captured frame")
             break
         elif key % 256 == 27:  # ESC
             print("Cancelled.")
-            cap.release()
             cv2.destroyAllWindows()
             sys.exit(0)
 
-    cap.release()
     cv2.destroyAllWindows()
-    return filename
+    return frame
 
 
 # ---------------------------------------------------------
-# FILE TO BASE64
+# FRAME CACHE
 # ---------------------------------------------------------
-def file_to_base64(file_path):
+FRAME_CACHE = None
+if USE_FRAME_CACHE:
     try:
-        with open(file_path, 'rb') as f:
-            return base64.b64encode(f.read()).decode('utf-8')
-    except FileNotFoundError:
-        print(f"Input image not found: {file_path}")
-        sys.exit(1)
+        FRAME_CACHE = FrameCache()
+        if not FRAME_CACHE.load_background(BACKGROUND_PATH):
+            print(f"No empty-counter photo at '{BACKGROUND_PATH}'; only unchanged scenes are cached "
+                  "(save one with --save-background).")
+    except ImportError as e:
+        print(f"Warning: {e}. Every capture will be classified.")
+
+@STAGE_SECONDS.time(stage="cache")
+def check_frame_cache(frame):
+    """
+    (reason, cached result) when the capture needs no classification:
+    an empty counter, an unchanged scene or a recently classified item.
+    None otherwise.
+    """
+    if FRAME_CACHE is None:
+        return None
+    reason, result = FRAME_CACHE.check(frame)
+    if reason is None:
+        return None
+    return reason, result
+
+def cache_result(frame, label, source, confidence=None):
+    if FRAME_CACHE is None or label is None:
+        return
+    FRAME_CACHE.store(frame, {"label": label, "raw_text": label, "source": source, "confidence": confidence})
 
 
 # ---------------------------------------------------------
 # CLASSIFICATION FUNCTION
 # ---------------------------------------------------------
-def classify_image(api_key, image_path, custom_prompt=None):
-    print(f"\n--- Starting Classification for: {os.path.basename(image_path)} ---")
+# One keep-alive session for Gemini and ThingSpeak: only the first request
+# pays the TCP + TLS handshake.
+http = requests.Session()
 
-    base64_data = file_to_base64(image_path)
-    ext = os.path.splitext(image_path)[1].lower()
-
-    mime_type = {
-        '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
-        '.png': 'image/png', '.webp': 'image/webp'
-    }.get(ext, 'image/jpeg')
+@STAGE_SECONDS.time(stage="gemini")
+def classify_image(api_key, image_data, custom_prompt=None, mime_type="image/jpeg"):
+    """Classify the encoded capture (Gemini's copy from encode_capture)."""
+    print("\n--- Starting Classification ---")
 
     user_query = custom_prompt if custom_prompt else DEFAULT_PROMPT
 
     # ----------------------------
-    # Build message parts
-    # ----------------------------
-    parts = [
-        {"text": user_query},
-        {
-            "inlineData": {
-                "mimeType": mime_type,
-                "data": base64_data
-            }
-        }
-    ]
-
-    # ----------------------------
-    # Embed Local Reference Images
-    # ----------------------------
-    if REFERENCE_IMAGES:
-        for label, imgs in REFERENCE_IMAGES.items():
-            parts.append({"text": f"Reference images for '{label}':"})
-            for ref in imgs:
-                parts.append({
-                    "inlineData": {
-                        "mimeType": ref["mimeType"],
-                        "data": ref["data"]
-                    }
-                })
-
-    # ----------------------------
-    # Construct payload
+    # Construct payload (serialized once, reused by every retry)
     # ----------------------------
-    payload = {
-        "contents": [
-            {
-                "role": "user",
-                "parts": parts
-            }
-        ],
-        "systemInstruction": {
-            "parts": [{"text": SYSTEM_INSTRUCTION}]
-        },
-        "tools": [{"google_search": {}}],
-    }
+    body = build_body(user_query, mime_type, image_data, REFERENCE_CACHE.fragment, SYSTEM_INSTRUCTION)
+    REQUEST_BYTES.observe(len(body))
+    print(f"[PAYLOAD] {len(body) / 1024:.0f} KB (capture {len(image_data) / 1024:.0f} KB, "
+          f"references {REFERENCE_CACHE.encoded_bytes / 1024:.0f} KB "
+          f"from {REFERENCE_CACHE.original_bytes / 1024:.0f} KB originals)")
 
     # ----------------------------
     # API CALL w/ exponential backoff
@@ -354,10 +266,10 @@ def classify_image(api_key, image_path, custom_prompt=None):
     for i in range(MAX_RETRIES):
         try:
             print(f"Request attempt {i+1}/{MAX_RETRIES}...")
-            response = requests.post(
+            response = http.post(
                 api_url,
                 headers={'Content-Type': 'application/json'},
-                data=json.dumps(payload),
+                data=body,
                 timeout=30
             )
 
@@ -380,47 +292,93 @@ def classify_image(api_key, image_path, custom_prompt=None):
                 time.sleep(delay)
                 delay *= 2
             else:
-                print(f"Fatal error after {MAX_RETRIES} attempts: {e}")
-                sys.exit(1)
+                print(f"Giving up after {MAX_RETRIES} attempts: {e}")
 
     return None
 
 
 # ---------------------------------------------------------
-# PARSE & PRINT RESULTS + SAVE LOG
+# LOCAL CLASSIFICATION
 # ---------------------------------------------------------
-def process_result(result, image_path, save_log=True):
-    if not result:
-        print("\nFailed: No result returned.")
+@STAGE_SECONDS.time(stage="local")
+def classify_locally(frame):
+    """
+    (label, confidence) from the on-box classifier, or None when it is
+    unavailable or not confident enough and Gemini should decide.
+    """
+    if LOCAL_CLASSIFIER is None:
         return None
+    try:
+        label, confidence = LOCAL_CLASSIFIER.classify(frame)
+    except Exception as e:
+        print(f"Local classifier error: {e}")
+        return None
+
+    print(f"[LOCAL] {label} (confidence {confidence:.2f})")
+    if label is None or confidence < LOCAL_CONFIDENCE:
+        print("[LOCAL] Not confident enough, asking Gemini.")
+        CLASSIFICATIONS.inc(outcome="local_fallback")
+        return None
+    return label, confidence
 
-    candidate = result.get('candidates', [{}])[0]
-    parts = candidate.get('content', {}).get('parts', [])
 
+# ---------------------------------------------------------
+# PARSE & PRINT RESULTS + SAVE LOG
+# ---------------------------------------------------------
+def log_classification(label, raw_text, upload, source="gemini", confidence=None, counter=None):
+    """
+    Queue the Firestore entry for a capture whose upload was started by
+    start_upload(); the outbox writes it once that upload has gone through.
+    """
+    gcs_url, upload_id, _ = upload
+    save_snack_log(label, raw_text, gcs_url, depends_on=upload_id, source=source, confidence=confidence,
+                   counter=counter)
+
+def process_local_result(label, confidence, upload, save_log=True, counter=None):
+    print("\n--- Local Classification Result ---")
+    print(f"Classification: {label} (confidence {confidence:.2f})")
+    CLASSIFICATIONS.inc(outcome="local")
+    if save_log:
+        log_classification(label, label, upload, source="local", confidence=confidence, counter=counter)
+    print("--------------------------------")
+    return label
+
+def process_cached_result(reason, cached, upload, save_log=True, counter=None):
+    print("\n--- Cached Classification Result ---")
+    if reason == "empty":
+        print("Counter is empty (matches the background photo), nothing to classify.")
+        CLASSIFICATIONS.inc(outcome="empty")
+        print("--------------------------------")
+        return None
+    print(f"Classification: {cached['label']} ({reason} scene, {cached['source']} result reused)")
+    CLASSIFICATIONS.inc(outcome="cached")
+    if save_log:
+        log_classification(cached["label"], cached["raw_text"], upload, source="cache",
+                           confidence=cached.get("confidence"), counter=counter)
+    print("--------------------------------")
+    return cached["label"]
+
+def process_result(result, upload, save_log=True, counter=None):
     # Concatenate all returned text parts
-    text = ""
-    for p in parts:
-        if "text" in p:
-            text += p["text"]
+    text = response_text(result) if result else ""
+    if not text:
+        print("\nFailed: No result returned.")
+        CLASSIFICATIONS.inc(outcome="failed")
+        if upload is not None:
+            discard_upload(upload)  # no record will point at the capture
+        return None
 
-    text = text.strip()
+    candidate = (result.get('candidates') or [{}])[0]
 
     print("\n--- AI Classification Result ---")
     print("Classification:", text)
 
     label = text  # The model outputs only the label or "NONE"
+    CLASSIFICATIONS.inc(outcome="none" if label.upper() == "NONE" else "label")
 
     # Save to Firestore + Upload
     if save_log:
-        # Create timestamped filename
-        timestamp = int(time.time())
-        blob_name = f"img_{timestamp}.jpg"
-
-        # Upload to GCS
-        gcs_url = upload_to_gcs(image_path, blob_name)
-
-        # Save Firestore entry
-        save_snack_log(label, text, gcs_url)
+        log_classification(label, text, upload, counter=counter)
 
     # Optional grounding print
     grounding = candidate.get('groundingMetadata', {})
@@ -435,18 +393,29 @@ def process_result(result, image_path, save_log=True):
     print("--------------------------------")
     return label
 
-def upload_to_gcs(local_path, blob_name):
-    blob = bucket.blob(blob_name)
-
-    # upload and make public
-    blob.upload_from_filename(local_path)
-    blob.make_public()
+@STAGE_SECONDS.time(stage="enqueue")
+def start_upload(jpeg, counter=None):
+    """
+    Queues a public upload of the encoded capture and returns (public URL,
+    outbox id, blob name). Called before classification, so the outbox
+    uploads while the classifier runs; log_classification() then only adds
+    the record, or discard_upload() takes the capture back.
+    """
+    timestamp = int(time.time())
+    blob_name = f"img_{timestamp}.jpg" if counter is None else f"{counter}/img_{timestamp}.jpg"
+    upload_id = outbox.put_blob(blob_name, jpeg, "image/jpeg")
+    url = outbox.public_url(blob_name)
 
-    print(f"☁️ Uploaded to GCS: gs://{BUCKET_NAME}/{blob_name}")
-    print(f"🌐 Public URL: {blob.public_url}")
+    print(f"☁️ Queued GCS upload: gs://{BUCKET_NAME}/{blob_name}")
+    print(f"🌐 Public URL: {url}")
 
-    return blob.public_url
+    return url, upload_id, blob_name
 
+def discard_upload(upload):
+    """Drop (or delete, if it already went up) a start_upload() capture that gets no record."""
+    _, upload_id, blob_name = upload
+    outbox.discard_blob(upload_id, blob_name)
+    print(f"🗑️ Discarded GCS upload: gs://{BUCKET_NAME}/{blob_name}")
 
 
 
@@ -454,29 +423,68 @@ def upload_to_gcs(local_path, blob_name):
 # MAIN
 # ---------------------------------------------------------
 if __name__ == "__main__":
+    if "--save-background" in sys.argv:
+        # photograph the empty counter for the frame cache's empty-scene gate
+        frame = capture_frame(auto_capture=True)
+        if frame is None or not cv2.imwrite(BACKGROUND_PATH, frame):
+            sys.exit(1)
+        print(f"Saved empty-counter photo to {BACKGROUND_PATH}")
+        camera_service.stop()
+        sys.exit(0)
+
     if len(sys.argv) < 2:
-        print("Usage: python image_classifier.py <API_KEY>")
+        print("Usage: python image_classifier.py <API_KEY> | --save-background")
         sys.exit(1)
 
     api_key = sys.argv[1]
 
+    outbox.start()
+    if camera_service is not None:
+        camera_service.start()  # open and warm up the camera before the first trigger
+        metrics.gauge("camera_reconnects", "Camera (re)connections since start",
+                      fn=lambda: camera_service.connects)
+    if FRAME_CACHE is not None:
+        metrics.gauge("camera_cache_saved_gemini_calls", "Gemini calls answered from the frame cache",
+                      fn=lambda: FRAME_CACHE.saved_gemini_calls)
+    metrics.serve(METRICS_PORT)
+    metrics.LogSummary(300).start()
+    triggers = TriggerQueue()
+    TriggerServer(triggers, port=TRIGGER_PORT, token=TRIGGER_TOKEN or None).start()
+    poller = None
+    if THINGSPEAK_CHANNEL_ID:
+        poller = ThingSpeakPoller(triggers, THINGSPEAK_CHANNEL_ID, THINGSPEAK_API_KEY, field=BUTTON_FIELD,
+                                  interval=THINGSPEAK_POLL_INTERVAL, session=http).start()
     print("🔄 Starting continuous monitoring loop...")
-    print("Polling ThingSpeak for ButtonState...")
+    print("Waiting for button triggers (webhook, ThingSpeak fallback)...")
 
     while True:
-        button = read_button_state()
-
-        if button == 1:
-            print("\n🟢 ButtonState = 1 → Capturing + Classifying\n")
-
-            filename = "temp_capture.jpg"
-            capture_image_from_webcam(filename, auto_capture=True)
-
-            result = classify_image(api_key, filename, custom_prompt=None)
-            process_result(result, filename, save_log=True)
-
-            print("🧹 Reset ButtonState on device-side or wait before next trigger.\n")
-            time.sleep(10)
-
-        # Sleep between polls
-        time.sleep(10)
+        trigger = triggers.get()
+        print(f"\n🟢 Trigger from {trigger['source']} → Capturing + Classifying\n")
+
+        frame = capture_frame(auto_capture=True)
+        if frame is None:
+            continue
+        TRIGGER_SECONDS.observe(time.monotonic() - trigger["received"], until="capture")
+
+        cached = check_frame_cache(frame)
+        if cached is not None and cached[0] == "empty":
+            process_cached_result(*cached, None, save_log=False)
+        else:
+            # encode once; the upload runs in the outbox while we classify
+            jpeg, gemini_jpeg = encode_capture(frame)
+            upload = start_upload(jpeg)
+            if cached is not None:
+                process_cached_result(*cached, upload, save_log=True)
+            else:
+                local = classify_locally(frame)
+                if local is not None:
+                    label = process_local_result(*local, upload, save_log=True)
+                    cache_result(frame, label, "local", local[1])
+                else:
+                    result = classify_image(api_key, gemini_jpeg, custom_prompt=None)
+                    label = process_result(result, upload, save_log=True)
+                    cache_result(frame, label, "gemini")
+        TRIGGER_SECONDS.observe(time.monotonic() - trigger["received"], until="result")
+        print(f"[TRIGGERS] {triggers.stats()}" + (f" {poller.stats()}" if poller else ""))
+        if FRAME_CACHE is not None:
+            print(f"[CACHE] {FRAME_CACHE.stats()}")
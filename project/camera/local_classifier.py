@@ -0,0 +1,283 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+try:
+    import torch
+    import torchvision
+except ImportError:
+    torch = torchvision = None
+
+from gemini_payload import MIME_TYPES
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.vector_store import VectorStore
+
+
+# On-box snack classifier: a small pretrained image encoder (MobileNetV3-Small,
+# ImageNet weights) embeds the capture, and a kNN over the embedded reference
+# images in ref/<label>/ picks the label. Gemini is only needed when this is
+# not confident.
+#
+#   classifier = LocalClassifier("ref", ["tomato_crackers", "bento", "atori"])
+#   label, confidence = classifier.classify_file("temp_capture.jpg")
+#
+# A capture whose best match is below the similarity floor gets no label
+# (None): an empty counter or an item not in ref/ still has a nearest
+# label, and the softmax alone would happily be sure of it. The floor is
+# MIN_SIMILARITY, raised above whatever the `negatives` (e.g. the empty
+# counter photo) score against the references.
+#
+# python3 local_classifier.py [image ...] [--negatives a.jpg b.jpg] prints the
+# timings, predictions and the calibrated floor.
+
+ENCODER_WEIGHTS_PATH = "mobilenet_v3_small.pth"  # local state dict; else torchvision's cached download
+INDEX_DIR = ".ref_index"      # reference embeddings, keyed by file path/size/mtime
+INPUT_SIZE = 224
+KNN_K = 3                     # neighbours per label averaged into the label's score
+TEMPERATURE = 0.05            # softmax temperature over label scores (cosine similarities)
+MIN_SIMILARITY = 0.6          # floor: a best match below this is "not in ref/" (no label)
+SURE_SIMILARITY = 0.8         # matches at or above this get full confidence
+NEGATIVE_MARGIN = 0.05        # the floor sits at least this far above every negative's best score
+RESCAN_INTERVAL = 5.0         # seconds between checks of ref/ for new or changed images
+
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+# =========================
+# IMAGE ENCODER
+# =========================
+class ImageEncoder:
+    """BGR frame -> L2-normalised 576-d MobileNetV3-Small pooled feature."""
+
+    name = "mobilenet_v3_small"
+
+    def __init__(self, weights_path=ENCODER_WEIGHTS_PATH, pretrained=True):
+        if torchvision is None:
+            raise ImportError("The local classifier needs torchvision: pip install torchvision")
+        if os.path.exists(weights_path):
+            model = torchvision.models.mobilenet_v3_small()
+            model.load_state_dict(torch.load(weights_path, map_location="cpu", weights_only=True))
+        else:
+            try:
+                model = torchvision.models.mobilenet_v3_small(weights="DEFAULT" if pretrained else None)
+            except OSError as e:  # URLError included: offline with nothing in the torch cache
+                raise OSError(f"Cannot download the {self.name} weights ({e}); "
+                              f"save a state dict to '{weights_path}'") from e
+        model.eval()
+        self.features = model.features
+        self.dim = model.classifier[0].in_features
+
+    def preprocess(self, image):
+        image = cv2.resize(image, (INPUT_SIZE, INPUT_SIZE), interpolation=cv2.INTER_AREA)
+        image = (image[:, :, ::-1].astype(np.float32) / 255.0 - IMAGENET_MEAN) / IMAGENET_STD
+        return torch.from_numpy(np.ascontiguousarray(image.transpose(2, 0, 1)))
+
+    def __call__(self, images):
+        """(N, dim) float32 embeddings of a list of BGR frames."""
+        batch = torch.stack([self.preprocess(image) for image in images])
+        with torch.inference_mode():
+            x = self.features(batch).mean(dim=(2, 3))
+        return torch.nn.functional.normalize(x, dim=1).numpy()
+
+
+# =========================
+# KNN CLASSIFIER
+# =========================
+class LocalClassifier:
+    """
+    kNN over the reference images.
+
+    Each label's score is the mean cosine similarity of its `k` nearest
+    reference images to the capture. Below `floor` the capture gets no
+    label. Above it, `confidence` is the softmax of the label scores at
+    `temperature` (how much the best label beats the others) times how
+    far the best score is from the floor towards `sure_similarity` (how
+    much it looks like anything in ref/ at all).
+
+    `floor` is `min_similarity`, raised to NEGATIVE_MARGIN above the best
+    score of any of the `negatives`: images of what is not a snack, such
+    as the empty counter.
+
+    Reference embeddings are kept in a VectorStore under `index_dir`, keyed
+    by a hash of path, size and mtime, so refresh() only runs the encoder
+    on images added or changed since they were last seen, across restarts
+    too; entries of deleted or changed images are compacted away. refresh()
+    is called from classify() at most every `rescan_interval` seconds.
+
+    The reference matrix, its row labels and the floor are published
+    together as one tuple, which classify() takes once, so a concurrent
+    refresh() never pairs a new matrix with old labels.
+    """
+
+    def __init__(self, ref_dir, labels, encoder=None, index_dir=INDEX_DIR, k=KNN_K,
+                 temperature=TEMPERATURE, min_similarity=MIN_SIMILARITY, sure_similarity=SURE_SIMILARITY,
+                 negatives=(), rescan_interval=RESCAN_INTERVAL):
+        if cv2 is None:
+            raise ImportError("The local classifier needs OpenCV: pip install opencv-python")
+        self.ref_dir = ref_dir
+        self.labels = list(labels)
+        self.encoder = encoder or ImageEncoder()
+        self.store = VectorStore(os.path.join(index_dir, self.encoder.name), dim=self.encoder.dim)
+        self.k = k
+        self.temperature = temperature
+        self.min_similarity = min_similarity
+        self.sure_similarity = sure_similarity
+        self.negatives = [path for path in negatives if path and os.path.isfile(path)]
+        self.negative_scores = []
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        # (reference matrix, label index per row, similarity floor)
+        self._index = (np.zeros((0, self.encoder.dim), dtype=np.float32), np.zeros(0, dtype=np.int64),
+                       min_similarity)
+        self._keys = ()
+        self._last_scan = -float("inf")
+        self.embedded = 0  # reference images run through the encoder by refresh()
+        self.pruned = 0    # index entries of deleted or changed images removed by refresh()
+
+    @property
+    def floor(self):
+        return self._index[2]
+
+    def _scan(self):
+        """[(key, label index, path)] for the current reference images."""
+        files = []
+        for i, label in enumerate(self.labels):
+            label_dir = os.path.join(self.ref_dir, label)
+            if not os.path.isdir(label_dir):
+                continue
+            for fname in sorted(os.listdir(label_dir)):
+                path = os.path.join(label_dir, fname)
+                if os.path.splitext(fname)[1].lower() not in MIME_TYPES or not os.path.isfile(path):
+                    continue
+                st = os.stat(path)
+                key = hashlib.sha1(f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}".encode()).hexdigest()
+                files.append((key, i, path))
+        return files
+
+    def refresh(self):
+        """Embed new/changed reference images and rebuild the index. Returns how many were embedded."""
+        with self._lock:
+            self._last_scan = time.monotonic()
+            files = self._scan()
+            keys = tuple(key for key, _, _ in files)
+            if keys == self._keys:
+                return 0
+            new = [(key, path) for key, _, path in files if self.store.get(key) is None]
+            for key, path in new:
+                image = cv2.imread(path)
+                if image is None:
+                    print(f"Error loading ref image '{path}'")
+                    continue
+                self.store.add(key, self.encoder([image])[0])
+            self.embedded += len(new)
+            if len(self.store) > len(keys):
+                self.pruned += self.store.compact(keys)
+            rows = [(self.store.get(key), i) for key, i, _ in files]
+            rows = [(v, i) for v, i in rows if v is not None]
+            matrix = np.stack([v for v, _ in rows]) if rows else np.zeros((0, self.encoder.dim), np.float32)
+            row_labels = np.array([i for _, i in rows], dtype=np.int64)
+            self._index = (matrix, row_labels, self._calibrate(matrix, row_labels))
+            self._keys = keys
+            counts = np.bincount(row_labels, minlength=len(self.labels))
+            print(f"[LOCAL] Index: {dict(zip(self.labels, counts.tolist()))} ({len(new)} newly embedded), "
+                  f"similarity floor {self.floor:.2f}")
+            return len(new)
+
+    def _calibrate(self, matrix, row_labels):
+        """The floor for this reference matrix: above the best score of every negative image."""
+        self.negative_scores = []
+        for path in self.negatives:
+            image = cv2.imread(path)
+            if image is None:
+                print(f"Error loading negative image '{path}'")
+                continue
+            if len(matrix):
+                scores = self.scores(self.encoder([image])[0], (matrix, row_labels))
+                self.negative_scores.append(float(scores.max()))
+        return max([self.min_similarity] + [s + NEGATIVE_MARGIN for s in self.negative_scores])
+
+    def scores(self, embedding, index=None):
+        """
+        Per-label kNN scores (mean of the top-k cosine similarities); -1 for
+        labels without references. `index` is a (matrix, row labels[, ...])
+        snapshot, by default the current one.
+        """
+        matrix, row_labels = (index or self._index)[:2]
+        similarities = matrix @ embedding
+        out = np.full(len(self.labels), -1.0, dtype=np.float32)
+        for i in range(len(self.labels)):
+            sims = similarities[row_labels == i]
+            if len(sims):
+                top = np.sort(sims)[-self.k:]
+                out[i] = top.mean()
+        return out
+
+    def classify(self, image):
+        """
+        (label, confidence in [0, 1]) for a BGR frame; (None, 0.0) with no
+        references or when the best match is below the similarity floor.
+        """
+        if time.monotonic() - self._last_scan > self.rescan_interval:
+            self.refresh()
+        index = self._index
+        matrix, _, floor = index
+        if not len(matrix):
+            return None, 0.0
+        scores = self.scores(self.encoder([image])[0], index)
+        best = int(np.argmax(scores))
+        if scores[best] < floor:
+            return None, 0.0
+        valid = scores > -1
+        logits = (scores[valid] - scores[best]) / self.temperature
+        margin = float(1.0 / np.exp(logits).sum())
+        closeness = min(1.0, (scores[best] - floor) / max(self.sure_similarity - floor, 1e-6))
+        return self.labels[best], margin * closeness
+
+    def classify_file(self, path):
+        image = cv2.imread(path)
+        if image is None:
+            raise FileNotFoundError(f"Cannot read image: {path}")
+        return self.classify(image)
+
+
+if __name__ == "__main__":
+    # python3 local_classifier.py [image ...] from the camera directory
+    import tempfile
+
+    labels = ["tomato_crackers", "bento", "atori"]
+    pretrained = os.path.exists(ENCODER_WEIGHTS_PATH) or "--random-weights" not in sys.argv
+    args = [a for a in sys.argv[1:] if a != "--random-weights"]
+    split = args.index("--negatives") if "--negatives" in args else len(args)
+    paths, negatives = args[:split], args[split + 1:]
+    encoder = ImageEncoder(pretrained=pretrained)
+    with tempfile.TemporaryDirectory() as index_dir:
+        classifier = LocalClassifier("ref", labels, encoder=encoder, index_dir=index_dir, negatives=negatives)
+        start = time.perf_counter()
+        classifier.refresh()
+        print(f"cold index build: {(time.perf_counter() - start) * 1000:.0f} ms")
+        start = time.perf_counter()
+        classifier._keys = ()
+        classifier.refresh()
+        print(f"rebuild with nothing new: {(time.perf_counter() - start) * 1000:.1f} ms")
+        print(f"similarity floor {classifier.floor:.3f} (negatives scored "
+              f"{[round(s, 3) for s in classifier.negative_scores]})")
+
+        if not paths:  # classify the references themselves, slightly perturbed
+            paths = [path for _, _, path in classifier._scan()]
+        for path in paths:
+            image = cv2.imread(path)
+            image = cv2.GaussianBlur(image, (5, 5), 0)
+            start = time.perf_counter()
+            label, confidence = classifier.classify(image)
+            best = float(classifier.scores(classifier.encoder([image])[0]).max())
+            print(f"{path}: {label} ({confidence:.2f}, best similarity {best:.3f}) in {(time.perf_counter() - start) * 1000:.1f} ms")
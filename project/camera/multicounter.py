@@ -0,0 +1,591 @@
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from camera_service import CameraService
+from frame_cache import FrameCache
+from gemini_payload import CAPTURE_MAX_SIDE, build_body, encode_capture, encode_frame, response_text
+from trigger import TRIGGER_PORT, ThingSpeakPoller, TriggerQueue, TriggerServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import metrics
+
+
+# Several snack counters (one webcam each) in one asyncio process.
+#
+# Each counter has its own camera service, trigger queue and worker task,
+# so a slow Gemini answer for one counter never holds up another. Every
+# HTTP call goes through one pooled keep-alive session (no handshake per
+# request), at most MAX_IN_FLIGHT at a time, and Gemini calls from all
+# counters share one token bucket that slows down when Gemini answers 429.
+#
+# The ESP32 at a counter calls /trigger?counter=<name>; a counter with a
+# "thingspeak_channel" is also polled as a fallback.
+#
+#   python3 multicounter.py <API_KEY>     run the counters in COUNTERS
+#   python3 multicounter.py --simulate    fake cameras + local Gemini stand-in
+
+# One entry per counter. "name" namespaces its GCS blobs (<name>/img_<ts>.jpg)
+# and Firestore ids (<name>_<ts>); "background" is a photo of that counter empty.
+#   {"name": ..., "camera_index": 0, "background": "background_counter1.jpg"}
+#   {"name": ..., "camera_index": 1, "thingspeak_channel": "...", "thingspeak_api_key": "", "button_field": 2}
+COUNTERS = [
+    {"name": "counter1", "camera_index": 0},
+]
+
+HTTP_POOL_SIZE = 8         # keep-alive connections kept per host
+MAX_IN_FLIGHT = 4          # HTTP requests in flight across all counters
+GEMINI_RATE = 1.0          # requests/s across all counters; set to the project's quota
+GEMINI_BURST = 3           # requests allowed back to back after a quiet spell
+GEMINI_MIN_RATE = 0.05     # floor the limiter backs off to after repeated 429s
+GEMINI_RECOVERY = 0.1      # fraction of GEMINI_RATE regained per successful request
+GEMINI_MAX_RETRIES = 5
+GEMINI_TIMEOUT = 30.0
+TRIGGER_WAIT = 1.0         # seconds a worker blocks on its queue before re-checking for shutdown
+STATS_INTERVAL = 300
+
+COUNTER_SECONDS = metrics.histogram("counter_trigger_seconds", "Time from trigger to result, per counter",
+                                    ["counter", "source"])
+GEMINI_THROTTLED = metrics.counter("gemini_throttled_total", "Gemini 429 responses")
+
+
+# =========================
+# RATE LIMITER
+# =========================
+class TokenBucket:
+    """
+    Token bucket shared by every counter's Gemini calls.
+
+    Tokens refill at `rate` per second up to `burst`; acquire() waits for
+    one, callers served in arrival order. throttled() (a 429) halves the
+    rate, empties the bucket and holds all callers until Retry-After has
+    passed; each success afterwards adds back `recovery` x the configured
+    rate, so the limiter settles just under what Gemini actually grants.
+    """
+
+    def __init__(self, rate=GEMINI_RATE, burst=GEMINI_BURST, min_rate=GEMINI_MIN_RATE, recovery=GEMINI_RECOVERY):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        self.acquired = 0
+        self.throttles = 0
+        self.waited = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+        self.acquired += 1
+        self.waited += time.monotonic() - start
+
+    def throttled(self, retry_after=None):
+        now = time.monotonic()
+        self._refill(now)
+        self.throttles += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0.0
+        pause = retry_after if retry_after is not None else 1 / self.rate
+        self._blocked_until = max(self._blocked_until, now + pause)
+
+    def succeeded(self):
+        self._refill(time.monotonic())
+        self.rate = min(self.max_rate, self.rate + self.recovery * self.max_rate)
+
+    def stats(self):
+        return {"rate": round(self.rate, 3), "acquired": self.acquired, "throttles": self.throttles,
+                "waited_s": round(self.waited, 2)}
+
+
+def retry_after(response):
+    """Retry-After in seconds, or None if missing or not a number."""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
+# =========================
+# HTTP CLIENT
+# =========================
+class HTTPClient:
+    """
+    One pooled keep-alive requests.Session for all counters, driven from
+    asyncio on worker threads. At most `max_in_flight` requests run at
+    once; the others wait on a semaphore, not on a thread.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, max_in_flight=MAX_IN_FLIGHT):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.max_in_flight = max_in_flight
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="http")
+        self.requests = 0
+
+    async def request(self, method, url, **kwargs):
+        async with self._slots:
+            self.requests += 1
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, lambda: self.session.request(method, url, **kwargs))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+class GeminiClient:
+    """generateContent over the shared HTTP client, paced by the shared limiter."""
+
+    def __init__(self, http, limiter, api_key, model, api_url_base, max_retries=GEMINI_MAX_RETRIES,
+                 timeout=GEMINI_TIMEOUT):
+        self.http = http
+        self.limiter = limiter
+        self.url = f"{api_url_base}{model}:generateContent?key={api_key}"
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.calls = 0
+        self.failures = 0
+
+    async def generate(self, body, tag="gemini"):
+        """The parsed response, or None after `max_retries` failed attempts or a 4xx."""
+        self.calls += 1
+        delay = 1.0
+        for attempt in range(self.max_retries):
+            await self.limiter.acquire()
+            try:
+                response = await self.http.request("POST", self.url, data=body, timeout=self.timeout,
+                                                   headers={"Content-Type": "application/json"})
+            except requests.exceptions.RequestException as e:
+                error = e
+            else:
+                if response.status_code == 200:
+                    self.limiter.succeeded()
+                    return response.json()
+                if response.status_code == 429:
+                    GEMINI_THROTTLED.inc()
+                    self.limiter.throttled(retry_after(response))
+                    print(f"[{tag}] Gemini rate limited (429), limiter down to {self.limiter.rate:.2f} req/s")
+                    continue  # the limiter holds everyone until Retry-After
+                if response.status_code < 500:
+                    print(f"[{tag}] Gemini error {response.status_code}: {response.text[:200]}")
+                    break
+                error = f"HTTP {response.status_code}"
+            if attempt < self.max_retries - 1:
+                print(f"[{tag}] Gemini error: {error}. Retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)  # only this counter waits
+                delay *= 2
+        self.failures += 1
+        return None
+
+    def stats(self):
+        return {"calls": self.calls, "failures": self.failures, "http_requests": self.http.requests,
+                "limiter": self.limiter.stats()}
+
+
+# =========================
+# COUNTERS
+# =========================
+class CounterMonitor:
+    """One counter: its camera, trigger queue, frame cache and result tallies."""
+
+    def __init__(self, name, camera, cache=None):
+        self.name = name
+        self.camera = camera
+        self.cache = cache
+        self.triggers = TriggerQueue()
+        self.results = 0
+        self.failures = 0
+        self.by_source = {}
+        self.latencies = []
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        pick = lambda p: round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 1)
+        return {"results": self.results, "failures": self.failures, "by_source": dict(self.by_source),
+                "latency_ms": {"p50": pick(50), "max": pick(100)} if latencies else None,
+                "triggers": self.triggers.stats(), "camera": self.camera.stats(),
+                "cache": self.cache.stats() if self.cache is not None else None}
+
+
+class CounterService:
+    """
+    Runs every counter's trigger -> snapshot -> classify -> log loop as its
+    own asyncio task. Blocking work (camera, kNN, JPEG encoding, the
+    outbox) runs on threads and HTTP goes through `gemini`, so while one
+    counter waits on Gemini the others keep going. A counter handles its
+    own triggers one at a time; presses during a classification coalesce
+    in its TriggerQueue as in image_classifier_w_reading.py.
+
+    With `frame_cache`, each counter gets a FrameCache (with the config's
+    "background", if any) that answers empty, unchanged and recently seen
+    scenes first. classify_local(frame) -> (label, confidence) is tried
+    next; Gemini decides below `local_confidence`.
+
+    Frames stay in memory and are JPEG-encoded once. upload(jpeg, counter)
+    is called with that buffer before classification starts, so the
+    upload runs alongside it; its return value is handed to
+    on_result(counter, upload, label, raw_text, source, confidence),
+    which records the result, or to discard(upload) when classification
+    fails and nothing will reference the capture. All run on threads.
+    """
+
+    def __init__(self, counters, gemini, prompt, system_instruction, references_fragment="",
+                 classify_local=None, local_confidence=0.8, upload=None, on_result=None, frame_cache=False,
+                 index_dir=".", open_device=None, discard=None):
+        names = [c["name"] for c in counters]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Counter names must be unique: {names}")
+        self.configs = counters
+        self.gemini = gemini
+        self.prompt = prompt
+        self.system_instruction = system_instruction
+        self.references_fragment = references_fragment
+        self.classify_local = classify_local
+        self.local_confidence = local_confidence
+        self.upload = upload
+        self.on_result = on_result
+        self.discard = discard
+        self.monitors = []
+        for c in counters:
+            camera = CameraService(indices=(c["camera_index"],),
+                                   index_path=os.path.join(index_dir, f".camera_index_{c['name']}"),
+                                   **({"open_device": open_device} if open_device else {}))
+            cache = None
+            if frame_cache:
+                cache = FrameCache()
+                if not cache.load_background(c.get("background")):
+                    print(f"[{c['name']}] No background photo; only unchanged scenes are cached")
+            self.monitors.append(CounterMonitor(c["name"], camera, cache))
+        # trigger waits block a thread each; keep them off the shared default pool
+        self._waiters = ThreadPoolExecutor(max_workers=len(self.monitors), thread_name_prefix="trigger-wait")
+        self._running = False
+
+    @property
+    def queues(self):
+        """{counter name: TriggerQueue}, for TriggerServer routing."""
+        return {m.name: m.triggers for m in self.monitors}
+
+    def _body(self, image):
+        return build_body(self.prompt, "image/jpeg", image, self.references_fragment, self.system_instruction)
+
+    async def _handle(self, monitor, trigger):
+        frame = await asyncio.to_thread(monitor.camera.snapshot)
+        if frame is None:
+            print(f"[{monitor.name}] No frame from the camera: {monitor.camera.stats()}")
+            monitor.failures += 1
+            return
+
+        reason = cached = local = None
+        if monitor.cache is not None:
+            reason, cached = await asyncio.to_thread(monitor.cache.check, frame)
+            if reason == "empty":
+                print(f"[{monitor.name}] Counter is empty, nothing to classify")
+                monitor.by_source["empty"] = monitor.by_source.get("empty", 0) + 1
+                return
+        gemini_jpeg = upload = None
+        if self.upload is not None:
+            jpeg, gemini_jpeg = await asyncio.to_thread(encode_capture, frame)
+            upload = await asyncio.to_thread(self.upload, jpeg, monitor.name)
+        if cached is None and self.classify_local is not None:
+            local = await asyncio.to_thread(self.classify_local, frame)
+        if cached is not None:
+            label, raw_text, confidence = cached["label"], cached["raw_text"], cached.get("confidence")
+            source = "cache"
+        elif local is not None and local[0] is not None and local[1] >= self.local_confidence:
+            label, confidence = local
+            raw_text, source = label, "local"
+        else:
+            if gemini_jpeg is None:
+                gemini_jpeg = await asyncio.to_thread(encode_frame, frame, CAPTURE_MAX_SIDE)
+            body = await asyncio.to_thread(self._body, gemini_jpeg)
+            result = await self.gemini.generate(body, tag=monitor.name)
+            raw_text = response_text(result) if result is not None else ""
+            if not raw_text:
+                print(f"[{monitor.name}] Classification failed")
+                monitor.failures += 1
+                if upload is not None and self.discard is not None:
+                    await asyncio.to_thread(self.discard, upload)
+                return
+            label, confidence, source = raw_text, None, "gemini"
+        if monitor.cache is not None and source != "cache":
+            result = {"label": label, "raw_text": raw_text, "source": source, "confidence": confidence}
+            await asyncio.to_thread(monitor.cache.store, frame, result)
+
+        if self.on_result is not None:
+            await asyncio.to_thread(self.on_result, monitor.name, upload, label, raw_text, source, confidence)
+        elapsed = time.monotonic() - trigger["received"]
+        monitor.results += 1
+        monitor.by_source[source] = monitor.by_source.get(source, 0) + 1
+        monitor.latencies.append(elapsed)
+        del monitor.latencies[:-256]
+        COUNTER_SECONDS.observe(elapsed, counter=monitor.name, source=source)
+        print(f"🟢 [{monitor.name}] {label} ({source}) {elapsed:.2f}s after the {trigger['source']} trigger")
+
+    async def _worker(self, monitor):
+        loop = asyncio.get_running_loop()
+        while self._running:
+            trigger = await loop.run_in_executor(self._waiters, monitor.triggers.get, TRIGGER_WAIT)
+            if trigger is None:
+                continue
+            try:
+                await self._handle(monitor, trigger)
+            except Exception as e:
+                print(f"[{monitor.name}] Error handling trigger: {e}")
+                monitor.failures += 1
+
+    async def run(self):
+        """Start the cameras and serve triggers until stop()."""
+        self._running = True
+        for monitor in self.monitors:
+            monitor.camera.start()
+        try:
+            await asyncio.gather(*(self._worker(m) for m in self.monitors))
+        finally:
+            for monitor in self.monitors:
+                monitor.camera.stop()
+            self._waiters.shutdown(wait=False)
+
+    def stop(self):
+        self._running = False
+
+    def stats(self):
+        return {"counters": {m.name: m.stats() for m in self.monitors}, "gemini": self.gemini.stats()}
+
+
+# =========================
+# SIMULATION
+# =========================
+def simulate(slow_seconds=3.0, presses=6, interval=0.4):
+    """
+    Fake cameras and a local Gemini stand-in, everything sent to Gemini.
+
+    head_of_line: counter1's first request takes `slow_seconds`, then the
+    other counters are pressed every `interval` s. Reports per-counter
+    trigger-to-result latency for the service and for the old serial
+    loop (fresh connection per request, one trigger at a time).
+
+    rate_limit: the stand-in allows 2 requests/s while the limiter starts
+    at 5; reports 429s seen and where the limiter settles.
+    """
+    import tempfile
+    from common.fakes import FakeVideoCapture, LocalGemini
+
+    names = ["counter1", "counter2", "counter3"]
+    FakeVideoCapture.devices = {0, 1, 2}
+    counters = [{"name": name, "camera_index": i} for i, name in enumerate(names)]
+    # counter1's request is in flight (and gets the slow answer) before the others are pressed
+    schedule = [(0.0, "counter1")] + [(0.5 + i * interval, name) for i in range(presses) for name in names[1:]]
+    report = {}
+
+    async def run_service(gemini_fake, limiter, schedule):
+        http = HTTPClient()
+        gemini = GeminiClient(http, limiter, "test", "fake", gemini_fake.base_url)
+        service = CounterService(counters, gemini, "prompt", "system", index_dir=tempfile.mkdtemp(),
+                                 open_device=FakeVideoCapture)
+        task = asyncio.create_task(service.run())
+        await asyncio.to_thread(lambda: [m.camera.snapshot(timeout=5.0) for m in service.monitors])
+        start = time.monotonic()
+        for at, name in schedule:
+            await asyncio.sleep(max(0.0, start + at - time.monotonic()))
+            service.queues[name].put("esp32")
+        # presses that arrive while their counter is busy coalesce into one capture
+        done = lambda: sum(m.results + m.failures + m.triggers.coalesced for m in service.monitors)
+        while done() < len(schedule):
+            await asyncio.sleep(0.05)
+        service.stop()
+        await task
+        http.close()
+        return service.stats()
+
+    with LocalGemini(latencies=[slow_seconds]) as fake:
+        stats = asyncio.run(run_service(fake, TokenBucket(rate=100, burst=100), schedule))
+        report["head_of_line"] = {name: c["latency_ms"] for name, c in stats["counters"].items()}
+        report["head_of_line"]["gemini"] = fake.stats()
+
+    # the same presses through the old loop: one capture at a time, requests.post per call
+    with LocalGemini(latencies=[slow_seconds]) as fake:
+        url = f"{fake.base_url}fake:generateContent?key=test"
+        start = time.monotonic()
+        pending, latencies = list(schedule), {name: [] for name in names}
+        while pending:
+            at, name = pending.pop(0)
+            time.sleep(max(0.0, start + at - time.monotonic()))
+            requests.post(url, data=b"{}", headers={"Content-Type": "application/json"}, timeout=30)
+            latencies[name].append(time.monotonic() - start - at)
+        report["serial_loop"] = {name: {"p50": round(sorted(v)[len(v) // 2] * 1000, 1),
+                                        "max": round(max(v) * 1000, 1)} for name, v in latencies.items()}
+        report["serial_loop"]["gemini"] = fake.stats()
+
+    burst = [(i * 0.05, names[i % 3]) for i in range(12)]
+    with LocalGemini(rate_limit=2, retry_after=1) as fake:
+        limiter = TokenBucket(rate=5, burst=5)
+        stats = asyncio.run(run_service(fake, limiter, burst))
+        report["rate_limit"] = {"presses": len(burst),
+                                "coalesced": sum(c["triggers"]["coalesced"] for c in stats["counters"].values()),
+                                "results": sum(c["results"] for c in stats["counters"].values()),
+                                "failures": sum(c["failures"] for c in stats["counters"].values()),
+                                "limiter": limiter.stats(), "gemini": fake.stats()}
+    return report
+
+
+def simulate_upload(presses=5, gemini_latency=0.8, round_trip=0.25):
+    """
+    Press-to-Firestore latency through the outbox, with fakes where every
+    GCS / Firestore call takes `round_trip` s and Gemini `gemini_latency` s.
+      before: capture uploaded after classification, then make_public()
+      after:  upload queued at capture (overlapping Gemini), ACL set by
+              the upload request itself
+    """
+    import itertools
+    import tempfile
+    from common.fakes import FakeBucket, FakeFirestore, FakeVideoCapture, LocalGemini
+    from common.outbox import FirestoreSink, GCSSink, Outbox
+
+    class TwoStepGCSSink(GCSSink):
+        def upload(self, name, data, content_type, public=True):
+            blob = self.bucket.blob(name)
+            blob.upload_from_string(data, content_type=content_type)
+            if public:
+                blob.make_public()
+
+    FakeVideoCapture.devices = {0}
+    report = {}
+    for mode in ("before", "after"):
+        with tempfile.TemporaryDirectory() as tmp, LocalGemini(latency=gemini_latency) as fake:
+            db, bucket = FakeFirestore(), FakeBucket()
+            db.latency = bucket.latency = round_trip
+            sink = TwoStepGCSSink(bucket) if mode == "before" else GCSSink(bucket)
+            outbox = Outbox(os.path.join(tmp, "outbox.db"), FirestoreSink(db), sink).start()
+            sequence = itertools.count()
+
+            def start_upload(jpeg, counter):
+                name = f"{counter}/img_{next(sequence)}.jpg"
+                return outbox.public_url(name), outbox.put_blob(name, jpeg, "image/jpeg")
+
+            def log_result(counter, upload, label, raw_text, source, confidence):
+                url, upload_id = start_upload(upload, counter) if mode == "before" else upload
+                outbox.put_document("snack_classifications", f"{counter}_{upload_id}",
+                                    {"label": label, "image_url": url}, depends_on=upload_id)
+
+            async def run():
+                http = HTTPClient()
+                gemini = GeminiClient(http, TokenBucket(rate=100, burst=100), "test", "fake", fake.base_url)
+                # "before" hands the JPEG through untouched and uploads it in log_result
+                service = CounterService([{"name": "counter1", "camera_index": 0}], gemini, "prompt", "system",
+                                         upload=(lambda jpeg, counter: jpeg) if mode == "before" else start_upload,
+                                         on_result=log_result, index_dir=tmp, open_device=FakeVideoCapture)
+                task = asyncio.create_task(service.run())
+                await asyncio.to_thread(service.monitors[0].camera.snapshot, 5.0)
+                latencies = []
+                for i in range(presses):
+                    start = time.monotonic()
+                    service.queues["counter1"].put("esp32")
+                    while len(db.data.get("snack_classifications", {})) <= i:
+                        await asyncio.sleep(0.005)
+                    latencies.append(time.monotonic() - start)
+                service.stop()
+                await task
+                http.close()
+                return latencies
+
+            latencies = sorted(asyncio.run(run()))
+            outbox.stop()
+            outbox.close()
+            report[mode] = {"press_to_firestore_ms": {"p50": round(latencies[len(latencies) // 2] * 1000),
+                                                      "max": round(latencies[-1] * 1000)},
+                            "gcs_calls": bucket.calls, "public": len(bucket.public)}
+    return report
+
+
+# =========================
+# MAIN
+# =========================
+def main(api_key, counters=COUNTERS):
+    import image_classifier_w_reading as camera
+
+    print(f"📷 Multi-counter snack classifier ({len(counters)} counters, one HTTP pool)\n")
+    camera.outbox.start()
+
+    def log_result(counter, upload, label, raw_text, source, confidence):
+        outcome = {"local": "local", "cache": "cached"}.get(source) or ("none" if label.upper() == "NONE" else "label")
+        camera.CLASSIFICATIONS.inc(outcome=outcome)
+        camera.log_classification(label, raw_text, upload, source=source, confidence=confidence, counter=counter)
+
+    classify_local = camera.LOCAL_CLASSIFIER.classify if camera.LOCAL_CLASSIFIER is not None else None
+
+    async def run():
+        http = HTTPClient()
+        gemini = GeminiClient(http, TokenBucket(), api_key, camera.MODEL_NAME, camera.API_URL_BASE)
+        service = CounterService(counters, gemini, camera.DEFAULT_PROMPT, camera.SYSTEM_INSTRUCTION,
+                                 camera.REFERENCE_CACHE.fragment, classify_local=classify_local,
+                                 local_confidence=camera.LOCAL_CONFIDENCE, upload=camera.start_upload,
+                                 on_result=log_result, discard=camera.discard_upload,
+                                 frame_cache=camera.USE_FRAME_CACHE)
+        TriggerServer(service.queues, port=TRIGGER_PORT, token=camera.TRIGGER_TOKEN or None).start()
+        for config, monitor in zip(counters, service.monitors):
+            if config.get("thingspeak_channel"):
+                ThingSpeakPoller(monitor.triggers, config["thingspeak_channel"], config.get("thingspeak_api_key", ""),
+                                 field=config.get("button_field", camera.BUTTON_FIELD),
+                                 interval=camera.THINGSPEAK_POLL_INTERVAL, session=http.session).start()
+        metrics.gauge("gemini_limiter_rate", "Current Gemini request rate limit (req/s)", fn=lambda: gemini.limiter.rate)
+
+        async def report():
+            while True:
+                await asyncio.sleep(STATS_INTERVAL)
+                print(f"[COUNTERS] {service.stats()}")
+                print(f"[OUTBOX] {camera.outbox.stats()}")
+
+        reporter = asyncio.create_task(report())
+        try:
+            await service.run()
+        finally:
+            reporter.cancel()
+            http.close()
+
+    metrics.serve(camera.METRICS_PORT)
+    summary = metrics.LogSummary(STATS_INTERVAL).start()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        summary.stop()
+        camera.outbox.stop()
+
+
+if __name__ == "__main__":
+    # python3 multicounter.py <API_KEY> | --simulate, from the camera directory
+    if len(sys.argv) < 2:
+        print("Usage: python multicounter.py <API_KEY> | --simulate")
+        sys.exit(1)
+    if sys.argv[1] == "--simulate":
+        for scenario, result in {**simulate(), **simulate_upload()}.items():
+            print(f"{scenario}: {result}")
+    else:
+        main(sys.argv[1])
@@ -0,0 +1,303 @@
+import json
+import threading
+import time
+import requests
+
+
+# Capture triggers for image_classifier_w_reading.py.
+#
+# The ESP32 pushes a button press straight to the camera box
+# (ProjectEmb/src/main.cpp, TRIGGER_URL):
+#   GET or POST http://<camera-box>:8088/trigger[?token=...&source=esp32]
+# and ThingSpeak polling stays as a slower fallback that reads the entries
+# logged since the last one it has seen (entry_id) and reacts to presses.
+#
+#   triggers = TriggerQueue()
+#   TriggerServer(triggers, port=8088).start()
+#   ThingSpeakPoller(triggers, channel_id, api_key).start()
+#   trigger = triggers.get()     # blocks until a press arrives
+
+TRIGGER_PORT = 8088
+POLL_INTERVAL = 30.0        # seconds between ThingSpeak checks (fallback only)
+POLL_RESULTS = 20          # entries read per poll (the ESP32 logs one per 20 s)
+PUSH_DEDUP_WINDOW = 60.0    # a ThingSpeak press this soon after an accepted trigger is the same press
+THINGSPEAK_URL = "https://api.thingspeak.com"
+
+
+# =========================
+# TRIGGER QUEUE
+# =========================
+class TriggerQueue:
+    """
+    At most one pending trigger: presses that arrive while one is already
+    waiting are coalesced into it (a capture is a capture).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = None
+        self._last = {}  # source -> monotonic time of its latest trigger
+        self.received = 0
+        self.coalesced = 0
+        self.by_source = {}
+
+    def put(self, source="push"):
+        """Queue a trigger. Returns False if it was merged into a pending one."""
+        now = time.monotonic()
+        with self._cond:
+            self.received += 1
+            self.by_source[source] = self.by_source.get(source, 0) + 1
+            self._last[source] = now
+            if self._pending is not None:
+                self.coalesced += 1
+                return False
+            self._pending = {"source": source, "received": now, "time": time.time()}
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """The next trigger (dict with source / received / time), or None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._pending is not None, timeout):
+                return None
+            trigger, self._pending = self._pending, None
+            return trigger
+
+    def seconds_since_last(self, exclude=()):
+        """Seconds since the latest trigger from any source not in `exclude`, or None."""
+        times = [t for source, t in list(self._last.items()) if source not in exclude]
+        return time.monotonic() - max(times) if times else None
+
+    def stats(self):
+        return {"received": self.received, "coalesced": self.coalesced, "by_source": dict(self.by_source)}
+
+
+# =========================
+# WEBHOOK
+# =========================
+class TriggerServer:
+    """
+    Local HTTP endpoint for push triggers: GET or POST /trigger queues a
+    capture, GET /health answers 200. With `token` set, requests must
+    carry it as ?token= or an X-Trigger-Token header.
+
+    `queue` is a TriggerQueue, or {counter name: TriggerQueue} for several
+    counters, in which case requests pick one with ?counter=<name>.
+    """
+
+    def __init__(self, queue, port=TRIGGER_PORT, host="0.0.0.0", token=None):
+        self.queue = queue
+        self.port = port
+        self.host = host
+        self.token = token
+        self._server = None
+
+    def start(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlparse
+
+        queue, token = self.queue, self.token
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self):
+                url = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                if url.path == "/health":
+                    return self._reply(200, {"ok": True})
+                if url.path != "/trigger":
+                    return self._reply(404, {"error": "not found"})
+                if token and token not in (params.get("token"), self.headers.get("X-Trigger-Token")):
+                    return self._reply(403, {"error": "bad token"})
+                target = queue
+                if isinstance(queue, dict):
+                    target = queue.get(params.get("counter"))
+                    if target is None:
+                        return self._reply(404, {"error": f"unknown counter, expected one of {sorted(queue)}"})
+                queued = target.put(params.get("source", "push"))
+                self._reply(202, {"queued": queued})
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)  # body is not used; drain it for keep-alive
+                self._handle()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="trigger-http", daemon=True).start()
+        print(f"🔔 Trigger webhook on http://{self.host}:{self.port}/trigger")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+# =========================
+# THINGSPEAK FALLBACK
+# =========================
+class ThingSpeakPoller:
+    """
+    Polls `feeds.json?results=<results>` every `interval` seconds and reads
+    every entry newer than the last entry_id seen, so presses logged
+    between two polls are not lost. The ESP32 keeps logging 1 while a
+    press is latched, so only a 0 -> 1 edge of the field is a press.
+    Entries present at startup are not triggers. A press within
+    `dedup_window` seconds of any accepted trigger (a push for the same
+    press, or an earlier poll) is taken to be that same press and ignored.
+    """
+
+    def __init__(self, queue, channel_id, api_key="", field=2, interval=POLL_INTERVAL,
+                 dedup_window=PUSH_DEDUP_WINDOW, base_url=THINGSPEAK_URL, session=None, results=POLL_RESULTS):
+        self.queue = queue
+        self.url = f"{base_url}/channels/{channel_id}/feeds.json"
+        self.params = {"results": results}
+        if api_key:
+            self.params["api_key"] = api_key
+        self.field = f"field{field}"
+        self.interval = interval
+        self.dedup_window = dedup_window
+        self.session = session or requests.Session()
+        self.last_entry_id = None
+        self.last_value = "0"
+        self._stop = threading.Event()
+        self._thread = None
+        self.polls = 0
+        self.errors = 0
+        self.triggers = 0
+        self.deduplicated = 0
+        self.gaps = 0
+
+    def poll_once(self):
+        """One check. Returns True if it queued a trigger."""
+        self.polls += 1
+        try:
+            r = self.session.get(self.url, params=self.params, timeout=10)
+            r.raise_for_status()
+            feeds = (r.json() or {}).get("feeds") or []
+        except Exception as e:
+            self.errors += 1
+            print("ThingSpeak read error:", e)
+            return False
+        entries = sorted((e for e in feeds if isinstance(e, dict) and e.get("entry_id") is not None),
+                         key=lambda e: int(e["entry_id"]))
+        if self.last_entry_id is None:
+            # startup: remember where the channel is, an already latched press is old news
+            self.last_entry_id = int(entries[-1]["entry_id"]) if entries else 0
+            if entries:
+                self.last_value = self._value(entries[-1])
+            return False
+
+        new = [e for e in entries if int(e["entry_id"]) > self.last_entry_id]
+        if new and int(new[0]["entry_id"]) > self.last_entry_id + 1:
+            self.gaps += 1  # more than `results` entries since the last poll; older ones are gone
+        presses = 0
+        for entry in new:
+            value = self._value(entry)
+            if value == "1" and self.last_value != "1":
+                presses += 1
+            self.last_value = value
+            self.last_entry_id = int(entry["entry_id"])
+        if not presses:
+            return False
+        since = self.queue.seconds_since_last()
+        if since is not None and since < self.dedup_window:
+            self.deduplicated += 1
+            return False
+        self.triggers += 1
+        return self.queue.put("thingspeak")
+
+    def _value(self, entry):
+        return str(entry.get(self.field) or "0").strip()
+
+    def _run(self):
+        self.poll_once()  # learn the current entry_id
+        while not self._stop.wait(self.interval):
+            self.poll_once()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="thingspeak-poller", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {"polls": self.polls, "errors": self.errors, "triggers": self.triggers,
+                "deduplicated": self.deduplicated, "gaps": self.gaps, "last_entry_id": self.last_entry_id}
+
+
+# =========================
+# TRIGGER REPLAY
+# =========================
+def replay_triggers(presses=10, poll_interval=1.0, seed=0):
+    """
+    Simulated button presses against a local ThingSpeak stand-in, once
+    with the ESP32 pushing to the webhook (poller running as fallback) and
+    once with polling alone. Each press lands at a random phase of the
+    poll cycle. Returns press-to-trigger latency percentiles and the
+    ThingSpeak traffic of each path.
+    """
+    import os
+    import random
+    import sys
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.fakes import LocalThingSpeak
+
+    def percentiles(values):
+        values = sorted(values)
+        pick = lambda p: values[min(len(values) - 1, int(p / 100 * len(values)))]
+        return {f"p{p}": round(pick(p) * 1000, 1) for p in (50, 95, 99)}
+
+    rng = random.Random(seed)
+    dedup_window = poll_interval * 1.5
+    report = {}
+    for mode in ("push", "poll"):
+        with LocalThingSpeak() as thingspeak:
+            queue = TriggerQueue()
+            server = TriggerServer(queue, port=0, host="127.0.0.1").start() if mode == "push" else None
+            poller = ThingSpeakPoller(queue, "1", interval=poll_interval, dedup_window=dedup_window,
+                                      base_url=thingspeak.base_url).start()
+            time.sleep(0.1)  # first poll learns the (empty) channel state
+            session = requests.Session()
+            latencies, missed = [], 0
+            for _ in range(presses):
+                time.sleep(rng.uniform(0, poll_interval))
+                start = time.monotonic()
+                thingspeak.write(field2=1)  # the ESP32 always logs the press to ThingSpeak
+                if server is not None:
+                    session.get(f"http://127.0.0.1:{server.port}/trigger", params={"source": "esp32"}, timeout=5)
+                trigger = queue.get(timeout=poll_interval * 3)
+                thingspeak.write(field2=1)  # still latched at its next log
+                thingspeak.write(field2=0)  # classified: the ESP32 releases the latch
+                if trigger is None:
+                    missed += 1
+                    continue
+                latencies.append(time.monotonic() - start)
+                time.sleep(dedup_window)  # the poller sees (and drops) a pushed press; the next one is new
+            poller.stop()
+            if server is not None:
+                server.stop()
+            report[mode] = {"latency_ms": percentiles(latencies) if latencies else None, "missed": missed,
+                            "thingspeak_requests": thingspeak.requests,
+                            "thingspeak_bytes": thingspeak.bytes_sent,
+                            "queue": queue.stats(), "poller": poller.stats()}
+    report["poll_interval_s"] = poll_interval
+    return report
@@ -0,0 +1,661 @@
+import copy
+import enum
+import threading
+import time
+
+
+# In-memory stand-ins for the parts of firebase_admin.firestore,
+# google.cloud.storage, cv2.VideoCapture, SMTP, ThingSpeak and Gemini this project
+# uses, for running the outbox, the pipelines and the camera service
+# without network access, credentials or hardware.
+
+class TransientError(Exception):
+    """Raised by the fakes while a failure is being injected."""
+
+
+class _FailureInjector:
+    def __init__(self):
+        self.fail_next = 0        # fail this many upcoming calls
+        self.offline = False      # fail every call until cleared
+        self.latency = 0.0        # seconds each call (one API round trip) takes
+        self.calls = 0
+
+    def _maybe_fail(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.offline:
+            raise TransientError("offline")
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            raise TransientError("injected failure")
+
+
+# =========================
+# FIRESTORE
+# =========================
+class FakeDocumentSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class FakeDocumentReference:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self._collection = collection
+        self.id = doc_id
+
+    def set(self, data):
+        self._client._maybe_fail()
+        self._client._set(self._collection, self.id, data)
+        self._client._notify(self._collection)
+
+    def delete(self):
+        self._client._maybe_fail()
+        with self._client._lock:
+            self._client.data.get(self._collection, {}).pop(self.id, None)
+        self._client._notify(self._collection)
+
+    def get(self):
+        with self._client._lock:
+            data = self._client.data.get(self._collection, {}).get(self.id)
+            self._client.reads += 1
+        return FakeDocumentSnapshot(self.id, copy.deepcopy(data))
+
+
+def _matches(data, field, op, value):
+    if field not in data:
+        return False
+    v = data[field]
+    if op == "==":
+        return v == value
+    if op == "!=":
+        return v != value
+    if op == "in":
+        return v in value
+    if op == "not-in":
+        return v not in value
+    if op == "array_contains":
+        return isinstance(v, list) and value in v
+    if op == "array_contains_any":
+        return isinstance(v, list) and any(x in v for x in value)
+    return {"<": v < value, "<=": v <= value, ">": v > value, ">=": v >= value}[op]
+
+
+class FakeQuery:
+    """
+    The firestore.Query subset the webapp uses: where (positional),
+    order_by, limit and start_after / end_before snapshot cursors, with
+    the implicit document-id tie-break. Documents missing an order_by
+    field are left out, as in Firestore. Every returned document counts
+    as one read in the client's `reads`.
+    """
+
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, client, collection, filters=(), orders=(), limit=None, start_after=None, end_before=None):
+        self._client = client
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._start_after = start_after
+        self._end_before = end_before
+
+    def _copy(self, **changes):
+        fields = dict(filters=self._filters, orders=self._orders, limit=self._limit,
+                      start_after=self._start_after, end_before=self._end_before)
+        fields.update(changes)
+        return FakeQuery(self._client, self._collection, **fields)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot):
+        return self._copy(start_after=snapshot)
+
+    def end_before(self, snapshot):
+        return self._copy(end_before=snapshot)
+
+    def _key(self, doc_id, data):
+        direction = self._orders[-1][1] if self._orders else self.ASCENDING
+        return [(data[f], d) for f, d in self._orders] + [(doc_id, direction)]
+
+    @staticmethod
+    def _compare(a, b):
+        for (x, direction), (y, _) in zip(a, b):
+            if x != y:
+                c = -1 if x < y else 1
+                return -c if direction == FakeQuery.DESCENDING else c
+        return 0
+
+    def _results(self):
+        import functools
+
+        with self._client._lock:
+            items = list(self._client.data.get(self._collection, {}).items())
+        items = [(i, d) for i, d in items
+                 if all(f in d for f, _ in self._orders) and all(_matches(d, *flt) for flt in self._filters)]
+        keyed = [(self._key(i, d), i, d) for i, d in items]
+        keyed.sort(key=functools.cmp_to_key(lambda a, b: self._compare(a[0], b[0])))
+        if self._start_after is not None:
+            cursor = self._key(self._start_after.id, self._start_after.to_dict())
+            keyed = [k for k in keyed if self._compare(k[0], cursor) > 0]
+        if self._end_before is not None:
+            cursor = self._key(self._end_before.id, self._end_before.to_dict())
+            keyed = [k for k in keyed if self._compare(k[0], cursor) < 0]
+        if self._limit is not None:
+            keyed = keyed[:self._limit]
+        return [FakeDocumentSnapshot(i, copy.deepcopy(d)) for _, i, d in keyed]
+
+    def stream(self):
+        docs = self._results()
+        with self._client._lock:
+            self._client.reads += len(docs)
+        return docs
+
+    def get(self):
+        return self.stream()
+
+    def on_snapshot(self, callback):
+        """
+        callback(docs, changes, read_time) with the whole result now and
+        after every write that changes it, called on the writing thread.
+        Reads are counted as Firestore bills listeners: the initial result,
+        then one per added or modified document.
+        """
+        return FakeWatch(self, callback)
+
+
+class FakeChangeType(enum.Enum):
+    ADDED = 1
+    MODIFIED = 2
+    REMOVED = 3
+
+
+class FakeDocumentChange:
+    def __init__(self, type, document):
+        self.type = type
+        self.document = document
+
+
+class FakeWatch:
+    def __init__(self, query, callback):
+        self._query = query
+        self._callback = callback
+        self._previous = {}
+        self.is_active = True
+        self.updates = 0
+        query._client._watches.append(self)
+        self._update()
+
+    def _update(self):
+        docs = self._query._results()
+        current = {d.id: d for d in docs}
+        changes = [FakeDocumentChange(FakeChangeType.REMOVED, d)
+                   for i, d in self._previous.items() if i not in current]
+        for d in docs:
+            if d.id not in self._previous:
+                changes.append(FakeDocumentChange(FakeChangeType.ADDED, d))
+            elif d.to_dict() != self._previous[d.id].to_dict():
+                changes.append(FakeDocumentChange(FakeChangeType.MODIFIED, d))
+        self._previous = current
+        if not changes and self.updates:
+            return
+        self.updates += 1
+        with self._query._client._lock:
+            self._query._client.reads += sum(c.type != FakeChangeType.REMOVED for c in changes)
+        self._callback(docs, changes, time.time())
+
+    def close(self):
+        """Ends the listen stream (as a dropped connection would); unsubscribe() also detaches it."""
+        self.is_active = False
+
+    def unsubscribe(self):
+        self.close()
+        if self in self._query._client._watches:
+            self._query._client._watches.remove(self)
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, name):
+        super().__init__(client, name)
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeDocumentReference(self._client, self.name, str(doc_id))
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, ref, data):
+        self._writes.append((ref._collection, ref.id, copy.deepcopy(data)))
+
+    def commit(self):
+        # all or nothing, like a real batch
+        self._client._maybe_fail()
+        bad = [doc_id for _, doc_id, _ in self._writes if doc_id in self._client.rejected_docs]
+        if bad:
+            raise ValueError(f"invalid document {bad[0]}")  # permanent, unlike TransientError
+        for collection, doc_id, data in self._writes:
+            self._client._set(collection, doc_id, data)
+        self._client.batches += 1
+        for collection in {w[0] for w in self._writes}:
+            self._client._notify(collection)
+
+
+class FakeFirestore(_FailureInjector):
+    """`data` is {collection: {doc_id: dict}}."""
+
+    def __init__(self):
+        super().__init__()
+        self.data = {}
+        self.batches = 0
+        self.reads = 0
+        self.rejected_docs = set()  # doc ids every batch containing them fails on
+        self._lock = threading.Lock()
+        self._watches = []
+
+    def _set(self, collection, doc_id, data):
+        with self._lock:
+            self.data.setdefault(collection, {})[doc_id] = copy.deepcopy(data)
+
+    def _notify(self, collection):
+        for watch in list(self._watches):
+            if watch.is_active and watch._query._collection == collection:
+                watch._update()
+
+    def collection(self, name):
+        return FakeCollectionReference(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+
+# =========================
+# CLOUD STORAGE
+# =========================
+class NotFound(LookupError):
+    """Stands in for google.api_core.exceptions.NotFound."""
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    @property
+    def public_url(self):
+        return f"https://storage.googleapis.com/{self.bucket.name}/{self.name}"
+
+    def upload_from_string(self, data, content_type=None, predefined_acl=None):
+        self.bucket._maybe_fail()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.bucket._lock:
+            self.bucket.blobs[self.name] = (bytes(data), content_type)
+            if predefined_acl == "publicRead":
+                self.bucket.public.add(self.name)
+
+    def upload_from_filename(self, filename, content_type=None, predefined_acl=None):
+        with open(filename, "rb") as f:
+            self.upload_from_string(f.read(), content_type, predefined_acl)
+
+    def make_public(self):
+        self.bucket._maybe_fail()
+        with self.bucket._lock:
+            self.bucket.public.add(self.name)
+
+    def download_as_bytes(self):
+        return self.bucket.blobs[self.name][0]
+
+    def delete(self):
+        self.bucket._maybe_fail()
+        with self.bucket._lock:
+            if self.bucket.blobs.pop(self.name, None) is None:
+                raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+            self.bucket.public.discard(self.name)
+
+
+class FakeBucket(_FailureInjector):
+    """`blobs` is {name: (bytes, content_type)}."""
+
+    def __init__(self, name="fake-bucket"):
+        super().__init__()
+        self.name = name
+        self.blobs = {}
+        self.public = set()
+        self._lock = threading.Lock()
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+# =========================
+# SMTP
+# =========================
+class LocalSMTPServer:
+    """
+    Minimal plain-text SMTP server on localhost (no TLS or AUTH) that
+    records every message. Use as a context manager; `messages` holds
+    (sender, recipients, data) and `connections` counts sessions.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        import socket
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(8)
+        self.host, self.port = self._sock.getsockname()
+        self.messages = []
+        self.connections = 0
+        self._clients = []
+        self._lock = threading.Lock()
+        self._running = False
+
+    def __enter__(self):
+        self._running = True
+        threading.Thread(target=self._accept, name="smtp-standin", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._running = False
+        self._sock.close()
+        self.drop_connections()
+
+    def drop_connections(self):
+        """Close every open session, like a server-side idle timeout."""
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for conn in clients:
+            try:
+                conn.shutdown(2)  # SHUT_RDWR; close() alone leaves the session's makefile open
+                conn.close()
+            except OSError:
+                pass
+
+    def _accept(self):
+        while self._running:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            with self._lock:
+                self.connections += 1
+                self._clients.append(conn)
+            threading.Thread(target=self._session, args=(conn,), daemon=True).start()
+
+    def _session(self, conn):
+        try:
+            f = conn.makefile("rb")
+            conn.sendall(b"220 localhost stand-in\r\n")
+            sender, recipients = None, []
+            for raw in f:
+                line = raw.decode("utf-8", "replace").rstrip("\r\n")
+                cmd = line[:4].upper()
+                if cmd in ("EHLO", "HELO"):
+                    conn.sendall(b"250 localhost\r\n")
+                elif cmd == "MAIL":
+                    sender, recipients = line.split(":", 1)[1].strip().strip("<>"), []
+                    conn.sendall(b"250 OK\r\n")
+                elif cmd == "RCPT":
+                    recipients.append(line.split(":", 1)[1].strip().strip("<>"))
+                    conn.sendall(b"250 OK\r\n")
+                elif cmd == "DATA":
+                    conn.sendall(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    data = []
+                    for body in f:
+                        if body.rstrip(b"\r\n") == b".":
+                            break
+                        data.append(body.decode("utf-8", "replace"))
+                    with self._lock:
+                        self.messages.append((sender, recipients, "".join(data)))
+                    conn.sendall(b"250 OK queued\r\n")
+                elif cmd == "QUIT":
+                    conn.sendall(b"221 Bye\r\n")
+                    break
+                else:  # NOOP, RSET, ...
+                    conn.sendall(b"250 OK\r\n")
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+
+# =========================
+# THINGSPEAK
+# =========================
+class LocalThingSpeak:
+    """
+    ThingSpeak stand-in on localhost answering
+    /channels/<id>/fields/<n>/last.json and /channels/<id>/feeds.json from
+    entries added with write(). `requests` counts API calls and
+    `bytes_sent` the response bytes. Use as a context manager.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        import json
+        import re
+        from urllib.parse import parse_qs, urlparse
+
+        fake = self
+        self.entries = []
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                with fake._lock:
+                    fake.requests += 1
+                    entries = list(fake.entries)
+                if re.fullmatch(r"/channels/\w+/fields/\d+/last\.json", path):
+                    body = entries[-1] if entries else -1
+                elif re.fullmatch(r"/channels/\w+/feeds\.json", path):
+                    results = int(parse_qs(urlparse(self.path).query).get("results", ["100"])[-1])
+                    body = {"channel": {"last_entry_id": len(entries)}, "feeds": entries[-results:]}
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(body).encode("utf-8")
+                with fake._lock:
+                    fake.bytes_sent += len(data)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self.host, self.port = self._server.server_address
+        self.base_url = f"http://{self.host}:{self.port}"
+
+    def write(self, **fields):
+        """Append an entry, e.g. write(field2=1); returns its entry_id."""
+        with self._lock:
+            entry = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                     "entry_id": len(self.entries) + 1}
+            entry.update({k: str(v) for k, v in fields.items()})
+            self.entries.append(entry)
+            return entry["entry_id"]
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, name="thingspeak-standin", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class LocalGemini:
+    """
+    Gemini generateContent stand-in on localhost (HTTP/1.1 keep-alive).
+    POST /v1beta/models/<model>:generateContent answers `text` after
+    `latency` seconds; `latencies` (consumed in arrival order) overrides
+    that per request. Above `rate_limit` requests per second it answers
+    429 with Retry-After: `retry_after`. Counts requests, 429s, TCP
+    connections and the peak number of requests in flight. Use as a
+    context manager.
+    """
+
+    def __init__(self, text="bento", latency=0.05, latencies=(), rate_limit=None, retry_after=1,
+                 host="127.0.0.1", port=0):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        import collections
+        import json
+
+        fake = self
+        self.text = text
+        self.latency = latency
+        self.latencies = collections.deque(latencies)
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.requests = 0
+        self.throttled = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._accepted = collections.deque()  # monotonic times of the last second's answered requests
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def _reply(self, status, body, headers=()):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if not self.path.split("?")[0].endswith(":generateContent"):
+                    return self._reply(404, {"error": {"code": 404}})
+                now = time.monotonic()
+                with fake._lock:
+                    fake.requests += 1
+                    while fake._accepted and now - fake._accepted[0] > 1.0:
+                        fake._accepted.popleft()
+                    if fake.rate_limit is not None and len(fake._accepted) >= fake.rate_limit:
+                        fake.throttled += 1
+                        limited = True
+                    else:
+                        fake._accepted.append(now)
+                        limited = False
+                        delay = fake.latencies.popleft() if fake.latencies else fake.latency
+                        fake.in_flight += 1
+                        fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                if limited:
+                    return self._reply(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}},
+                                       [("Retry-After", str(fake.retry_after))])
+                time.sleep(delay)
+                with fake._lock:
+                    fake.in_flight -= 1
+                self._reply(200, {"candidates": [{"content": {"parts": [{"text": fake.text}]}}]})
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address
+        self.base_url = f"http://{self.host}:{self.port}/v1beta/models/"
+
+    def stats(self):
+        return {"requests": self.requests, "throttled": self.throttled, "connections": self.connections,
+                "max_in_flight": self.max_in_flight}
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, name="gemini-standin", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# =========================
+# WEBCAM
+# =========================
+class FakeVideoCapture:
+    """
+    cv2.VideoCapture stand-in producing numbered frames at `fps`. Only the
+    indices in `devices` open; `unplug()` makes reads fail until `plug()`.
+    Each frame's pixels all equal its sequence number (mod 256).
+    """
+
+    devices = {0}
+    plugged = True
+    opens = 0
+
+    def __init__(self, index, shape=(480, 640, 3), fps=30.0):
+        import numpy as np
+
+        self._np = np
+        self.index = index
+        self.shape = shape
+        self.interval = 1.0 / fps
+        self.frames = 0
+        self._opened = index in FakeVideoCapture.devices and FakeVideoCapture.plugged
+        if self._opened:
+            FakeVideoCapture.opens += 1
+
+    @classmethod
+    def unplug(cls):
+        cls.plugged = False
+
+    @classmethod
+    def plug(cls):
+        cls.plugged = True
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self, image=None):
+        time.sleep(self.interval)
+        if not (self._opened and FakeVideoCapture.plugged):
+            self._opened = False
+            return False, None
+        self.frames += 1
+        if image is None:
+            image = self._np.empty(self.shape, dtype=self._np.uint8)
+        image.fill(self.frames % 256)
+        return True, image
+
+    def release(self):
+        self._opened = False
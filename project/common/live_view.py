@@ -0,0 +1,196 @@
+import threading
+import time
+
+from .paging import DEFAULT_LIMIT, DESCENDING, CursorNotFound, clamp_limit
+
+
+# The newest VIEW_SIZE documents of a Firestore collection, held in memory
+# by the webapp and kept current by a snapshot listener, so /api/images and
+# /api/recordings polls are answered without a Firestore query:
+#
+#   view = LiveView(db.collection("recordings")).start()
+#   page = view.page(limit=50, since_id=...)   # fetch_page()'s shape, or None
+#
+# page() returns None when the answer is not (entirely) in the window:
+# before the first snapshot, after the listener stopped, or when a page
+# runs past the oldest document held. The caller then asks Firestore.
+#
+# python3 -m common.live_view (from the project directory) compares
+# Firestore reads of polling clients with and without the view.
+
+VIEW_SIZE = 500   # documents held per collection (the listener's limit)
+
+
+class LiveView:
+    """
+    A listener on `collection` ordered by `order_field`, newest first,
+    limited to `size`. Each snapshot carries the query's whole current
+    result, already sorted; the list and its id index are published
+    together as one tuple, which readers take once, so they never see a
+    half-applied update.
+    Firestore bills the initial result and then one read per changed
+    document, however many clients poll.
+    """
+
+    def __init__(self, collection, size=VIEW_SIZE, order_field="timestamp"):
+        self.collection = collection
+        self.size = size
+        self.order_field = order_field
+        self._state = ([], {})  # ([(snapshot, data)] newest first, {doc id: position})
+        self._ready = threading.Event()
+        self._watch = None
+        self.updates = 0
+        self.changes = 0
+        self.served = 0
+        self.fallbacks = 0
+
+    def start(self):
+        query = self.collection.order_by(self.order_field, direction=DESCENDING).limit(self.size)
+        self._watch = query.on_snapshot(self._on_snapshot)
+        return self
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+        self._ready.clear()
+
+    def _on_snapshot(self, docs, changes, read_time):
+        items = [(doc, doc.to_dict() or {}) for doc in docs]
+        self._state = (items, {doc.id: i for i, (doc, _) in enumerate(items)})
+        self.updates += 1
+        self.changes += len(changes)
+        self._ready.set()
+
+    def wait(self, timeout=None):
+        """Block until the first snapshot has arrived. Returns False on timeout."""
+        return self._ready.wait(timeout)
+
+    @property
+    def listening(self):
+        """True while the listener is running, whether or not a snapshot has arrived yet."""
+        return self._watch is not None and getattr(self._watch, "is_active", True)
+
+    @property
+    def active(self):
+        """True while the view is loaded and its listener is still running."""
+        return self._ready.is_set() and self.listening
+
+    def page(self, limit=DEFAULT_LIMIT, start_after=None, since=None, since_id=None, match=None):
+        """
+        fetch_page() from memory: the same arguments (with `match`, a
+        predicate on the document dict, standing in for both the label
+        filters and `exclude`) and the same result, or None if the window
+        cannot answer it completely.
+        """
+        if not self.active:
+            self.fallbacks += 1
+            return None
+        limit = clamp_limit(limit)
+        items, index = self._state
+        full = len(items) >= self.size  # older documents may exist beyond the window
+
+        def position(doc_id):
+            if doc_id in index:
+                return index[doc_id]
+            if full:
+                return None
+            raise CursorNotFound(doc_id)  # the window holds the whole collection
+
+        first, end = 0, len(items)
+        if since_id is not None:
+            end = position(since_id)
+        if start_after is not None:
+            first = position(start_after)
+            first = None if first is None else first + 1
+        if first is None or end is None:
+            self.fallbacks += 1
+            return None
+
+        docs, last, more, bounded = [], None, False, end < len(items)
+        for snapshot, data in items[first:end]:
+            if since is not None and not data.get(self.order_field, since) > since:
+                bounded = True
+                break
+            last = snapshot
+            if match is not None and not match(data):
+                continue
+            if len(docs) == limit:
+                more = True
+                break
+            docs.append(snapshot)
+        if not more and not bounded and full:
+            self.fallbacks += 1  # ran off the oldest document held
+            return None
+
+        self.served += 1
+        if docs and (more or match is None):
+            next_start_after = docs[-1].id
+        else:
+            next_start_after = last.id if last is not None else start_after
+        return {
+            "docs": docs,
+            "more": more,
+            "newest_id": docs[0].id if docs else since_id,
+            "next_start_after": next_start_after,
+            "scanned": 0,
+        }
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "documents": len(self._state[0]),
+            "updates": self.updates,
+            "changes": self.changes,
+            "served": self.served,
+            "fallbacks": self.fallbacks,
+        }
+
+
+# =========================
+# READ CHECK
+# =========================
+def simulate_clients(clients=(1, 5, 20), polls=20, writes_per_poll=1, size=2000, limit=DEFAULT_LIMIT):
+    """
+    `clients` browsers each polling a `size`-document FakeFirestore
+    `recordings` collection `polls` times (first page, then deltas), with
+    `writes_per_poll` new recordings between poll rounds: Firestore reads
+    with fetch_page() per request versus one LiveView, and page() time.
+    """
+    from .fakes import FakeFirestore
+    from .paging import fetch_page
+
+    report = {}
+    for count in clients:
+        row = {}
+        for mode in ("firestore", "view"):
+            db = FakeFirestore()
+            collection = db.collection("recordings")
+            for i in range(size):
+                collection.document(str(i)).set({"timestamp": i, "labels": ["Speech"], "probs": [0.7]})
+            db.reads = 0
+            view = LiveView(collection).start() if mode == "view" else None
+            newest = [None] * count
+            timings, n = [], size
+            for _ in range(polls):
+                for _ in range(writes_per_poll):
+                    collection.document(str(n)).set({"timestamp": n, "labels": ["Dog"], "probs": [0.9]})
+                    n += 1
+                for c in range(count):
+                    start = time.perf_counter()
+                    page = view.page(limit, since_id=newest[c]) if view is not None else None
+                    if page is None:
+                        page = fetch_page(collection, limit, since_id=newest[c])
+                    timings.append(time.perf_counter() - start)
+                    newest[c] = page["newest_id"]
+            timings.sort()
+            row[mode] = {"reads": db.reads, "us_p50": round(timings[len(timings) // 2] * 1e6, 1)}
+            if view is not None:
+                row[mode]["fallbacks"] = view.fallbacks
+                view.stop()
+        report[count] = row
+    return report
+
+
+if __name__ == "__main__":
+    for count, row in simulate_clients().items():
+        print(f"{count:>3} clients: " + "  ".join(f"{k} {v}" for k, v in row.items()))
@@ -0,0 +1,355 @@
+import bisect
+import functools
+import threading
+import time
+
+
+# Counters, gauges and fixed-bucket histograms rendered in the Prometheus
+# text format. Recording is a bisect plus a few additions under a
+# per-metric lock, so instrumentation stays on in production.
+#
+#   from common import metrics
+#   STAGE = metrics.histogram("sound_stage_seconds", "Time per pipeline stage", ["stage"])
+#   INFER = STAGE.labels(stage="infer")       # bind once on hot paths
+#   with INFER.time(): ...
+#   metrics.serve(9101)                       # GET /metrics
+#   metrics.LogSummary(60).start()            # periodic one-line summaries
+
+# seconds: 0.1 ms .. 60 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_str(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        try:
+            if len(labels) == len(self.label_names):
+                return tuple(str(labels[k]) for k in self.label_names)
+        except KeyError:
+            pass
+        raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+
+    def labels(self, **labels):
+        """This metric with its label values bound, skipping the lookup per call."""
+        return _Bound(self, self._key(labels))
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        self._inc(self._key(labels), amount)
+
+    def _inc(self, key, amount=1):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_label_str(self.label_names, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """
+    Set directly, or give `fn` to read the value at scrape time; set_fn()
+    does the same for one labelled series.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self._values = {}
+        self._fns = {}
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_fn(self, fn, **labels):
+        """Read this series from fn() at scrape time."""
+        with self._lock:
+            self._fns[self._key(labels)] = fn
+
+    def remove(self, **labels):
+        """Drop a series (e.g. of a closed resource)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+            self._fns.pop(key, None)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+            fns = list(self._fns.items())
+        if self.fn is not None:
+            fns.insert(0, ((), self.fn))
+        for key, fn in fns:
+            try:
+                items.append((key, float(fn())))
+            except Exception:
+                pass
+        return self.header() + [f"{self.name}{_label_str(self.label_names, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket counts..., +Inf count], sum
+
+    def observe(self, value, **labels):
+        self._observe(self._key(labels), value)
+
+    def _observe(self, key, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def time(self, **labels):
+        """Context manager / decorator observing the elapsed seconds."""
+        return _Timer(self, self._key(labels))
+
+    def snapshot(self):
+        """{label values: (count, sum, cumulative bucket counts)}."""
+        with self._lock:
+            items = [(k, list(counts), total) for k, (counts, total) in self._series.items()]
+        out = {}
+        for key, counts, total in items:
+            cumulative, running = [], 0
+            for c in counts:
+                running += c
+                cumulative.append(running)
+            out[key] = (running, total, cumulative)
+        return out
+
+    def quantile(self, q, **labels):
+        """Estimate from the buckets (linear within a bucket), like histogram_quantile()."""
+        snap = self.snapshot().get(self._key(labels))
+        return None if snap is None else _bucket_quantile(q, self.buckets, snap[0], snap[2])
+
+    def render(self):
+        lines = self.header()
+        for key, (count, total, cumulative) in self.snapshot().items():
+            for bound, c in zip(self.buckets, cumulative):
+                lines.append(f"{self.name}_bucket{_label_str(self.label_names, key, [('le', repr(bound))])} {c}")
+            lines.append(f"{self.name}_bucket{_label_str(self.label_names, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_label_str(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_label_str(self.label_names, key)} {count}")
+        return lines
+
+
+def _bucket_quantile(q, buckets, count, cumulative):
+    if count == 0:
+        return None
+    rank = q * count
+    lower, prev = 0.0, 0
+    for bound, c in zip(buckets, cumulative):
+        if c >= rank:
+            return lower + (bound - lower) * ((rank - prev) / (c - prev) if c > prev else 1.0)
+        lower, prev = bound, c
+    return buckets[-1]  # in the +Inf bucket: report the largest finite bound
+
+
+class _Bound:
+    def __init__(self, metric, key):
+        self.metric = metric
+        self.key = key
+
+    def inc(self, amount=1):
+        self.metric._inc(self.key, amount)
+
+    def observe(self, value):
+        self.metric._observe(self.key, value)
+
+    def time(self):
+        return _Timer(self.metric, self.key)
+
+
+class _Timer:
+    def __init__(self, histogram, key):
+        self.histogram = histogram
+        self.key = key
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram._observe(self.key, time.perf_counter() - self._start)
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram, self.key):  # one timer per call, safe across threads
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+# =========================
+# REGISTRY
+# =========================
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self):
+        lines = []
+        for metric in self.metrics():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def counter(name, help, labels=(), registry=REGISTRY):
+    return registry._get_or_create(Counter, name, help, labels)
+
+def gauge(name, help, labels=(), fn=None, registry=REGISTRY):
+    return registry._get_or_create(Gauge, name, help, labels, fn=fn)
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+    return registry._get_or_create(Histogram, name, help, labels, buckets=buckets)
+
+def render(registry=REGISTRY):
+    return registry.render()
+
+
+# =========================
+# EXPOSITION
+# =========================
+def serve(port, host="0.0.0.0", registry=REGISTRY):
+    """Serve GET /metrics from a daemon thread (for the non-Flask processes)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"📈 Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+class LogSummary:
+    """
+    Every `interval` seconds print one line per histogram series (count
+    since the last summary, p50/p95 over the whole run) and every non-zero
+    counter.
+    """
+
+    def __init__(self, interval=60.0, registry=REGISTRY, prefix="[METRICS]"):
+        self.interval = interval
+        self.registry = registry
+        self.prefix = prefix
+        self._last_counts = {}
+        self._stop = threading.Event()
+
+    def summary(self):
+        lines = []
+        for metric in self.registry.metrics():
+            if isinstance(metric, Histogram):
+                for key, (count, _, cumulative) in metric.snapshot().items():
+                    new = count - self._last_counts.get((metric.name, key), 0)
+                    self._last_counts[(metric.name, key)] = count
+                    p50 = _bucket_quantile(0.5, metric.buckets, count, cumulative)
+                    p95 = _bucket_quantile(0.95, metric.buckets, count, cumulative)
+                    lines.append(f"{metric.name}{_label_str(metric.label_names, key)} n={count} (+{new}) "
+                                 f"p50={p50 * 1000:.1f}ms p95={p95 * 1000:.1f}ms")
+            elif isinstance(metric, Counter):
+                for key, value in list(metric._values.items()):
+                    lines.append(f"{metric.name}{_label_str(metric.label_names, key)} {value}")
+        return lines
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for line in self.summary():
+                print(f"{self.prefix} {line}")
+
+    def start(self):
+        threading.Thread(target=self._run, name="metrics-summary", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    # python3 -m common.metrics: cost of one timed observation
+    h = histogram("overhead_check_seconds", "self-test", ["stage"])
+    bound = h.labels(stage="bound")
+    n = 200_000
+    for name, make in (("labels per call", lambda: h.time(stage="x")), ("bound labels", bound.time)):
+        start = time.perf_counter()
+        for _ in range(n):
+            with make():
+                pass
+        print(f"timed observation, {name}: {(time.perf_counter() - start) / n * 1e9:.0f} ns")
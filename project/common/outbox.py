@@ -0,0 +1,489 @@
+import collections
+import json
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+
+SEND_SECONDS = metrics.histogram("outbox_send_seconds",
+                                 "GCS upload (blob) and delete rounds, Firestore batch commits (doc)", ["kind"])
+ITEMS = metrics.counter("outbox_items_total", "Outbox items by outcome", ["kind", "outcome"])
+# one series per outbox file: the camera and the sound monitor can share a process
+QUEUED = metrics.gauge("outbox_queued", "Items waiting in the outbox", ["outbox"])
+OLDEST_AGE = metrics.gauge("outbox_oldest_age_seconds", "Age of the oldest queued item", ["outbox"])
+
+
+# =========================
+# SINKS
+# =========================
+class FirestoreSink:
+    """Commits documents with Firestore write batches (max 500 writes each)."""
+
+    MAX_BATCH = 500
+
+    def __init__(self, db):
+        self.db = db
+
+    def write(self, docs):
+        """docs: list of (collection, doc_id, data)."""
+        for i in range(0, len(docs), self.MAX_BATCH):
+            batch = self.db.batch()
+            for collection, doc_id, data in docs[i:i + self.MAX_BATCH]:
+                batch.set(self.db.collection(collection).document(doc_id), data)
+            batch.commit()
+
+
+class GCSSink:
+    """
+    Uploads blobs to a GCS bucket. Public blobs get the publicRead ACL as
+    part of the upload request instead of a separate make_public() call.
+    """
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def upload(self, name, data, content_type, public=True):
+        blob = self.bucket.blob(name)
+        blob.upload_from_string(data, content_type=content_type, predefined_acl="publicRead" if public else None)
+
+    def delete(self, name):
+        try:
+            self.bucket.blob(name).delete()
+        except Exception as e:
+            if type(e).__name__ != "NotFound":  # google.api_core.exceptions.NotFound: never uploaded
+                raise
+
+    def public_url(self, name):
+        # what blob.public_url returns, known before the upload happens
+        return f"https://storage.googleapis.com/{self.bucket.name}/{name}"
+
+
+# =========================
+# OUTBOX
+# =========================
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,             -- 'doc', 'blob' or 'delete' (of a blob)
+    target TEXT NOT NULL,           -- collection name or blob name
+    doc_id TEXT,
+    payload BLOB NOT NULL,          -- JSON for docs, raw bytes for blobs
+    content_type TEXT,
+    public INTEGER DEFAULT 1,
+    depends_on INTEGER,             -- blob row that must be delivered first
+    attempts INTEGER DEFAULT 0,
+    next_attempt REAL DEFAULT 0,
+    created REAL NOT NULL,
+    last_error TEXT,
+    rejections INTEGER DEFAULT 0    -- failures while other items in the same pass went through
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (kind, next_attempt);
+CREATE TABLE IF NOT EXISTS dead_letter (
+    id INTEGER PRIMARY KEY,         -- the item's outbox id
+    kind TEXT NOT NULL,
+    target TEXT NOT NULL,
+    doc_id TEXT,
+    payload BLOB NOT NULL,
+    content_type TEXT,
+    attempts INTEGER,
+    created REAL NOT NULL,
+    failed REAL NOT NULL,
+    last_error TEXT
+);
+"""
+
+
+class Outbox:
+    """
+    Durable local queue for Firestore writes and GCS uploads.
+
+    Producers call put_blob() / put_document(), which only insert a row
+    into a SQLite file and return immediately. A background sender drains
+    the queue: blobs are uploaded by a bounded thread pool, then due
+    documents are committed in Firestore write batches. A failed item is
+    retried with exponential backoff (with jitter), and anything still
+    queued at shutdown is sent after the next start.
+
+    A failed Firestore batch is bisected, so only the documents that fail
+    on their own back off; if both halves fail too it is an outage and the
+    whole batch backs off together. An item that keeps failing while other
+    items go through (`max_rejections` times) is moved to the dead_letter
+    table with its last error (with the documents depending on it, for a
+    blob) instead of being retried forever. An outage never dead-letters.
+
+    A document can depend on a blob (e.g. a record holding the file's
+    URL); it is not written until that blob has been uploaded. Public URLs
+    are deterministic, so producers get them up front from public_url().
+    A blob queued ahead of the document that would reference it can be
+    taken back with discard_blob().
+    """
+
+    def __init__(self, path, firestore=None, storage=None, batch_size=100, upload_workers=4,
+                 base_delay=1.0, max_delay=300.0, poll_interval=0.5, max_rejections=5):
+        self.path = path
+        self.firestore = firestore
+        self.storage = storage
+        self.batch_size = batch_size
+        self.upload_workers = upload_workers
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.max_rejections = max_rejections
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(outbox)")}
+        if "rejections" not in columns:  # outbox files from before dead-lettering
+            self._db.execute("ALTER TABLE outbox ADD COLUMN rejections INTEGER DEFAULT 0")
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+        self._pool = None
+
+        self.delivered = {"doc": 0, "blob": 0, "delete": 0}
+        self.failures = 0
+        self.dead_lettered = 0
+        self.last_error = None
+        self._recent = collections.deque()  # (time, items delivered)
+        QUEUED.set_fn(lambda: self.depth()["total"], outbox=path)
+        OLDEST_AGE.set_fn(lambda: self.depth()["oldest_age_s"], outbox=path)
+
+    # ---------- producers ----------
+    def _insert(self, kind, target, payload, doc_id=None, content_type=None, public=True, depends_on=None):
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO outbox (kind, target, doc_id, payload, content_type, public, depends_on, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, target, doc_id, payload, content_type, int(public), depends_on, time.time()),
+            )
+        self._wake.set()
+        ITEMS.inc(kind=kind, outcome="queued")
+        return cur.lastrowid
+
+    def put_blob(self, name, data, content_type="application/octet-stream", public=True):
+        """Queue an upload. Returns its row id (for put_document's depends_on)."""
+        return self._insert("blob", name, sqlite3.Binary(data), content_type=content_type, public=public)
+
+    def put_document(self, collection, doc_id, data, depends_on=None):
+        """Queue a Firestore set(). `data` must be JSON-serialisable."""
+        return self._insert("doc", collection, json.dumps(data), doc_id=str(doc_id), depends_on=depends_on)
+
+    def discard_blob(self, blob_id, name):
+        """
+        Take back a put_blob() (e.g. nothing will reference it): drop the
+        upload and documents depending on it if still queued, and queue a
+        delete of `name`, as the upload may already have happened or be
+        under way. The delete runs after any upload of the same pass.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM outbox WHERE id = ? OR depends_on = ?", (blob_id, blob_id))
+        return self._insert("delete", name, b"")
+
+    def public_url(self, name):
+        return self.storage.public_url(name)
+
+    # ---------- sender ----------
+    def start(self):
+        self._running = True
+        self._pool = ThreadPoolExecutor(max_workers=self.upload_workers, thread_name_prefix="outbox-upload")
+        self._thread = threading.Thread(target=self._run, name="outbox-sender", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, drain_timeout=10.0):
+        """Try to drain for up to `drain_timeout` s, then stop; the rest stays queued."""
+        deadline = time.monotonic() + drain_timeout
+        while self.depth()["total"] and time.monotonic() < deadline and self._running:
+            time.sleep(0.05)
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def flush(self, timeout=None):
+        """Block until the queue is empty or `timeout` expires. Returns True if empty."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.depth()["total"]:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _run(self):
+        while self._running:
+            self._wake.clear()  # before sending, so an insert made during the pass is not missed
+            sent = self.send_once()
+            if not sent:
+                self._wake.wait(self.poll_interval)
+
+    def send_once(self):
+        """One drain pass: due blobs, blob deletes, then due documents. Returns items delivered."""
+        return self._send_blobs() + self._send_deletes() + self._send_docs()
+
+    def _due(self, kind, limit, extra=""):
+        with self._lock:
+            return self._db.execute(
+                f"SELECT id, target, doc_id, payload, content_type, public, attempts, rejections FROM outbox"
+                f" WHERE kind = ? AND next_attempt <= ? {extra} ORDER BY id LIMIT ?",
+                (kind, time.time(), limit),
+            ).fetchall()
+
+    def _send_blobs(self):
+        return self._send_storage("blob", lambda row: self.storage.upload(row[1], bytes(row[3]), row[4],
+                                                                          bool(row[5])))
+
+    def _send_deletes(self):
+        return self._send_storage("delete", lambda row: self.storage.delete(row[1]))
+
+    def _send_storage(self, kind, send):
+        if self.storage is None:
+            return 0
+        rows = self._due(kind, self.upload_workers * 2)
+        if not rows:
+            return 0
+        start = time.perf_counter()
+        futures = [(row, self._pool.submit(send, row)) for row in rows]
+        done, failed = [], []
+        for row, future in futures:
+            try:
+                future.result()
+                done.append(row[0])
+            except Exception as e:
+                failed.append((row, e))
+        SEND_SECONDS.observe(time.perf_counter() - start, kind=kind)
+        if failed:
+            self._retry(failed, kind, rejected=bool(done))
+        self._delete(done, kind)
+        return len(done)
+
+    def _send_docs(self):
+        if self.firestore is None:
+            return 0
+        rows = self._due("doc", self.batch_size,
+                         "AND (depends_on IS NULL OR depends_on NOT IN (SELECT id FROM outbox))")
+        if not rows:
+            return 0
+        try:
+            self._commit(rows)
+            done, failed = rows, []
+        except Exception as e:
+            done, failed = self._bisect(rows, e)
+        if failed:
+            self._retry(failed, "doc", rejected=bool(done))
+        self._delete([row[0] for row in done], "doc")
+        return len(done)
+
+    def _commit(self, rows):
+        with SEND_SECONDS.time(kind="doc"):
+            self.firestore.write([(row[1], row[2], json.loads(row[3])) for row in rows])
+
+    def _bisect(self, rows, error):
+        """
+        Rows of a batch that failed with `error`: commit each half on its
+        own, recursing into failing halves, until the failing rows are
+        found. Returns (committed rows, [(failed row, error)]).
+        """
+        if len(rows) == 1:
+            return [], [(rows[0], error)]
+        mid = len(rows) // 2
+        done, failing = [], []
+        for half in (rows[:mid], rows[mid:]):
+            try:
+                self._commit(half)
+                done += half
+            except Exception as e:
+                failing.append((half, e))
+        if not done:  # both halves failed as well: Firestore is down, not one bad row
+            return [], [(row, e) for half, e in failing for row in half]
+        failed = []
+        for half, e in failing:
+            half_done, half_failed = self._bisect(half, e)
+            done += half_done
+            failed += half_failed
+        return done, failed
+
+    def _retry(self, failed, kind, rejected):
+        """
+        Back off [(row, error)]. With `rejected` (other items went through
+        in the same pass) the failures count towards max_rejections.
+        """
+        ITEMS.inc(len(failed), kind=kind, outcome="retried")
+        self.failures += len(failed)
+        errors = {row[0]: f"{type(e).__name__}: {e}" for row, e in failed}
+        self.last_error = errors[failed[-1][0][0]]
+        print(f"⚠️ Outbox send failed ({len(failed)} item(s)), will retry: {self.last_error}")
+        now = time.time()
+        dead = []
+        with self._lock:
+            for row, _ in failed:
+                attempts = row[6] + 1
+                rejections = row[7] + rejected
+                if rejections >= self.max_rejections:
+                    dead.append(row[0])
+                delay = min(self.max_delay, self.base_delay * 2 ** min(attempts - 1, 32)) * random.uniform(0.5, 1.0)
+                self._db.execute("UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ?, rejections = ?"
+                                 " WHERE id = ?", (attempts, now + delay, errors[row[0]], rejections, row[0]))
+        if dead:
+            self._dead_letter(dead, kind)
+
+    def _dead_letter(self, ids, kind):
+        """Move items (and documents depending on them) from the queue to dead_letter."""
+        with self._lock:
+            marks = ",".join("?" * len(ids))
+            ids = ids + [r[0] for r in self._db.execute(
+                f"SELECT id FROM outbox WHERE depends_on IN ({marks})", ids)]
+            marks = ",".join("?" * len(ids))
+            self._db.execute("BEGIN")
+            self._db.execute(
+                f"INSERT OR REPLACE INTO dead_letter (id, kind, target, doc_id, payload, content_type, attempts,"
+                f" created, failed, last_error) SELECT id, kind, target, doc_id, payload, content_type, attempts,"
+                f" created, ?, COALESCE(last_error, 'depends on a dead-lettered blob') FROM outbox"
+                f" WHERE id IN ({marks})", [time.time()] + ids)
+            self._db.execute(f"DELETE FROM outbox WHERE id IN ({marks})", ids)
+            self._db.execute("COMMIT")
+        self.dead_lettered += len(ids)
+        ITEMS.inc(len(ids), kind=kind, outcome="dead_letter")
+        print(f"☠️ Outbox gave up on {len(ids)} item(s), kept in dead_letter: {self.last_error}")
+
+    def dead_letters(self):
+        """[(id, kind, target, doc_id, attempts, last_error)] of the items given up on."""
+        with self._lock:
+            return self._db.execute("SELECT id, kind, target, doc_id, attempts, last_error FROM dead_letter"
+                                    " ORDER BY id").fetchall()
+
+    def _delete(self, ids, kind):
+        if not ids:
+            return
+        with self._lock:
+            self._db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+        self.delivered[kind] += len(ids)
+        ITEMS.inc(len(ids), kind=kind, outcome="delivered")
+        self._recent.append((time.monotonic(), len(ids)))
+
+    # ---------- visibility ----------
+    def depth(self):
+        with self._lock:
+            rows = self._db.execute("SELECT kind, COUNT(*), MIN(created) FROM outbox GROUP BY kind").fetchall()
+        out = {"doc": 0, "blob": 0, "delete": 0, "total": 0, "oldest_age_s": 0.0}
+        for kind, count, oldest in rows:
+            out[kind] = count
+            out["total"] += count
+            out["oldest_age_s"] = max(out["oldest_age_s"], time.time() - oldest)
+        return out
+
+    def stats(self, window=60.0):
+        now = time.monotonic()
+        while self._recent and now - self._recent[0][0] > window:
+            self._recent.popleft()
+        return {
+            "queued": self.depth(),
+            "delivered": dict(self.delivered),
+            "drain_per_s": sum(n for _, n in self._recent) / window,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+            "last_error": self.last_error,
+        }
+
+    def close(self):
+        QUEUED.remove(outbox=self.path)
+        OLDEST_AGE.remove(outbox=self.path)
+        with self._lock:
+            self._db.close()
+
+
+# =========================
+# OUTAGE SIMULATION
+# =========================
+def simulate_outage(path, events=50, outage_seconds=1.0):
+    """
+    Enqueue `events` blob + document pairs against the in-memory fakes
+    while they are offline, restart the outbox mid-outage, then bring the
+    fakes back and check everything arrives exactly once.
+    """
+    from .fakes import FakeBucket, FakeFirestore
+
+    db, bucket = FakeFirestore(), FakeBucket()
+    db.offline = bucket.offline = True
+    outbox = Outbox(path, FirestoreSink(db), GCSSink(bucket), base_delay=0.05, max_delay=0.2).start()
+    for i in range(events):
+        blob_id = outbox.put_blob(f"rec_{i}.wav", b"RIFF" + bytes(64), "audio/wav")
+        outbox.put_document("recordings", i, {"timestamp": i, "wav_url": outbox.public_url(f"rec_{i}.wav")},
+                            depends_on=blob_id)
+    time.sleep(outage_seconds / 2)
+    outbox.stop(drain_timeout=0)
+    outbox.close()
+
+    outbox = Outbox(path, FirestoreSink(db), GCSSink(bucket), base_delay=0.05, max_delay=0.2).start()
+    time.sleep(outage_seconds / 2)
+    queued = outbox.depth()
+    db.offline = bucket.offline = False
+    start = time.monotonic()
+    drained = outbox.flush(timeout=30)
+    elapsed = time.monotonic() - start
+    stats = outbox.stats()
+    outbox.stop()
+    outbox.close()
+    return {
+        "queued_after_restart": queued["total"],
+        "drained": drained,
+        "drain_seconds": round(elapsed, 3),
+        "docs": len(db.data.get("recordings", {})),
+        "blobs": len(bucket.blobs),
+        "firestore_batches": db.batches,
+        "failures": stats["failures"],
+    }
+
+
+def simulate_poison(path, events=200, per_pass=5):
+    """
+    One document Firestore always rejects, queued ahead of `events` good
+    ones arriving `per_pass` at a time. Reports how long the good ones
+    waited and what happened to the bad one.
+    """
+    from .fakes import FakeFirestore
+
+    db = FakeFirestore()
+    db.rejected_docs.add("bad")
+    outbox = Outbox(path, FirestoreSink(db), base_delay=0.05, max_delay=0.2, max_rejections=3)
+    outbox.put_document("recordings", "bad", {"timestamp": -1})
+    waits, queued_at, i = [], {}, 0
+    while i < events or queued_at:
+        for _ in range(min(per_pass, events - i)):
+            outbox.put_document("recordings", i, {"timestamp": i})
+            queued_at[str(i)] = time.monotonic()
+            i += 1
+        outbox.send_once()
+        now = time.monotonic()
+        for doc_id in [d for d in queued_at if d in db.data.get("recordings", {})]:
+            waits.append(now - queued_at.pop(doc_id))
+        time.sleep(0.01)
+    waits.sort()
+    stats = outbox.stats()
+    dead = outbox.dead_letters()
+    outbox.close()
+    return {
+        "delivered": stats["delivered"]["doc"],
+        "good_wait_ms_p50": round(waits[len(waits) // 2] * 1000, 1),
+        "good_wait_ms_max": round(waits[-1] * 1000, 1),
+        "firestore_commits": db.batches,
+        "dead_letter": [(row[3], row[4], row[5]) for row in dead],
+        "still_queued": stats["queued"]["total"],
+    }
+
+
+if __name__ == "__main__":
+    # python3 -m common.outbox from project root directory
+    import os
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(simulate_outage(os.path.join(tmp, "outbox.db")))
+        print(simulate_poison(os.path.join(tmp, "poison.db")))
@@ -0,0 +1,148 @@
+import json
+import time
+
+
+# Newest-first Firestore pages for the webapp's /api/images and
+# /api/recordings, so a poll reads (and sends) a page or a delta instead
+# of the whole collection:
+#
+#   page = fetch_page(db.collection("recordings"), limit=50)              # newest page
+#   page = fetch_page(..., start_after=page["next_start_after"])          # older page
+#   page = fetch_page(..., since_id=page["newest_id"])                    # only what is new
+#
+# Cursors are document ids; the cursor document is read once (1 read) to
+# position the query, as Firestore cursors need the ordered field values.
+#
+# python3 -m common.paging (from the project directory) compares document
+# reads and response bytes against streaming the collection.
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500            # documents per page
+MAX_SCAN = 2000            # documents read per request while skipping `exclude`d ones
+ASCENDING = "ASCENDING"    # firestore.Query.ASCENDING / DESCENDING are these strings
+DESCENDING = "DESCENDING"
+
+
+class CursorNotFound(LookupError):
+    """A start_after / since_id document that does not exist (deleted, or a bad id)."""
+
+
+def clamp_limit(limit, default=DEFAULT_LIMIT):
+    if limit is None:
+        return default
+    return max(1, min(int(limit), MAX_LIMIT))
+
+def _snapshot(collection, doc_id):
+    snapshot = collection.document(str(doc_id)).get()
+    if not snapshot.exists:
+        raise CursorNotFound(doc_id)
+    return snapshot
+
+
+def fetch_page(collection, limit=DEFAULT_LIMIT, start_after=None, since=None, since_id=None, filters=(),
+               exclude=None, order_field="timestamp", max_scan=MAX_SCAN):
+    """
+    One page of `collection`, newest `order_field` first.
+
+    start_after  id of the oldest document the client has; returns older ones
+    since        only documents with order_field > since
+    since_id     only documents newer than this one (the client's newest)
+    filters      (field, op, value) server-side where() clauses; an equality
+                 or "in" filter next to the order_by needs a composite index
+    exclude      predicate on a document's dict; matching documents are
+                 skipped (read, but not returned), for what Firestore cannot
+                 filter (e.g. case-insensitive labels), up to `max_scan` reads
+
+    Returns {"docs": [snapshot], "more": bool, "newest_id", "next_start_after"}.
+    A delta (since / since_id) also comes newest first and holds at most
+    `limit` documents; "more" then means there are new documents that did
+    not fit, and the client should reload the newest page instead.
+    """
+    limit = clamp_limit(limit)
+    query = collection
+    for field, op, value in filters:
+        query = query.where(field, op, value)
+    query = query.order_by(order_field, direction=DESCENDING)
+    if since_id is not None:
+        query = query.end_before(_snapshot(collection, since_id))
+    elif since is not None:
+        query = query.where(order_field, ">", since)
+    if start_after is not None:
+        query = query.start_after(_snapshot(collection, start_after))
+
+    docs, scanned, last, more = [], 0, None, False
+    chunk = limit + 1 if exclude is None else max(limit + 1, 2 * limit)
+    while True:
+        batch = list((query if last is None else query.start_after(last)).limit(chunk).stream())
+        for snapshot in batch:
+            scanned += 1
+            last = snapshot
+            if exclude is not None and exclude(snapshot.to_dict() or {}):
+                continue
+            if len(docs) == limit:
+                more = True
+                break
+            docs.append(snapshot)
+        if more or len(batch) < chunk:
+            break
+        if scanned >= max_scan:
+            more = True  # unscanned documents may still match
+            break
+
+    if docs and (more or exclude is None):
+        next_start_after = docs[-1].id
+    else:
+        next_start_after = last.id if last is not None else start_after
+    return {
+        "docs": docs,
+        "more": more,
+        "newest_id": docs[0].id if docs else since_id,
+        "next_start_after": next_start_after,
+        "scanned": scanned,
+    }
+
+
+# =========================
+# READ / BYTE CHECK
+# =========================
+def simulate_polls(sizes=(1000, 10000, 100000), limit=DEFAULT_LIMIT, new_per_poll=3):
+    """
+    Fills a FakeFirestore `recordings` collection with `size` documents and
+    compares one poll of the old endpoint (stream everything) with the
+    first page and a delta poll after `new_per_poll` new recordings:
+    Firestore document reads, response bytes and time.
+    """
+    from .fakes import FakeFirestore
+
+    report = {}
+    for size in sizes:
+        db = FakeFirestore()
+        collection = db.collection("recordings")
+        for i in range(size):
+            collection.document(str(i)).set({"timestamp": 1_700_000_000 + i, "labels": ["Speech", "Music"],
+                                             "probs": [0.71, 0.12], "wav_url": f"https://example/rec_{i}.wav"})
+
+        def measure(fetch):
+            db.reads = 0
+            start = time.perf_counter()
+            items = fetch()
+            body = json.dumps(items)
+            return {"reads": db.reads, "kb": round(len(body) / 1024, 1),
+                    "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+        full = measure(lambda: [dict(d.to_dict(), id=d.id) for d in
+                                collection.order_by("timestamp", direction=DESCENDING).stream()])
+        first = fetch_page(collection, limit)
+        page = measure(lambda: [dict(d.to_dict(), id=d.id) for d in fetch_page(collection, limit)["docs"]])
+        for i in range(size, size + new_per_poll):
+            collection.document(str(i)).set({"timestamp": 1_700_000_000 + i, "labels": ["Dog"], "probs": [0.9],
+                                             "wav_url": f"https://example/rec_{i}.wav"})
+        delta = measure(lambda: [dict(d.to_dict(), id=d.id) for d in
+                                 fetch_page(collection, limit, since_id=first["newest_id"])["docs"]])
+        report[size] = {"stream_all": full, "first_page": page, "delta": delta}
+    return report
+
+
+if __name__ == "__main__":
+    for size, row in simulate_polls().items():
+        print(f"{size:>7} docs: " + "  ".join(f"{k} {v}" for k, v in row.items()))
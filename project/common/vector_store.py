@@ -0,0 +1,351 @@
+import collections
+import json
+import os
+import threading
+import time
+import numpy as np
+
+
+# Embeddings keyed by id (e.g. a Firestore document id), searched by cosine
+# similarity: the sound monitor writes one row per persisted event and the
+# webapp reads the same files for "find similar sounds".
+#
+#   store = VectorStore("./sound/vectors/cnn14", dim=2048)
+#   store.add("room1_1700000000", embedding, timestamp=1700000000)
+#   store.search(query, k=5)  ->  [(id, similarity, timestamp), ...]
+#
+# A root holding one store per embedding model names the one being written
+# in active.json (set_active), so readers open the same one (active_dir).
+#
+# python3 -m common.vector_store runs a size / latency check.
+
+INDEX_DTYPE = np.dtype([("id", "S64"), ("timestamp", "<f8")])
+ACTIVE_FILE = "active.json"
+
+
+def set_active(root, name):
+    """Record that the store in root/<name> is the one being written."""
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, ACTIVE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"model": name}, f)
+    os.replace(path + ".tmp", path)
+
+def active_dir(root):
+    """root/<name> of the store set_active() last named, or None if there is none yet."""
+    try:
+        with open(os.path.join(root, ACTIVE_FILE)) as f:
+            name = json.load(f)["model"]
+    except (OSError, ValueError, KeyError):
+        return None
+    return os.path.join(root, name)
+
+
+# =========================
+# VECTOR STORE
+# =========================
+class VectorStore:
+    """
+    Append-only, array-backed store of L2-normalised vectors.
+
+    On disk a store is a directory with three files: meta.json (dim and
+    storage dtype), vectors.bin (rows of `dim` float16 values, 4 KB per
+    2048-d embedding) and index.bin (one fixed-size INDEX_DTYPE record
+    per row). Vectors are written before their index record, so a reader
+    never sees a record without its vector.
+
+    In memory the rows live in one float32 matrix grown by doubling.
+    Because rows are unit length, a query is a single matrix-vector
+    product plus argpartition: an exact flat inner-product index, which
+    at edge-box scale (tens of thousands of rows) is a few milliseconds
+    and needs no training or rebuilds.
+
+    One process writes; others open with readonly=True and call refresh()
+    to pick up appended rows.
+    """
+
+    def __init__(self, root, dim=None, dtype="float16", readonly=False, fsync=False):
+        self.root = root
+        self.readonly = readonly
+        self.fsync = fsync
+        meta_path = os.path.join(root, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if dim is not None and meta["dim"] != dim:
+                raise ValueError(f"{root} holds {meta['dim']}-d vectors, not {dim}-d")
+        elif readonly:
+            raise FileNotFoundError(f"No vector store at {root}")
+        else:
+            if dim is None:
+                raise ValueError("dim is required to create a vector store")
+            os.makedirs(root, exist_ok=True)
+            meta = {"dim": int(dim), "dtype": np.dtype(dtype).name}
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+        self.dim = meta["dim"]
+        self.disk_dtype = np.dtype(meta["dtype"])
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        self._ids = []
+        self._timestamps = np.zeros(0, dtype=np.float64)
+        self._rows = {}  # id -> row
+        self._count = 0
+        self._vec_path = os.path.join(root, "vectors.bin")
+        self._idx_path = os.path.join(root, "index.bin")
+        self._vec_file = self._idx_file = None
+        self.refresh()
+        if not readonly:
+            self._open_for_append()
+
+    def _open_for_append(self):
+        # drop a torn tail (a vector without its record, or an interrupted
+        # compact()) so appended vectors and records stay row-aligned
+        for path, row_bytes in ((self._vec_path, self.dim * self.disk_dtype.itemsize),
+                                (self._idx_path, INDEX_DTYPE.itemsize)):
+            with open(path, "ab") as f:
+                f.truncate(self._count * row_bytes)
+        self._vec_file = open(self._vec_path, "ab")
+        self._idx_file = open(self._idx_path, "ab")
+
+    def _grow(self, n):
+        if n <= len(self._matrix):
+            return
+        capacity = max(n, 2 * len(self._matrix), 1024)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self._count] = self._matrix[:self._count]
+        self._matrix = matrix
+        timestamps = np.zeros(capacity, dtype=np.float64)
+        timestamps[:self._count] = self._timestamps[:self._count]
+        self._timestamps = timestamps
+
+    def _append_rows(self, ids, timestamps, vectors):
+        with self._lock:
+            start = self._count
+            self._grow(start + len(ids))
+            self._matrix[start:start + len(ids)] = vectors
+            self._timestamps[start:start + len(ids)] = timestamps
+            for i, id_ in enumerate(ids):
+                self._rows[id_] = start + i  # a re-added id points at its newest row
+            self._ids.extend(ids)
+            self._count += len(ids)
+
+    def refresh(self):
+        """Load rows appended to the files since the last refresh. Returns how many."""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self):
+        if not os.path.exists(self._idx_path):
+            return 0
+        row_bytes = self.dim * self.disk_dtype.itemsize
+        n_index = os.path.getsize(self._idx_path) // INDEX_DTYPE.itemsize
+        n_vectors = os.path.getsize(self._vec_path) // row_bytes if os.path.exists(self._vec_path) else 0
+        n = min(n_index, n_vectors) - self._count
+        if n <= 0:
+            return 0
+        records = np.fromfile(self._idx_path, dtype=INDEX_DTYPE, count=n,
+                              offset=self._count * INDEX_DTYPE.itemsize)
+        vectors = np.fromfile(self._vec_path, dtype=self.disk_dtype, count=n * self.dim,
+                              offset=self._count * row_bytes).reshape(n, self.dim)
+        self._append_rows([r.decode() for r in records["id"]], records["timestamp"], vectors)
+        return n
+
+    def add(self, id, vector, timestamp=None):
+        """Normalise and append `vector` under `id` (at most 64 bytes of UTF-8)."""
+        if self.readonly:
+            raise RuntimeError("Vector store opened read-only")
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        if len(vector) != self.dim:
+            raise ValueError(f"Expected a {self.dim}-d vector, got {len(vector)}")
+        norm = float(np.linalg.norm(vector))
+        vector = vector / norm if norm > 0 else vector
+        encoded = str(id).encode()
+        if len(encoded) > INDEX_DTYPE["id"].itemsize:
+            raise ValueError(f"id too long for the index: {id!r}")
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        record["id"] = encoded
+        record["timestamp"] = time.time() if timestamp is None else timestamp
+
+        with self._lock:
+            self._vec_file.write(vector.astype(self.disk_dtype).tobytes())
+            self._vec_file.flush()
+            self._idx_file.write(record.tobytes())
+            self._idx_file.flush()
+            if self.fsync:
+                os.fsync(self._vec_file.fileno())
+                os.fsync(self._idx_file.fileno())
+        # store what a reader will load, so writer and readers score identically
+        self._append_rows([str(id)], record["timestamp"], vector.astype(self.disk_dtype))
+
+    def get(self, id):
+        """The stored (normalised) vector for `id`, or None."""
+        with self._lock:
+            row = self._rows.get(str(id))
+            return None if row is None else self._matrix[row].copy()
+
+    def search(self, vector, k=5, since=None, exclude=()):
+        """
+        The `k` most similar rows to `vector` as (id, cosine similarity,
+        timestamp), best first. `since` limits the search to rows with
+        timestamp >= since; ids in `exclude` are skipped.
+        """
+        query = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(query))
+        if norm == 0 or k <= 0:
+            return []
+        with self._lock:
+            n = self._count
+            matrix, timestamps, ids = self._matrix[:n], self._timestamps[:n], self._ids[:n]
+            rows = self._rows
+        start = 0
+        if since is not None:
+            start = int(np.searchsorted(timestamps, since))  # rows are appended in time order
+        scores = matrix[start:] @ (query / norm)
+        # superseded rows (an id added again) are not results
+        want = min(len(scores), k + len(exclude) + (n - len(rows)))
+        if want <= 0:
+            return []
+        top = np.argpartition(-scores, want - 1)[:want] if want < len(scores) else np.arange(len(scores))
+        out = []
+        for i in top[np.argsort(-scores[top])]:
+            row = start + int(i)
+            id_ = ids[row]
+            if id_ in exclude or rows.get(id_) != row:
+                continue
+            out.append((id_, float(scores[i]), float(timestamps[row])))
+            if len(out) == k:
+                break
+        return out
+
+    def compact(self, keep):
+        """
+        Rewrite the store with only the newest row of each id in `keep`;
+        other ids and superseded rows are removed. Returns how many rows
+        went. Writer only: readonly readers must reopen the store after.
+        """
+        if self.readonly:
+            raise RuntimeError("Vector store opened read-only")
+        keep = {str(id_) for id_ in keep}
+        with self._lock:
+            live = sorted((row, id_) for id_, row in self._rows.items() if id_ in keep)
+            removed = self._count - len(live)
+            if not removed:
+                return 0
+            rows = [row for row, _ in live]
+            records = np.zeros(len(live), dtype=INDEX_DTYPE)
+            records["id"] = [id_.encode() for _, id_ in live]
+            records["timestamp"] = self._timestamps[rows]
+            vectors = self._matrix[rows].astype(self.disk_dtype)
+            self.close()
+            # empty index first: a crash part way leaves an empty store, never
+            # old records pointing at new vectors
+            for path, data in ((self._idx_path, b""), (self._vec_path, vectors.tobytes()),
+                               (self._idx_path, records.tobytes())):
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(path + ".tmp", path)
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            self._timestamps = np.zeros(0, dtype=np.float64)
+            self._ids, self._rows, self._count = [], {}, 0
+        self._append_rows([id_ for _, id_ in live], records["timestamp"], vectors)
+        self._open_for_append()
+        return removed
+
+    def __len__(self):
+        return len(self._rows)
+
+    def nbytes(self):
+        """Bytes on disk."""
+        return self._count * (self.dim * self.disk_dtype.itemsize + INDEX_DTYPE.itemsize)
+
+    def close(self):
+        for f in (self._vec_file, self._idx_file):
+            if f is not None:
+                f.close()
+        self._vec_file = self._idx_file = None
+
+
+# =========================
+# NEAR-DUPLICATE FILTER
+# =========================
+class NearDuplicateFilter:
+    """
+    Remembers recent events' embeddings per key (e.g. per stream) and says
+    whether a new one repeats one of them.
+
+    match() compares against events from the last `window` seconds. On a
+    match (cosine >= threshold) it returns the original's ref and restarts
+    that original's window, so a sound repeating every minute keeps
+    matching its first occurrence. Otherwise the new event becomes an
+    original itself and None is returned.
+    """
+
+    def __init__(self, window=300.0, threshold=0.92, max_recent=256):
+        self.window = window
+        self.threshold = threshold
+        self.max_recent = max_recent
+        self._recent = collections.defaultdict(collections.deque)  # key -> deque of [time, vector, ref]
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.duplicates = 0
+
+    def match(self, vector, now, ref, key=None):
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        if norm == 0:
+            return None
+        vector = vector / norm
+        with self._lock:
+            self.checked += 1
+            recent = self._recent[key]
+            while recent and (now - recent[0][0] > self.window or len(recent) > self.max_recent):
+                recent.popleft()
+            best, best_score = None, self.threshold
+            for entry in recent:
+                score = float(entry[1] @ vector)
+                if score >= best_score:
+                    best, best_score = entry, score
+            if best is not None:
+                self.duplicates += 1
+                recent.remove(best)
+                best[0] = now
+                recent.append(best)  # keep the deque in last-seen order
+                return best[2]
+            recent.append([now, vector, ref])
+            return None
+
+    def stats(self):
+        return {"checked": self.checked, "duplicates": self.duplicates,
+                "recent": sum(len(r) for r in self._recent.values())}
+
+
+if __name__ == "__main__":
+    # python3 -m common.vector_store: add / search cost at edge-box sizes
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    dim = 2048
+    for n in (1_000, 10_000, 50_000):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = VectorStore(tmp, dim=dim)
+            vectors = rng.standard_normal((n, dim)).astype(np.float32)
+            start = time.perf_counter()
+            for i, v in enumerate(vectors):
+                store.add(f"rec_{i}", v, timestamp=1_700_000_000 + i)
+            add_us = (time.perf_counter() - start) / n * 1e6
+            query = vectors[n // 2] + 0.1 * rng.standard_normal(dim).astype(np.float32)
+            start = time.perf_counter()
+            for _ in range(20):
+                hits = store.search(query, k=5)
+            search_ms = (time.perf_counter() - start) / 20 * 1000
+            assert hits[0][0] == f"rec_{n // 2}"
+            reader = VectorStore(tmp, readonly=True)
+            assert len(reader) == n and reader.search(query, k=1)[0][0] == hits[0][0]
+            print(f"n={n:>6}: add {add_us:.0f} us, search {search_ms:.2f} ms, "
+                  f"{store.nbytes() / 2**20:.1f} MB on disk")
+            store.close()
@@ -0,0 +1,370 @@
+import io
+import json
+import mmap
+import os
+import threading
+import time
+import wave
+import zlib
+import numpy as np
+
+
+# run with python3 -m sound.archive from project root directory:
+#   list                          segments and event counts
+#   export <segment>#<i> <out.wav>
+#   import [wav dir] [labels dir] copy legacy rec_<ts>.wav/.txt files into the archive
+
+ARCHIVE_DIR = "./sound/archive"
+SEGMENT_FORMAT = "seg_%Y%m%d_%H"   # one segment per local hour
+MAGIC = b"SNDARCH1"
+HEADER_BYTES = 16
+
+CODECS = {"pcm16": 0, "zlib": 1}
+CODEC_NAMES = {v: k for k, v in CODECS.items()}
+
+# One fixed-size index row per event; the .idx file is an array of these
+# after the header, so readers np.memmap it directly
+INDEX_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("offset", "<u8"),        # record start in the .dat file
+    ("audio_bytes", "<u4"),   # stored (possibly compressed) audio size
+    ("n_samples", "<u4"),
+    ("rate", "<u4"),
+    ("codec", "<u4"),
+    ("n_probs", "<u4"),
+    ("n_embedding", "<u4"),
+    ("meta_bytes", "<u4"),
+    ("reserved", "<u4"),
+])
+
+
+def _align(n, to=8):
+    return -(-n // to) * to
+
+def _layout(row):
+    """Byte offsets of a record's audio, probs, embedding and metadata."""
+    audio = int(row["offset"])
+    probs = audio + _align(int(row["audio_bytes"]))
+    embedding = probs + 4 * int(row["n_probs"])
+    meta = embedding + 4 * int(row["n_embedding"])
+    return audio, probs, embedding, meta, meta + int(row["meta_bytes"])
+
+def _encode_audio(audio, codec):
+    audio = np.ascontiguousarray(audio, dtype=np.int16)
+    if codec == "pcm16":
+        return audio.tobytes()
+    # first difference keeps most samples small, which zlib packs well
+    delta = np.diff(audio, prepend=np.int16(0))
+    return zlib.compress(delta.tobytes(), 6)
+
+def _file_size(path):
+    """Size of a segment file: 0 if missing or empty, -1 if it does not start with the header."""
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if not size:
+        return 0
+    with open(path, "rb") as f:
+        header = f.read(HEADER_BYTES)
+    return size if len(header) == HEADER_BYTES and header.startswith(MAGIC) else -1
+
+def _decode_audio(buf, n_samples, codec):
+    if codec == "pcm16":
+        return np.frombuffer(buf, dtype=np.int16, count=n_samples)
+    delta = np.frombuffer(zlib.decompress(buf), dtype=np.int16)
+    return np.cumsum(delta, dtype=np.int16)
+
+
+# =========================
+# WRITER
+# =========================
+class ArchiveWriter:
+    """
+    Append-only event archive: rolling hourly segments, each a data file
+    (`.dat`) plus a fixed-record index (`.idx`).
+
+    An event's record holds its audio (raw int16 or zlib-compressed
+    deltas), full probability vector, optional embedding and a small JSON
+    metadata blob. The data is written and flushed before its index row,
+    so the index is the commit point: after a crash, a reopened segment is
+    truncated back to its last indexed record. A segment whose index is
+    missing or damaged is renamed aside (`.corrupt-<time>`) instead, as
+    its data can no longer be delimited. Safe to call from several
+    persist workers.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR, codec="pcm16", fsync=False):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec '{codec}', expected one of {sorted(CODECS)}")
+        self.root = root
+        self.codec = codec
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._name = None
+        self._dat = None
+        self._idx = None
+        self._count = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _open(self, name):
+        self.close()
+        dat_path = os.path.join(self.root, name + ".dat")
+        idx_path = os.path.join(self.root, name + ".idx")
+        dat_size = _file_size(dat_path)
+        idx_size = _file_size(idx_path)
+        if (dat_size < 0 or idx_size < 0
+                or (dat_size > HEADER_BYTES and not idx_size)
+                or (idx_size > HEADER_BYTES and not dat_size)):
+            # An index row is the only record of where an event's data ends,
+            # so data without its index cannot be told apart from a torn
+            # tail: keep both files for inspection and start afresh
+            self._set_aside(name, "damaged or missing data/index file")
+            dat_size = idx_size = 0
+        for path, size in ((dat_path, dat_size), (idx_path, idx_size)):
+            if not size:
+                with open(path, "wb") as f:
+                    f.write(MAGIC.ljust(HEADER_BYTES, b"\0"))
+        dat_size = max(dat_size, HEADER_BYTES)
+        idx_size = max(idx_size, HEADER_BYTES)
+
+        # Recover from a crash between the data write and the index write:
+        # keep the leading rows whose records are fully in the data file
+        count = (idx_size - HEADER_BYTES) // INDEX_DTYPE.itemsize
+        end = HEADER_BYTES
+        if count:
+            rows = np.fromfile(idx_path, dtype=INDEX_DTYPE, count=count, offset=HEADER_BYTES)
+            ends = np.array([_align(_layout(row)[-1]) for row in rows])
+            if (ends > dat_size).any():
+                count = int(np.argmax(ends > dat_size))
+            if count:
+                end = int(ends[count - 1])
+        os.truncate(idx_path, HEADER_BYTES + count * INDEX_DTYPE.itemsize)
+        os.truncate(dat_path, end)
+
+        self._dat = open(dat_path, "ab")
+        self._idx = open(idx_path, "ab")
+        self._name = name
+        self._count = count
+
+    def _set_aside(self, name, reason):
+        suffix = time.strftime(".corrupt-%Y%m%d_%H%M%S")
+        for ext in (".dat", ".idx"):
+            path = os.path.join(self.root, name + ext)
+            if os.path.exists(path):
+                os.replace(path, path + suffix)
+        print(f"⚠️ Archive segment {name}: {reason}; moved aside as {name}.*{suffix}")
+
+    def append(self, audio, rate, timestamp, probs=None, embedding=None, meta=None):
+        """Archive one event. Returns its reference, "<segment>#<index>"."""
+        payload = _encode_audio(audio, self.codec)
+        probs = np.zeros(0, np.float32) if probs is None else np.ascontiguousarray(probs, dtype=np.float32).ravel()
+        embedding = (np.zeros(0, np.float32) if embedding is None
+                     else np.ascontiguousarray(embedding, dtype=np.float32).ravel())
+        meta_bytes = json.dumps(meta or {}).encode("utf-8")
+        name = time.strftime(SEGMENT_FORMAT, time.localtime(timestamp))
+
+        with self._lock:
+            if name != self._name:
+                self._open(name)
+            row = np.zeros(1, dtype=INDEX_DTYPE)
+            row["timestamp"] = timestamp
+            row["offset"] = self._dat.tell()
+            row["audio_bytes"] = len(payload)
+            row["n_samples"] = len(audio)
+            row["rate"] = rate
+            row["codec"] = CODECS[self.codec]
+            row["n_probs"] = len(probs)
+            row["n_embedding"] = len(embedding)
+            row["meta_bytes"] = len(meta_bytes)
+
+            self._dat.write(payload)
+            self._dat.write(b"\0" * (_align(len(payload)) - len(payload)))
+            self._dat.write(probs.tobytes())
+            self._dat.write(embedding.tobytes())
+            self._dat.write(meta_bytes)
+            self._dat.write(b"\0" * (_align(self._dat.tell()) - self._dat.tell()))
+            self._dat.flush()
+            if self.fsync:
+                os.fsync(self._dat.fileno())
+            self._idx.write(row.tobytes())
+            self._idx.flush()
+            ref = f"{name}#{self._count}"
+            self._count += 1
+        return ref
+
+    def close(self):
+        for f in (self._dat, self._idx):
+            if f is not None:
+                f.close()
+        self._dat = self._idx = self._name = None
+
+
+# =========================
+# READER
+# =========================
+class Segment:
+    """
+    Read-only view of one segment. The data file is memory-mapped, so raw
+    pcm16 audio, probabilities and embeddings are zero-copy numpy views;
+    zlib audio is decoded on access. Call refresh() to pick up events
+    appended since the segment was opened.
+    """
+
+    def __init__(self, root, name):
+        self.root = root
+        self.name = name
+        self.index = np.zeros(0, dtype=INDEX_DTYPE)
+        self._file = None
+        self._map = None
+        self.refresh()
+
+    def refresh(self):
+        idx_path = os.path.join(self.root, self.name + ".idx")
+        count = max(0, (os.path.getsize(idx_path) - HEADER_BYTES) // INDEX_DTYPE.itemsize)
+        if count == len(self.index):
+            return self
+        self.index = np.memmap(idx_path, dtype=INDEX_DTYPE, mode="r", offset=HEADER_BYTES, shape=(count,))
+        self.close_data()
+        self._file = open(os.path.join(self.root, self.name + ".dat"), "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def close_data(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # numpy views handed out still use the mapping; it is unmapped with the last of them
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def audio(self, i):
+        row = self.index[i]
+        start = int(row["offset"])
+        buf = memoryview(self._map)[start:start + int(row["audio_bytes"])]
+        return _decode_audio(buf, int(row["n_samples"]), CODEC_NAMES[int(row["codec"])])
+
+    def probs(self, i):
+        row = self.index[i]
+        _, start, _, _, _ = _layout(row)
+        return np.frombuffer(self._map, dtype=np.float32, count=int(row["n_probs"]), offset=start)
+
+    def embedding(self, i):
+        row = self.index[i]
+        _, _, start, _, _ = _layout(row)
+        return np.frombuffer(self._map, dtype=np.float32, count=int(row["n_embedding"]), offset=start)
+
+    def meta(self, i):
+        row = self.index[i]
+        _, _, _, start, stop = _layout(row)
+        return json.loads(bytes(self._map[start:stop]).decode("utf-8"))
+
+    def event(self, i):
+        row = self.index[i]
+        return {
+            "ref": f"{self.name}#{i}",
+            "timestamp": float(row["timestamp"]),
+            "rate": int(row["rate"]),
+            "audio": self.audio(i),
+            **self.meta(i),
+            "scores": self.probs(i),
+            "embedding": self.embedding(i),
+        }
+
+
+def list_segments(root=ARCHIVE_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(f[:-4] for f in os.listdir(root) if f.startswith("seg_") and f.endswith(".idx"))
+
+def open_event(ref, root=ARCHIVE_DIR):
+    name, i = ref.rsplit("#", 1)
+    return Segment(root, name).event(int(i))
+
+def iter_events(root=ARCHIVE_DIR, since=None, until=None):
+    """Events in time order, optionally limited to [since, until) unix seconds."""
+    for name in list_segments(root):
+        segment = Segment(root, name)
+        ts = segment.index["timestamp"]
+        for i in np.flatnonzero((ts >= (since if since is not None else -np.inf)) &
+                                (ts < (until if until is not None else np.inf))):
+            yield segment.event(int(i))
+
+def recent_events(limit, root=ARCHIVE_DIR):
+    """The `limit` newest events, oldest first."""
+    events = []
+    for name in reversed(list_segments(root)):
+        segment = Segment(root, name)
+        for i in range(len(segment) - 1, -1, -1):
+            if len(events) == limit:
+                return events[::-1]
+            events.append(segment.event(i))
+    return events[::-1]
+
+def write_wav(path, audio, rate):
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(np.ascontiguousarray(audio, dtype=np.int16).tobytes())
+    return path
+
+def wav_bytes(audio, rate):
+    """The clip as an in-memory WAV file."""
+    buf = io.BytesIO()
+    write_wav(buf, audio, rate)
+    return buf.getvalue()
+
+
+# =========================
+# LEGACY IMPORT
+# =========================
+def import_legacy(writer, wav_dir="./sound/recordings", labels_dir="./sound/recording_data"):
+    """
+    Append every rec_<ts>.wav (and its rec_<ts>.txt labels, if present) to
+    the archive in timestamp order. Returns the number of events imported;
+    the legacy files are left in place.
+    """
+    names = [f for f in os.listdir(wav_dir) if f.startswith("rec_") and f.endswith(".wav")]
+    names.sort(key=lambda f: int(f[4:-4]) if f[4:-4].isdigit() else 0)
+    for fname in names:
+        timestamp = int(fname[4:-4])
+        with wave.open(os.path.join(wav_dir, fname), "rb") as wf:
+            rate = wf.getframerate()
+            audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        labels, probs = [], []
+        txt = os.path.join(labels_dir, fname[:-4] + ".txt")
+        if os.path.exists(txt):
+            with open(txt) as f:
+                for line in f:
+                    label, _, prob = line.rstrip("\n").rpartition(": ")
+                    if label:
+                        labels.append(label)
+                        probs.append(float(prob))
+        writer.append(audio, rate, timestamp, meta={"labels": labels, "probs": probs})
+    return len(names)
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "list":
+        for name in list_segments():
+            segment = Segment(ARCHIVE_DIR, name)
+            size = os.path.getsize(os.path.join(ARCHIVE_DIR, name + ".dat"))
+            print(f"{name}: {len(segment)} events, {size / 1e6:.1f} MB")
+    elif command == "export" and len(sys.argv) == 4:
+        event = open_event(sys.argv[2])
+        print(f"✅ Wrote {write_wav(sys.argv[3], event['audio'], event['rate'])}")
+    elif command == "import":
+        writer = ArchiveWriter()
+        count = import_legacy(writer, *sys.argv[2:4])
+        writer.close()
+        print(f"✅ Imported {count} legacy recordings into {ARCHIVE_DIR}")
+    else:
+        print("Usage: python3 -m sound.archive [list | export <segment>#<i> <out.wav> | import [wav dir] [labels dir]]")
+        sys.exit(1)
@@ -0,0 +1,151 @@
+import threading
+import time
+from concurrent.futures import Future
+import torch
+
+
+class SchedulerStopped(RuntimeError):
+    """Set on futures of clips submitted to, or left pending in, a stopped scheduler."""
+
+
+def then(future, fn):
+    """Future for fn(future.result()), with exceptions passed through."""
+    out = Future()
+
+    def _done(f):
+        try:
+            out.set_result(fn(f.result()))
+        except Exception as e:
+            out.set_exception(e)
+    future.add_done_callback(_done)
+    return out
+
+
+# =========================
+# BATCHING INFERENCE SCHEDULER
+# =========================
+class InferenceScheduler:
+    """
+    Collects mel clips from several events and runs them through the model
+    as one batch.
+
+    A batch is closed when `max_batch` clips are pending or `max_wait`
+    seconds after its first clip arrived, so a lone event waits at most
+    `max_wait` longer than unbatched inference. Clips whose frame counts
+    differ by no more than `pad_tolerance` share a batch (shorter ones are
+    zero-padded at the end); other lengths are run as separate batches.
+
+    `submit()` returns a Future of that clip's (classes,) probabilities. It
+    blocks once `max_pending` clips are waiting so backpressure reaches the
+    caller's queue instead of growing here. After stop() (or before
+    start()) the Future fails with SchedulerStopped.
+    """
+
+    def __init__(self, infer_fn, max_batch=8, max_wait=0.05, pad_tolerance=8, max_pending=32):
+        self.infer_fn = infer_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pad_tolerance = pad_tolerance
+        self.max_pending = max_pending
+        self._pending = []
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        self.batches = 0
+        self.clips = 0
+        self.padded_clips = 0
+        self.max_queue_delay = 0.0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        # whatever the worker did not get to (join timed out) will never run
+        with self._cond:
+            left, self._pending = self._pending, []
+        for _, future, _ in left:
+            future.set_exception(SchedulerStopped("inference scheduler stopped"))
+
+    def submit(self, mel):
+        future = Future()
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._pending) < self.max_pending or not self._running)
+            if not self._running:
+                future.set_exception(SchedulerStopped("inference scheduler is not running"))
+                return future
+            self._pending.append((mel, future, time.monotonic()))
+            self._cond.notify_all()
+        return future
+
+    def _take_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending or not self._running)
+            if not self._pending:
+                return []
+            deadline = self._pending[0][2] + self.max_wait
+            while len(self._pending) < self.max_batch and self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            self._cond.notify_all()
+            return batch
+
+    def _buckets(self, batch):
+        buckets = []
+        for item in sorted(batch, key=lambda it: it[0].shape[-1]):
+            if buckets and item[0].shape[-1] - buckets[-1][0][0].shape[-1] <= self.pad_tolerance:
+                buckets[-1].append(item)
+            else:
+                buckets.append([item])
+        return buckets
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                break
+            now = time.monotonic()
+            self.max_queue_delay = max(self.max_queue_delay, now - batch[0][2])
+            for bucket in self._buckets(batch):
+                self._run_bucket(bucket)
+
+    def _run_bucket(self, bucket):
+        frames = max(mel.shape[-1] for mel, _, _ in bucket)
+        mels = []
+        for mel, _, _ in bucket:
+            if mel.shape[-1] < frames:
+                mel = torch.nn.functional.pad(mel, (0, frames - mel.shape[-1]))
+                self.padded_clips += 1
+            mels.append(mel)
+        try:
+            probs = self.infer_fn(torch.cat(mels))
+        except Exception as e:
+            for _, future, _ in bucket:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.clips += len(bucket)
+        for i, (_, future, _) in enumerate(bucket):
+            future.set_result(probs[i])
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "clips": self.clips,
+            "mean_batch": self.clips / self.batches if self.batches else 0.0,
+            "padded_clips": self.padded_clips,
+            "pending": len(self._pending),
+            "max_queue_delay_ms": self.max_queue_delay * 1000,
+        }
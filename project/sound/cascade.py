@@ -0,0 +1,91 @@
+import threading
+import time
+import torch
+
+
+# =========================
+# TWO-TIER MODEL CASCADE
+# =========================
+class ModelCascade:
+    """
+    Batched infer function that runs a small first-tier model on every clip
+    and re-runs only the uncertain ones through the large model.
+
+    A clip is escalated when the first tier's top score falls inside
+    `uncertain_band` (lo <= score < hi) or its top label is in
+    `alert_labels`. Both tiers return (B, 527) AudioSet probabilities, so
+    the cascade is a drop-in replacement for a single backend.
+
+    If the first tier also returns embeddings (B, 527 + D) they are passed
+    through for every clip, escalated or not, so all embeddings from a
+    cascade come from the same model.
+    """
+
+    def __init__(self, tier1, tier2, labels, uncertain_band=(0.2, 0.6), alert_labels=()):
+        self.tier1 = tier1
+        self.tier2 = tier2
+        self.labels = labels
+        self.classes = len(labels)
+        self.lo, self.hi = uncertain_band
+        alert = set(alert_labels)
+        self.alert_idx = torch.tensor([i for i, name in labels.items() if name in alert], dtype=torch.long)
+
+        self._lock = threading.Lock()
+        self.clips = 0
+        self.escalated = 0
+        self.tier1_seconds = 0.0
+        self.tier2_seconds = 0.0
+        self.tier2_clips = 0
+
+    def _escalate_mask(self, probs):
+        top_probs, top_idx = probs.max(dim=-1)
+        mask = (top_probs >= self.lo) & (top_probs < self.hi)
+        if len(self.alert_idx):
+            mask |= torch.isin(top_idx, self.alert_idx)
+        return mask
+
+    def __call__(self, mel):
+        start = time.perf_counter()
+        output = self.tier1(mel)
+        probs = output[:, :self.classes]
+        t1 = time.perf_counter() - start
+
+        mask = self._escalate_mask(probs)
+        n_escalated = int(mask.sum())
+        t2 = 0.0
+        if n_escalated:
+            start = time.perf_counter()
+            probs = probs.clone()
+            probs[mask] = self.tier2(mel[mask])[:, :self.classes]
+            t2 = time.perf_counter() - start
+
+        with self._lock:
+            self.clips += len(mel)
+            self.escalated += n_escalated
+            self.tier1_seconds += t1
+            self.tier2_seconds += t2
+            self.tier2_clips += n_escalated
+        if output.shape[1] > self.classes:
+            return torch.cat([probs, output[:, self.classes:]], dim=1)
+        return probs
+
+    def stats(self):
+        """
+        Escalation rate, mean per-clip cost of each tier, and the estimated
+        inference time saved versus running the large model on every clip.
+        """
+        with self._lock:
+            clips, escalated = self.clips, self.escalated
+            t1 = self.tier1_seconds / clips if clips else 0.0
+            t2 = self.tier2_seconds / self.tier2_clips if self.tier2_clips else None
+        saved = None
+        if t2 is not None:
+            saved = (clips * t2 - (self.tier1_seconds + self.tier2_seconds)) * 1000
+        return {
+            "clips": clips,
+            "escalated": escalated,
+            "escalation_rate": escalated / clips if clips else 0.0,
+            "tier1_ms_per_clip": t1 * 1000,
+            "tier2_ms_per_clip": t2 * 1000 if t2 is not None else None,
+            "est_saved_ms_total": saved,
+        }
@@ -1,5 +1,8 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.cloud import storage
+
+BUCKET_NAME = ""
 
 # Initialize Firebase Admin SDK
 cred = credentials.Certificate("")  # Firebase service account JSON
@@ -7,6 +10,10 @@ firebase_admin.initialize_app(cred)
 
 db = firestore.client()  # Firestore client
 
+# Same service account JSON; used by the outbox for WAV uploads
+client = storage.Client.from_service_account_json("")
+bucket = client.bucket(BUCKET_NAME)
+
 def save_to_firebase(record_data):
     """
     Save metadata to Firebase Firestore.
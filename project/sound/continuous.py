@@ -0,0 +1,179 @@
+import collections
+import threading
+import time
+import numpy as np
+import torch
+
+from .inference import fold_batchnorm
+
+
+# run with python3 -m sound.continuous from project root directory to compare
+# cached sliding-window scores against full per-window CNN14 passes
+
+# CNN14's six 2x2 average pools shrink time by 64: one trunk output column
+# summarises 64 mel frames (0.64 s at hop 320 / 32 kHz)
+STRIDE = 64
+
+
+# =========================
+# CONTINUOUS TAGGER
+# =========================
+class ContinuousTagger:
+    """
+    Sliding-window CNN14 tagging over the streaming mel history.
+
+    The conv trunk's output columns for frames already processed are
+    cached, so each hop only runs the trunk over `hop_frames` new frames
+    plus `context_frames` of left context (for the convolutions' receptive
+    field), then applies CNN14's pooling + fc head to the last
+    `window_frames` worth of cached columns.
+
+    Each column is computed once, while it is at the right edge of the
+    stream, so it sees zero padding where a full per-window pass would see
+    the next hop, and only `context_frames` of history on its left. Scores
+    therefore approximate a full pass; `context_frames` trades cost for
+    fidelity (compare_with_full_windows reports both). All frame counts
+    must be multiples of STRIDE.
+    """
+
+    def __init__(self, model, frontend, window_frames=192, hop_frames=64,
+                 context_frames=64, on_scores=None):
+        for name, value in (("window_frames", window_frames), ("hop_frames", hop_frames),
+                            ("context_frames", context_frames)):
+            if value % STRIDE:
+                raise ValueError(f"{name} must be a multiple of {STRIDE}")
+        self.model = fold_batchnorm(model)
+        self.frontend = frontend
+        self.window_frames = window_frames
+        self.hop = hop_frames
+        self.context = context_frames
+        self.on_scores = on_scores
+        self.columns = collections.deque(maxlen=window_frames // STRIDE)
+        self.position = None  # first frame of the next hop
+
+        self.hops = 0
+        self.restarts = 0
+        self.compute_seconds = 0.0
+        self._running = False
+        self._thread = None
+
+    def _oldest_frame(self):
+        fe = self.frontend
+        return max(fe.first_frame, fe.next_frame - fe.capacity)
+
+    def step(self):
+        """
+        Process one hop if enough frames are available. Returns
+        (end_frame, probs) once the window is full, otherwise None.
+        """
+        fe = self.frontend
+        oldest = self._oldest_frame()
+        if self.position is None or self.position - self.context < oldest:
+            # Start or fell behind the history: realign and rebuild the cache
+            self.position = oldest + self.context
+            self.columns.clear()
+            self.restarts += 1
+        if fe.next_frame < self.position + self.hop:
+            return None
+
+        start = time.perf_counter()
+        frames = fe.frames(self.position - self.context, self.position + self.hop)
+        x = torch.from_numpy(np.ascontiguousarray(frames.T)).view(1, 1, frames.shape[1], frames.shape[0])
+        with torch.no_grad():
+            out = self.model.trunk(x)
+            for j in range(self.context // STRIDE, out.shape[-1]):
+                self.columns.append(out[..., j])
+        self.position += self.hop
+        self.hops += 1
+
+        probs = None
+        if len(self.columns) == self.columns.maxlen:
+            with torch.no_grad():
+                probs = self.model.head(torch.stack(list(self.columns), dim=-1)).squeeze(0)
+        self.compute_seconds += time.perf_counter() - start
+        return None if probs is None else (self.position, probs)
+
+    def _run(self):
+        idle = self.hop * self.frontend.hop / self.frontend.rate / 4
+        while self._running:
+            result = self.step()
+            if result is None:
+                time.sleep(idle)
+            elif self.on_scores is not None:
+                end_frame, probs = result
+                self.on_scores(end_frame * self.frontend.hop / self.frontend.rate, probs)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="continuous-tagger", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "hops": self.hops,
+            "restarts": self.restarts,
+            "mean_hop_ms": self.compute_seconds / self.hops * 1000 if self.hops else 0.0,
+        }
+
+
+# =========================
+# AGREEMENT CHECK
+# =========================
+def compare_with_full_windows(model, seconds=20.0, context_frames=64, k=5, seed=0):
+    """
+    Stream synthetic audio and compare each cached sliding-window score with
+    a full CNN14 pass over the same window of mel frames. Returns mean
+    top-k overlap and the per-hop cost of both approaches.
+    """
+    from .mel_stream import StreamingMelFrontend
+
+    rng = np.random.default_rng(seed)
+    rate, chunk = 32000, 2048
+    n = int(seconds * rate)
+    t = np.arange(n) / rate
+    freq = 300 + 2000 * (np.sin(2 * np.pi * 0.1 * t) + 1)
+    audio = 6000 * np.sin(2 * np.pi * np.cumsum(freq) / rate) + 1500 * rng.standard_normal(n)
+    audio = np.clip(audio, -32768, 32767).astype(np.int16)
+
+    frontend = StreamingMelFrontend(rate=rate, chunk=chunk, history_seconds=seconds + 1)
+    tagger = ContinuousTagger(model, frontend, context_frames=context_frames)
+    overlaps, full_seconds = [], 0.0
+    for pos in range(0, n - chunk + 1, chunk):
+        frontend.push(audio[pos:pos + chunk], pos)
+        while True:
+            hops = tagger.hops
+            result = tagger.step()
+            if tagger.hops == hops:
+                break
+            if result is None:
+                continue
+            end_frame, probs = result
+            frames = frontend.frames(end_frame - tagger.window_frames, end_frame)
+            x = torch.from_numpy(np.ascontiguousarray(frames.T)).view(1, 1, frames.shape[1], frames.shape[0])
+            start = time.perf_counter()
+            with torch.no_grad():
+                reference = tagger.model(x).squeeze(0)
+            full_seconds += time.perf_counter() - start
+            a = set(torch.topk(probs, k).indices.tolist())
+            b = set(torch.topk(reference, k).indices.tolist())
+            overlaps.append(len(a & b) / k)
+
+    windows = len(overlaps)
+    return {
+        "windows": windows,
+        f"top{k}_overlap": float(np.mean(overlaps)) if overlaps else None,
+        "cached_ms_per_hop": tagger.compute_seconds / max(tagger.hops, 1) * 1000,
+        "full_ms_per_window": full_seconds / max(windows, 1) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    from . import sound_detect as sd
+
+    print(compare_with_full_windows(sd.get_model()))
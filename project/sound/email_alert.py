@@ -1,13 +1,17 @@
 import smtplib
 from email.mime.text import MIMEText
 import os
-file_path = './sound/passwords.txt'
-with open(file_path, 'r') as file:
-    lines = file.readlines()
-    SENDER_EMAIL = lines[0].strip()
-    SENDER_PASSWORD = lines[1].strip()
-    
+import threading
+import time
+
+from common import metrics
+
+EMAIL_SECONDS = metrics.histogram("alert_email_seconds", "Time to send one alert email (incl. reconnects)")
+EMAILS = metrics.counter("alert_emails_total", "Alert emails by outcome", ["outcome"])
+ALERTS = metrics.counter("alert_events_total", "Alerts submitted to the dispatcher")
+
 # --- CONFIG ---
+PASSWORDS_PATH = './sound/passwords.txt'  # line 1: sender email, line 2: app password
 SMTP_SERVER = "smtp.gmail.com"
 SMTP_PORT = 587
 RECIPIENT_EMAIL = ""
@@ -15,6 +19,23 @@ RECIPIENT_EMAIL = ""
 PROJECT_ID = ""
 COLLECTION = "recordings"
 
+DIGEST_WINDOW = 30.0        # seconds to collect events into one email
+MIN_EMAIL_INTERVAL = 60.0   # at most one email per this many seconds
+DIGEST_MAX_ITEMS = 20       # events listed in a digest; the rest are counted
+SMTP_IDLE_TIMEOUT = 120.0   # close the pooled connection after this long unused
+
+
+_credentials = None
+
+def load_credentials(path=PASSWORDS_PATH):
+    """Sender address and password, read on first use rather than at import."""
+    global _credentials
+    if _credentials is None:
+        with open(path, 'r') as file:
+            lines = file.readlines()
+            _credentials = (lines[0].strip(), lines[1].strip())
+    return _credentials
+
 
 def generate_firestore_link(timestamp):
     return (
@@ -23,20 +44,16 @@ def generate_firestore_link(timestamp):
     )
 
 
-def send_alert_email(timestamp, labels, probs, wav_url):
+def format_alert(timestamp, labels, probs, wav_url):
     doc_link = generate_firestore_link(timestamp)
-
-    # Construct email body
-    msg_body = f"""
+    subject = f"🚨 Loud Sound Alert ({labels[0]})"
+    body = f"""
 🔥 Loud Noise Detected!
 
 Timestamp: {timestamp}
 
 Top Predictions:
-1. {labels[0]} ({probs[0]:.3f})
-2. {labels[1]} ({probs[1]:.3f})
-3. {labels[2]} ({probs[2]:.3f})
-
+""" + "".join(f"{i + 1}. {label} ({prob:.3f})\n" for i, (label, prob) in enumerate(zip(labels[:3], probs[:3]))) + f"""
 WAV File: {wav_url}
 
 Firestore Record:
@@ -45,19 +62,254 @@ Firestore Record:
 ----------------------------------------
 Automatic alert from your Sound Monitor
 """
+    return subject, body
+
+
+def format_digest(alerts, max_items=DIGEST_MAX_ITEMS):
+    """One email for several alerts, each a (timestamp, labels, probs, wav_url) tuple."""
+    if len(alerts) == 1:
+        return format_alert(*alerts[0])
+
+    counts = {}
+    for _, labels, _, _ in alerts:
+        counts[labels[0]] = counts.get(labels[0], 0) + 1
+    top = sorted(counts.items(), key=lambda kv: -kv[1])
+    subject = f"🚨 {len(alerts)} Loud Sound Alerts ({', '.join(label for label, _ in top[:3])})"
+
+    lines = [
+        "",
+        f"🔥 {len(alerts)} loud noises detected between {alerts[0][0]} and {alerts[-1][0]}",
+        "",
+        "By top label: " + ", ".join(f"{label} x{n}" for label, n in top),
+        "",
+    ]
+    for timestamp, labels, probs, wav_url in alerts[:max_items]:
+        preds = ", ".join(f"{label} ({prob:.3f})" for label, prob in zip(labels[:3], probs[:3]))
+        lines += [f"[{timestamp}] {preds}", f"    WAV: {wav_url}",
+                  f"    Record: {generate_firestore_link(timestamp)}"]
+    if len(alerts) > max_items:
+        lines.append(f"... and {len(alerts) - max_items} more")
+    lines += ["", "----------------------------------------", "Automatic alert from your Sound Monitor", ""]
+    return subject, "\n".join(lines)
+
+
+# =========================
+# POOLED SMTP CONNECTION
+# =========================
+class SMTPConnection:
+    """
+    One SMTP session kept open between emails. It is opened on first use,
+    and if a send fails because the server dropped the session it is
+    reopened and the send retried once.
+    """
+
+    def __init__(self, host=SMTP_SERVER, port=SMTP_PORT, starttls=True, credentials=load_credentials,
+                 timeout=30.0):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.credentials = credentials  # callable -> (user, password), or None to skip login
+        self.timeout = timeout
+        self._server = None
+        self.connects = 0
+
+    def _open(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.credentials is not None:
+            server.login(*self.credentials())
+        self._server = server
+        self.connects += 1
+
+    def send(self, sender, recipients, message):
+        for attempt in range(2):
+            if self._server is None:
+                self._open()
+            try:
+                self._server.sendmail(sender, recipients, message)
+                return
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPSenderRefused, OSError):
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    @property
+    def is_open(self):
+        return self._server is not None
+
 
-    msg = MIMEText(msg_body)
-    msg["Subject"] = f"🚨 Loud Sound Alert ({labels[0]})"
-    msg["From"] = SENDER_EMAIL
+# =========================
+# ALERT DISPATCHER
+# =========================
+class AlertDispatcher:
+    """
+    Sends alert emails from its own thread.
+
+    submit() only appends to a list. The first alert opens a collection
+    window of `window` seconds; everything that arrives before it closes
+    goes out as one digest email. Emails are also spaced at least
+    `min_interval` seconds apart, so a long burst becomes a few digests
+    rather than one email per event. The SMTP session is reused between
+    emails and closed after `idle_timeout` seconds without traffic.
+    """
+
+    def __init__(self, connection=None, sender=None, recipient=RECIPIENT_EMAIL, window=DIGEST_WINDOW,
+                 min_interval=MIN_EMAIL_INTERVAL, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.connection = connection or SMTPConnection()
+        self.sender = sender
+        self.recipient = recipient
+        self.window = window
+        self.min_interval = min_interval
+        self.idle_timeout = idle_timeout
+
+        self._pending = []  # (received, alert)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._last_sent = -float("inf")
+
+        self.alerts = 0
+        self.emails = 0
+        self.failures = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=30.0):
+        """Send whatever is pending immediately, then stop."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.connection.close()
+
+    def submit(self, timestamp, labels, probs, wav_url):
+        with self._cond:
+            self._pending.append((time.monotonic(), (timestamp, labels, probs, wav_url)))
+            self.alerts += 1
+            self._cond.notify_all()
+        ALERTS.inc()
+
+    def _wait_for_alerts(self):
+        """Block until an alert is pending or the dispatcher stops, closing the session when idle."""
+        while True:
+            with self._cond:
+                if self._pending or not self._running:
+                    return
+                idle = not self._cond.wait(self.idle_timeout) and not self._pending
+            if idle:
+                # QUIT is network I/O: done outside the lock so submit() never waits on it
+                self.connection.close()
+
+    def _take_digest(self):
+        self._wait_for_alerts()
+        with self._cond:
+            if not self._pending:
+                return []
+            deadline = max(self._pending[0][0] + self.window, self._last_sent + self.min_interval)
+            while self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            alerts = [alert for _, alert in self._pending]
+            self._pending = []
+            return alerts
+
+    def _run(self):
+        while True:
+            alerts = self._take_digest()
+            if not alerts:
+                break
+            self._send(alerts)
+
+    def _send(self, alerts):
+        subject, body = format_digest(alerts)
+        sender = self.sender or load_credentials()[0]
+        msg = MIMEText(body)
+        msg["Subject"] = subject
+        msg["From"] = sender
+        msg["To"] = self.recipient
+        try:
+            with EMAIL_SECONDS.time():
+                self.connection.send(sender, [self.recipient], msg.as_string())
+            self.emails += 1
+            EMAILS.inc(outcome="sent")
+            print(f"📧 Alert email sent ({len(alerts)} event(s)).")
+        except Exception as e:
+            self.failures += 1
+            EMAILS.inc(outcome="failed")
+            print("❌ Email failed:", e)
+        self._last_sent = time.monotonic()
+
+    def stats(self):
+        return {
+            "alerts": self.alerts,
+            "emails": self.emails,
+            "coalesced": self.alerts - self.emails - self.failures - len(self._pending),
+            "pending": len(self._pending),
+            "smtp_connects": self.connection.connects,
+            "failures": self.failures,
+        }
+
+
+def send_alert_email(timestamp, labels, probs, wav_url):
+    """One immediate email on a fresh connection (no pooling or coalescing)."""
+    sender, _ = load_credentials()
+    subject, body = format_alert(timestamp, labels, probs, wav_url)
+    msg = MIMEText(body)
+    msg["Subject"] = subject
+    msg["From"] = sender
     msg["To"] = RECIPIENT_EMAIL
 
+    connection = SMTPConnection()
     try:
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        server.sendmail(SENDER_EMAIL, RECIPIENT_EMAIL, msg.as_string())
-        server.quit()
+        connection.send(sender, [RECIPIENT_EMAIL], msg.as_string())
         print("📧 Alert email sent successfully.")
-
     except Exception as e:
         print("❌ Email failed:", e)
+    finally:
+        connection.close()
+
+
+# =========================
+# BURST CHECK
+# =========================
+def simulate_burst(events=30, spacing=0.01, window=0.3):
+    """
+    Send a burst of alerts through the dispatcher to a local SMTP stand-in
+    and report how many connections and emails it took.
+    """
+    from common.fakes import LocalSMTPServer
+
+    with LocalSMTPServer() as server:
+        connection = SMTPConnection(server.host, server.port, starttls=False, credentials=None)
+        dispatcher = AlertDispatcher(connection, sender="monitor@localhost", recipient="alerts@localhost",
+                                     window=window, min_interval=window).start()
+        for i in range(events):
+            dispatcher.submit(1700000000 + i, ["Dog", "Bark", "Animal"], [0.9, 0.8, 0.5], f"https://x/rec_{i}.wav")
+            time.sleep(spacing)
+        time.sleep(window * 2)  # let the digest go out
+        server.drop_connections()  # the dispatcher has to reconnect for the next email
+        dispatcher.submit(1700000100, ["Siren", "Vehicle", "Alarm"], [0.7, 0.4, 0.3], "https://x/rec_100.wav")
+        dispatcher.stop()
+        return {**dispatcher.stats(), "server_connections": server.connections,
+                "server_messages": len(server.messages)}
+
+
+if __name__ == "__main__":
+    # python3 -m sound.email_alert from project root directory
+    print(simulate_burst())
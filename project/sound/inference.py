@@ -0,0 +1,277 @@
+import copy
+import hashlib
+import io
+import os
+import resource
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.ao import quantization as tq
+
+from .models import with_embedding
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+
+# run with python3 -m sound.inference [backend ...] from project root directory
+
+BACKENDS = ["eager", "script", "compile", "channels_last",
+            "dynamic_int8", "static_int8", "onnx"]
+
+ONNX_PATH = "./sound/{model}_32k.onnx"
+ONNX_EXPORT_VERSION = 1  # bump when the export (folding, opset, axes) changes; forces a re-export
+CALIBRATION_DIR = "./sound/archive"
+
+
+# =========================
+# BATCHNORM FOLDING
+# =========================
+def fold_batchnorm(model):
+    """
+    Copy of `model` with every conv block's BatchNorm folded into the
+    preceding convolution. The blocks' forward still calls bn1/bn2, which
+    become Identity after fusion.
+    """
+    folded = copy.deepcopy(model).eval()
+    for block in folded.conv_blocks():
+        tq.fuse_modules(block, _conv_bn_pairs(block), inplace=True)
+    return folded
+
+def _conv_bn_pairs(block):
+    return [[f"conv{i}", f"bn{i}"] for i in (1, 2) if hasattr(block, f"conv{i}")]
+
+
+class _QuantConvBlock(nn.Module):
+    """Conv block rebuilt from modules so conv+bn+relu fuse into int8 ConvReLU2d."""
+
+    def __init__(self, block):
+        super().__init__()
+        layers = []
+        for conv, bn in _conv_bn_pairs(block):
+            layers += [getattr(block, conv), getattr(block, bn), nn.ReLU()]
+        self.body = nn.Sequential(*layers)
+
+    def forward(self, x):
+        return nn.functional.avg_pool2d(self.body(x), kernel_size=(2, 2))
+
+
+class _StaticQuantModel(nn.Module):
+    """int8 convolutional trunk, float pooling/fc head of the wrapped model."""
+
+    def __init__(self, model):
+        super().__init__()
+        model = copy.deepcopy(model).eval()
+        self._head = type(model).head
+        self.quant = tq.QuantStub()
+        self.blocks = nn.Sequential(*[_QuantConvBlock(b) for b in model.conv_blocks()])
+        self.dequant = tq.DeQuantStub()
+        self.return_embedding = model.return_embedding
+        self.fc1 = model.fc1
+        self.fc_audioset = model.fc_audioset
+        self.eval()
+        for body in (b.body for b in self.blocks):
+            tq.fuse_modules(body, [[str(i), str(i + 1), str(i + 2)] for i in range(0, len(body), 3)],
+                            inplace=True)
+
+    def forward(self, x):
+        x = self.dequant(self.blocks(self.quant(x)))
+        return self._head(self, x)
+
+
+# =========================
+# BACKENDS
+# =========================
+def _example_input(example):
+    return example if example is not None else torch.zeros(1, 1, 64, 201)
+
+def weights_digest(model):
+    """sha1 of a model's state_dict (names and values) and ONNX_EXPORT_VERSION."""
+    digest = hashlib.sha1(f"v{ONNX_EXPORT_VERSION}|{type(model).__name__}".encode())
+    for key, value in model.state_dict().items():
+        digest.update(key.encode())
+        if isinstance(value, torch.Tensor):
+            digest.update(value.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+def _build_onnx(model, example, onnx_path):
+    """
+    ONNX Runtime session for `model`. The export is reused only while the
+    weights digest in the `<onnx_path>.sha1` sidecar matches the model's,
+    so a new checkpoint or export change is re-exported.
+    """
+    if ort is None:
+        raise ImportError("ONNX backend needs onnxruntime: pip install onnxruntime")
+    digest = weights_digest(model)
+    sidecar = onnx_path + ".sha1"
+    try:
+        with open(sidecar) as f:
+            exported = f.read().strip()
+    except OSError:
+        exported = None
+    if not os.path.exists(onnx_path) or exported != digest:
+        if os.path.exists(onnx_path):
+            print(f"[ONNX] {onnx_path} was exported from other weights, re-exporting")
+        torch.onnx.export(fold_batchnorm(model), example, onnx_path,
+                          input_names=["mel"], output_names=["probs"],
+                          dynamic_axes={"mel": {0: "batch", 3: "frames"}, "probs": {0: "batch"}},
+                          opset_version=17, dynamo=False)
+        with open(sidecar, "w") as f:
+            f.write(digest)
+        print(f"[ONNX] Exported {onnx_path}")
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = torch.get_num_threads()
+    session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    def run(mel):
+        probs = session.run(None, {"mel": mel.numpy().astype(np.float32, copy=False)})[0]
+        return torch.from_numpy(probs)
+    return run
+
+def build_backend(name, model, example=None, calibration=None, onnx_path=None, embedding=False):
+    """
+    Wrap a float registry model (CNN14, Cnn6) as a callable
+    mel (B, 1, 64, T) -> probs (B, 527)
+    using the named backend. `calibration` is a list of mel tensors used by
+    static_int8 to set activation ranges. With `embedding` the output is
+    (B, 527 + D) with the fc1 embedding appended (see models.with_embedding).
+    """
+    example = _example_input(example)
+    module = None
+    if embedding:
+        model = with_embedding(model)
+
+    if name == "eager":
+        fn = model
+
+    elif name == "script":
+        traced = torch.jit.trace(fold_batchnorm(model), example)
+        fn = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+    elif name == "compile":
+        fn = torch.compile(fold_batchnorm(model), dynamic=True)
+
+    elif name == "channels_last":
+        module = fold_batchnorm(model).to(memory_format=torch.channels_last)
+        fn = lambda mel: module(mel.contiguous(memory_format=torch.channels_last))
+
+    elif name == "dynamic_int8":
+        # Dynamic quantization only covers the fc layers; convs are folded fp32
+        fn = tq.quantize_dynamic(fold_batchnorm(model), {nn.Linear}, dtype=torch.qint8)
+
+    elif name == "static_int8":
+        qmodel = _StaticQuantModel(model)
+        qmodel.qconfig = tq.get_default_qconfig("fbgemm")
+        qmodel.fc1.qconfig = None
+        qmodel.fc_audioset.qconfig = None
+        tq.prepare(qmodel, inplace=True)
+        with torch.no_grad():
+            for mel in (calibration or [example]):
+                qmodel(mel)
+        fn = tq.convert(qmodel, inplace=True)
+
+    elif name == "onnx":
+        default_path = ONNX_PATH.format(model=type(model).__name__.lower() + ("_emb" if embedding else ""))
+        return _build_onnx(model, example, onnx_path or default_path)
+
+    else:
+        raise ValueError(f"Unknown inference backend '{name}'. Choose from {BACKENDS}.")
+
+    def run(mel):
+        with torch.no_grad():
+            return fn(mel)
+    run.module = module if module is not None else fn
+    return run
+
+
+# =========================
+# AGREEMENT / BENCHMARK
+# =========================
+def topk_agreement(reference, probs, k=5):
+    """(top-1 match rate, mean top-k set overlap) of `probs` vs `reference`."""
+    ref_idx = torch.topk(reference, k, dim=-1).indices
+    idx = torch.topk(probs, k, dim=-1).indices
+    top1 = (ref_idx[:, 0] == idx[:, 0]).float().mean().item()
+    overlap = np.mean([len(set(a.tolist()) & set(b.tolist())) / k for a, b in zip(ref_idx, idx)])
+    return top1, float(overlap)
+
+def _state_bytes(module):
+    if not isinstance(module, nn.Module) or isinstance(module, torch.jit.ScriptModule):
+        return None
+    buf = io.BytesIO()
+    torch.save(module.state_dict(), buf)
+    return buf.tell()
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def calibration_mels(preprocess, rate=32000, seconds=2.0, limit=16):
+    """
+    Mels for static quantization / agreement checks: the newest archived
+    events if any exist, otherwise synthetic tones and noise.
+    """
+    from .archive import recent_events
+
+    mels = [preprocess(event["audio"]) for event in recent_events(limit, CALIBRATION_DIR)]
+    rng = np.random.default_rng(0)
+    t = np.arange(int(rate * seconds)) / rate
+    while len(mels) < limit:
+        freq = rng.uniform(100, 8000)
+        audio = 6000 * np.sin(2 * np.pi * freq * t) + rng.uniform(500, 8000) * rng.standard_normal(len(t))
+        mels.append(preprocess(np.clip(audio, -32768, 32767).astype(np.int16)))
+    return mels
+
+def benchmark_backends(model, mels, names=BACKENDS, k=5, runs=10):
+    """
+    Build each backend and report top-k agreement with the float model,
+    latency per clip (ms) and memory. Backends that fail to build are
+    reported with their error instead.
+    """
+    batch = torch.cat(mels)
+    with torch.no_grad():
+        reference = model(batch)
+
+    results = {}
+    for name in names:
+        rss_before = _peak_rss_mb()
+        try:
+            backend = build_backend(name, model, example=mels[0], calibration=mels)
+            backend(mels[0])  # warm-up / compile
+        except Exception as e:
+            results[name] = {"error": str(e)}
+            continue
+
+        probs = torch.cat([backend(mel) for mel in mels])
+        top1, overlap = topk_agreement(reference, probs, k)
+
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            backend(mels[0])
+            times.append((time.perf_counter() - start) * 1000)
+
+        results[name] = {
+            "top1_agreement": top1,
+            f"top{k}_overlap": overlap,
+            "max_abs_diff": (probs - reference).abs().max().item(),
+            "latency_ms_p50": float(np.percentile(times, 50)),
+            "latency_ms_p95": float(np.percentile(times, 95)),
+            "peak_rss_growth_mb": _peak_rss_mb() - rss_before,
+            "weights_bytes": _state_bytes(getattr(backend, "module", None)),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    from . import sound_detect as sd
+
+    names = sys.argv[1:] or BACKENDS
+    model = sd.get_model()
+    mels = calibration_mels(sd.preprocess_waveform)
+    print(f"Float model weights: {_state_bytes(model) / 1e6:.1f} MB")
+    for name, res in benchmark_backends(model, mels, names).items():
+        print(f"{name:>14}: {res}")
@@ -0,0 +1,192 @@
+import numpy as np
+import torch
+import torchaudio
+
+
+# =========================
+# STREAMING LOG-MEL FRONTEND
+# =========================
+class StreamingMelFrontend:
+    """
+    Incremental mel spectrogram with the same parameters as
+    preprocess_waveform() (n_fft=1024, hop=320, 64 mels, centered frames).
+
+    Chunks are pushed as they are captured. Every frame whose 1024-sample
+    window is complete is computed once and stored in a mel history ring,
+    so when a trigger fires the clip's spectrogram only needs its first and
+    last couple of frames (the reflect-padded edges) computed from scratch.
+
+    Frame k is centered on absolute sample k * hop. Clips that start on the
+    hop grid reuse the streamed frames; anything else is computed directly.
+    """
+
+    def __init__(self, rate=32000, n_fft=1024, hop=320, n_mels=64,
+                 chunk=2048, history_seconds=30.0):
+        self.rate = rate
+        self.n_fft = n_fft
+        self.hop = hop
+        self.n_mels = n_mels
+        self.half = n_fft // 2
+        self.chunk = chunk
+
+        self.window = torch.hann_window(n_fft)
+        self.fbank = torchaudio.functional.melscale_fbanks(
+            n_fft // 2 + 1, 0.0, rate / 2.0, n_mels, rate, None, "htk"
+        )
+
+        # Overlap buffer: unconsumed samples of the current frame plus one chunk
+        self._buf = torch.zeros(n_fft + chunk)
+        self._buf_np = self._buf.numpy()
+        self._buf_len = 0
+        self._buf_start = 0  # absolute sample index of _buf[0]
+
+        # Per-push scratch, sized for the most frames one chunk can complete
+        max_frames = chunk // hop + 2
+        self._frames = torch.zeros(max_frames, n_fft)
+        self._spec = torch.zeros(max_frames, n_fft // 2 + 1, dtype=torch.complex64)
+        self._power = torch.zeros(max_frames, n_fft // 2 + 1)
+        self._mel = torch.zeros(max_frames, n_mels)
+
+        # Mel history ring, one row per frame
+        self.capacity = int(history_seconds * rate / hop)
+        self._history = torch.zeros(self.capacity, n_mels)
+        self.next_frame = 0
+        self.first_frame = 0
+        self.reset(0)
+
+    def reset(self, position):
+        """Restart the stream at absolute sample `position` (e.g. after an overrun)."""
+        self._buf_len = 0
+        self._buf_start = position
+        # first frame whose window lies fully after `position`
+        self.next_frame = -(-(position + self.half) // self.hop)
+        self.first_frame = self.next_frame
+
+    def push(self, samples, position=None):
+        """
+        Feed int16 samples starting at absolute sample `position`.
+        Returns the (first, stop) range of frame indices completed.
+        """
+        if position is not None and position != self._buf_start + self._buf_len:
+            self.reset(position)
+        first = self.next_frame
+        for i in range(0, len(samples), self.chunk):
+            self._push_piece(samples[i:i + self.chunk])
+        return first, self.next_frame
+
+    def _push_piece(self, samples):
+        n = len(samples)
+        end = self._buf_len + n
+        np.multiply(samples, 1.0 / 32768.0, out=self._buf_np[self._buf_len:end], casting="unsafe")
+        self._buf_len = end
+
+        offset = self.next_frame * self.hop - self.half - self._buf_start
+        m = (self._buf_len - offset - self.n_fft) // self.hop + 1
+        if m > 0:
+            frames = self._buf[offset:offset + (m - 1) * self.hop + self.n_fft].unfold(0, self.n_fft, self.hop)
+            self._write_frames(self.next_frame, self._compute(frames))
+            self.next_frame += m
+
+        # Drop samples no later frame needs
+        keep = self.next_frame * self.hop - self.half - self._buf_start
+        if keep > 0:
+            remaining = self._buf_len - keep
+            self._buf_np[:remaining] = self._buf_np[keep:self._buf_len]
+            self._buf_len = remaining
+            self._buf_start += keep
+
+    def _compute(self, frames):
+        m = frames.shape[0]
+        if m > self._frames.shape[0]:
+            return self._compute_alloc(frames)
+        torch.mul(frames, self.window, out=self._frames[:m])
+        torch.fft.rfft(self._frames[:m], out=self._spec[:m])
+        torch.abs(self._spec[:m], out=self._power[:m]).pow_(2.0)
+        torch.matmul(self._power[:m], self.fbank, out=self._mel[:m])
+        return self._mel[:m]
+
+    def _compute_alloc(self, frames):
+        power = torch.fft.rfft(frames * self.window).abs().pow(2.0)
+        return power @ self.fbank
+
+    def _write_frames(self, k, mel):
+        rows = torch.arange(k, k + mel.shape[0]) % self.capacity
+        self._history.index_copy_(0, rows, mel)
+
+    def frames(self, first, stop):
+        """(stop - first, n_mels) mel frames from the history, as a numpy array."""
+        a, b = first % self.capacity, stop % self.capacity
+        if stop - first > 0 and a < b:
+            return self._history[a:b].numpy()
+        rows = torch.arange(first, stop) % self.capacity
+        return self._history.index_select(0, rows).numpy()
+
+    def has_frames(self, first, stop):
+        return first >= max(self.first_frame, self.next_frame - self.capacity) and stop <= self.next_frame
+
+    def clip_mel(self, start, waveform):
+        """
+        Mel spectrogram of the clip `waveform` (int16) that starts at absolute
+        sample `start`, shaped (1, 1, n_mels, frames) like preprocess_waveform().
+        """
+        length = len(waveform)
+        n_frames = 1 + length // self.hop
+        out = torch.empty(n_frames, self.n_mels)
+
+        # Interior frames have their whole window inside the clip
+        lo = -(-self.half // self.hop)
+        hi = (length - self.half) // self.hop + 1
+        k0 = start // self.hop
+        reuse = start % self.hop == 0 and hi > lo and self.has_frames(k0 + lo, k0 + hi)
+        if reuse:
+            rows = torch.arange(k0 + lo, k0 + hi) % self.capacity
+            torch.index_select(self._history, 0, rows, out=out[lo:hi])
+            edges = list(range(lo)) + list(range(hi, n_frames))
+        else:
+            edges = list(range(n_frames))
+
+        if edges:
+            clip = torch.from_numpy(np.asarray(waveform, dtype=np.float32) / 32768.0)
+            padded = torch.nn.functional.pad(clip.view(1, 1, -1), (self.half, self.half), mode="reflect").view(-1)
+            frames = padded.unfold(0, self.n_fft, self.hop)[edges]
+            out[edges] = self._compute_alloc(frames)
+
+        return out.t().unsqueeze(0).unsqueeze(0)
+
+
+# =========================
+# PARITY CHECK
+# =========================
+def check_parity(rate=32000, chunk=2048, clip_start=16000, clip_seconds=2.0, seed=0):
+    """
+    Stream a synthetic signal through StreamingMelFrontend and compare the
+    clip spectrogram against preprocess_waveform(). Returns the max
+    relative error.
+    """
+    rng = np.random.default_rng(seed)
+    total = clip_start + int(clip_seconds * rate) + 4 * chunk
+    t = np.arange(total) / rate
+    signal = 8000 * np.sin(2 * np.pi * 440 * t) + 3000 * rng.standard_normal(total)
+    signal = np.clip(signal, -32768, 32767).astype(np.int16)
+
+    frontend = StreamingMelFrontend(rate=rate, chunk=chunk)
+    for pos in range(0, total - chunk + 1, chunk):
+        frontend.push(signal[pos:pos + chunk], pos)
+
+    clip = signal[clip_start:clip_start + int(clip_seconds * rate)]
+    streamed = frontend.clip_mel(clip_start, clip)
+
+    from .sound_detect import preprocess_waveform
+    reference = preprocess_waveform(clip)
+
+    if streamed.shape != reference.shape:
+        raise AssertionError(f"Shape mismatch: {tuple(streamed.shape)} vs {tuple(reference.shape)}")
+    err = ((streamed - reference).abs() / (reference.abs() + 1e-6 * reference.abs().max())).max().item()
+    return err
+
+
+if __name__ == "__main__":
+    # python3 -m sound.mel_stream
+    err = check_parity()
+    print(f"Max relative error vs preprocess_waveform: {err:.2e}")
+    print("✅ Parity OK" if err < 1e-3 else "❌ Parity FAILED")
@@ -0,0 +1,199 @@
+import copy
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+# =========================
+# CNN14 ARCHITECTURE
+# =========================
+class ConvBlock(nn.Module):
+    def __init__(self, in_channels, out_channels):
+        super().__init__()
+        self.conv1 = nn.Conv2d(in_channels, out_channels, 3, padding=1, bias=False)
+        self.conv2 = nn.Conv2d(out_channels, out_channels, 3, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(out_channels)
+        self.bn2 = nn.BatchNorm2d(out_channels)
+
+    def forward(self, x, pool_size=(2, 2)):
+        x = nn.functional.relu_(self.bn1(self.conv1(x)))
+        x = nn.functional.relu_(self.bn2(self.conv2(x)))
+        x = nn.functional.avg_pool2d(x, kernel_size=pool_size)
+        return x
+
+class CNN14(nn.Module):
+    return_embedding = False  # see with_embedding()
+
+    def __init__(self, classes_num=527):
+        super().__init__()
+        self.conv_block1 = ConvBlock(1, 64)
+        self.conv_block2 = ConvBlock(64, 128)
+        self.conv_block3 = ConvBlock(128, 256)
+        self.conv_block4 = ConvBlock(256, 512)
+        self.conv_block5 = ConvBlock(512, 1024)
+        self.conv_block6 = ConvBlock(1024, 2048)
+        self.fc1 = nn.Linear(2048, 2048)
+        self.fc_audioset = nn.Linear(2048, classes_num)
+
+    def conv_blocks(self):
+        return [self.conv_block1, self.conv_block2, self.conv_block3,
+                self.conv_block4, self.conv_block5, self.conv_block6]
+
+    def trunk(self, x):
+        x = self.conv_block1(x)
+        x = self.conv_block2(x)
+        x = self.conv_block3(x)
+        x = self.conv_block4(x)
+        x = self.conv_block5(x)
+        x = self.conv_block6(x)
+        return x
+
+    def head(self, x):
+        x = torch.mean(x, dim=3)
+        x1, _ = torch.max(x, dim=2)
+        x2 = torch.mean(x, dim=2)
+        x = x1 + x2
+        embedding = nn.functional.relu_(self.fc1(x))
+        x = torch.sigmoid(self.fc_audioset(embedding))
+        if self.return_embedding:
+            return torch.cat([x, embedding], dim=1)
+        return x
+
+    def forward(self, x):
+        return self.head(self.trunk(x))
+
+# =========================
+# CNN6 ARCHITECTURE (first tier)
+# =========================
+class ConvBlock5x5(nn.Module):
+    def __init__(self, in_channels, out_channels):
+        super().__init__()
+        self.conv1 = nn.Conv2d(in_channels, out_channels, 5, padding=2, bias=False)
+        self.bn1 = nn.BatchNorm2d(out_channels)
+
+    def forward(self, x, pool_size=(2, 2)):
+        x = nn.functional.relu_(self.bn1(self.conv1(x)))
+        x = nn.functional.avg_pool2d(x, kernel_size=pool_size)
+        return x
+
+class Cnn6(nn.Module):
+    """PANNs Cnn6: ~5M parameters, same 527 AudioSet outputs and input as CNN14."""
+
+    return_embedding = False
+
+    def __init__(self, classes_num=527):
+        super().__init__()
+        self.conv_block1 = ConvBlock5x5(1, 64)
+        self.conv_block2 = ConvBlock5x5(64, 128)
+        self.conv_block3 = ConvBlock5x5(128, 256)
+        self.conv_block4 = ConvBlock5x5(256, 512)
+        self.fc1 = nn.Linear(512, 512)
+        self.fc_audioset = nn.Linear(512, classes_num)
+
+    def conv_blocks(self):
+        return [self.conv_block1, self.conv_block2, self.conv_block3, self.conv_block4]
+
+    def trunk(self, x):
+        for block in self.conv_blocks():
+            x = block(x)
+        return x
+
+    head = CNN14.head
+
+    def forward(self, x):
+        return self.head(self.trunk(x))
+
+# =========================
+# MODEL REGISTRY
+# =========================
+# name -> (architecture, checkpoint path). Every model takes the same
+# (B, 1, 64, frames) mel input and returns (B, 527) AudioSet probabilities.
+MODEL_REGISTRY = {
+    "cnn14": (CNN14, "./sound/cnn14_32k.pth"),
+    "cnn6": (Cnn6, "./sound/cnn6_32k.pth"),
+}
+CLASSES_NUM = 527
+
+def with_embedding(model):
+    """
+    View of `model` (weights shared, nothing copied) whose output is
+    (B, 527 + D): the probabilities followed by the D-dim fc1 embedding
+    (2048 for CNN14, 512 for Cnn6). One tensor keeps batching, padding,
+    tracing and ONNX export unchanged; split_output() separates the parts.
+    """
+    view = copy.copy(model)
+    view.return_embedding = True
+    return view
+
+def split_output(output):
+    """(probs, embedding or None) from a model output, batched or not."""
+    if output.shape[-1] > CLASSES_NUM:
+        return output[..., :CLASSES_NUM], output[..., CLASSES_NUM:]
+    return output, None
+
+def mmap_path(checkpoint_path):
+    """Where convert_checkpoint writes the memory-mappable copy of a checkpoint."""
+    return checkpoint_path.replace(".pth", ".weights.pth")
+
+# =========================
+# LOAD MODEL
+# =========================
+def _state_dict(checkpoint):
+    return checkpoint["model"] if isinstance(checkpoint, dict) and "model" in checkpoint else checkpoint
+
+def load_model(name, model_path=None, device="cpu", mmap=False):
+    """
+    Load a registered model. With mmap=True the checkpoint (a plain state
+    dict written by convert_checkpoint) is memory-mapped and its tensors are
+    assigned to the model directly, so no weights are copied or randomly
+    initialised and several processes share the same page cache.
+    """
+    model_cls, default_path = MODEL_REGISTRY[name]
+    model_path = model_path or default_path
+    if mmap:
+        with torch.device("meta"):
+            model = model_cls()
+        state_dict = torch.load(model_path, map_location=device, mmap=True, weights_only=True)
+        result = model.load_state_dict(state_dict, strict=False, assign=True)
+        if result.missing_keys:
+            raise RuntimeError(f"{model_path} is missing weights: {result.missing_keys}")
+        return model.eval()
+
+    model = model_cls()
+    torch.serialization.add_safe_globals([np._core.multiarray._reconstruct])
+    checkpoint = torch.load(model_path, map_location=device, weights_only=False)
+    model.load_state_dict(_state_dict(checkpoint), strict=False)
+    model.to(device)
+    model.eval()
+    return model
+
+def load_cnn14(model_path, device="cpu", mmap=False):
+    return load_model("cnn14", model_path, device, mmap)
+
+def convert_checkpoint(src_path, dst_path, name="cnn14"):
+    """
+    Rewrite a PANNs training checkpoint as a flat, contiguous state dict in
+    torch's zip format, which torch.load(mmap=True, weights_only=True) can
+    map without unpickling optimizer state or numpy objects.
+    """
+    torch.serialization.add_safe_globals([np._core.multiarray._reconstruct])
+    checkpoint = torch.load(src_path, map_location="cpu", weights_only=False)
+    source = _state_dict(checkpoint)
+    # keys the checkpoint lacks (e.g. num_batches_tracked) keep their defaults
+    model_cls = MODEL_REGISTRY[name][0]
+    state_dict = {k: source.get(k, default).contiguous() for k, default in model_cls().state_dict().items()}
+    torch.save(state_dict, dst_path)
+    return dst_path
+
+
+if __name__ == "__main__":
+    # python3 -m sound.models convert [model name]
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] != "convert":
+        print(f"Usage: python3 -m sound.models convert [{'|'.join(MODEL_REGISTRY)}]")
+        sys.exit(1)
+    name = sys.argv[2] if len(sys.argv) > 2 else "cnn14"
+    src = MODEL_REGISTRY[name][1]
+    dst = convert_checkpoint(src, mmap_path(src), name)
+    print(f"✅ Wrote memory-mappable weights to {dst}")
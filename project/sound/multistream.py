@@ -0,0 +1,191 @@
+import functools
+import threading
+import time
+
+from . import sound_detect as sd
+from .batching import InferenceScheduler
+from .pipeline import DetectionPipeline
+from .ring_capture import CallbackCapture, ReplayCapture, SocketCapture
+from common import metrics
+
+
+# run with python3 -m sound.multistream from project root directory
+
+# One entry per monitored input. "name" namespaces the stream's archive
+# directory, GCS blobs (<name>/rec_<ts>.wav) and Firestore ids (<name>_<ts>).
+#   {"name": ..., "source": "device", "device_index": 1}
+#   {"name": ..., "source": "socket", "port": 5005}          raw S16_LE mono PCM at RATE
+#   {"name": ..., "source": "file", "paths": [...], "speed": 1.0}
+STREAMS = [
+    {"name": "room1", "source": "device", "device_index": None},
+]
+
+
+def open_source(config):
+    kind = config["source"]
+    kwargs = dict(ring_seconds=sd.RING_SECONDS, pre_roll_seconds=sd.PRE_ROLL_SECONDS,
+                  post_roll_seconds=sd.POST_ROLL_SECONDS, align=sd.HOP_LENGTH)
+    if kind == "device":
+        return CallbackCapture(sd.RATE, sd.CHUNK, device_index=config.get("device_index"), **kwargs)
+    if kind == "socket":
+        return SocketCapture(sd.RATE, sd.CHUNK, config["port"], host=config.get("host", "0.0.0.0"), **kwargs)
+    if kind == "file":
+        from .replay import load_wavs
+        kwargs.pop("ring_seconds")
+        return ReplayCapture(load_wavs(config["paths"]), sd.RATE, sd.CHUNK,
+                             speed=config.get("speed", 1.0), **kwargs)
+    raise ValueError(f"Unknown source '{kind}' for stream '{config['name']}'")
+
+
+def stream_of(event):
+    """Backpressure key of the shared pipeline: events only displace their own stream's."""
+    return event.get("stream")
+
+
+# =========================
+# STREAM MANAGER
+# =========================
+class StreamMonitor:
+    """One input: its capture, detector state and reader thread."""
+
+    def __init__(self, name, capture, submit):
+        self.name = name
+        self.capture = capture
+        self.detector = sd.EventDetector(capture)
+        self.submit = submit
+        self.events = 0
+        self._running = False
+        self._thread = None
+
+    def _run(self):
+        while self._running:
+            chunk = self.capture.read_chunk(timeout=1.0)
+            if chunk is None:
+                if getattr(self.capture, "finished", False):
+                    break
+                continue
+            chunk_start, samples = chunk
+            sd.CHUNKS.inc()
+            sd.CAPTURE.observe((self.capture.ring.write_pos - chunk_start - len(samples)) / sd.RATE)
+            event = self.detector.feed(chunk_start, samples, time.time(), verbose=False)
+            if event is not None:
+                print(f"🔊 [{self.name}] Loud sound detected! Peak={event['peak']}, RMS={int(event['rms'])}")
+                event["stream"] = self.name
+                event["ring"] = self.capture.ring
+                self.events += 1
+                self.submit(event)
+
+    def start(self):
+        self.capture.start()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"stream-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._running = False
+        self.capture.stop()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self):
+        return {"events": self.events, "capture": self.capture.stats(),
+                "prefilter": self.detector.cascade.stats()}
+
+
+class StreamManager:
+    """
+    Many inputs in one process. Each stream has its own capture ring, mel
+    frontend and pre-filter state; all of them feed one DetectionPipeline
+    whose inference stage submits to a single InferenceScheduler, so the
+    model is loaded once and clips from different rooms are batched
+    together. Persistence (outbox) and alerts (dispatcher) are shared too.
+    The pipeline's queues are bounded per stream: backpressure drops or
+    coalesces only within the stream that overflows.
+    """
+
+    def __init__(self, streams, infer_fn=None, persist_fn=None, notify_fn=None):
+        names = [s["name"] for s in streams]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Stream names must be unique: {names}")
+        self.configs = streams
+        self.infer_fn = infer_fn
+        self.persist_fn = persist_fn or sd.persist_event
+        self.notify_fn = notify_fn or sd.notify_event
+        self.monitors = []
+        self.scheduler = None
+        self.pipeline = None
+
+    def start(self):
+        infer = sd.INFER.time()(self.infer_fn or sd.get_classifier())
+        # room for a burst from every stream before backpressure kicks in
+        self.scheduler = InferenceScheduler(infer, max_batch=max(sd.MAX_BATCH, len(self.configs)),
+                                            max_wait=sd.MAX_BATCH_WAIT,
+                                            max_pending=32 * len(self.configs)).start()
+        self.pipeline = DetectionPipeline(functools.partial(sd.infer_event, scheduler=self.scheduler),
+                                          self.persist_fn, self.notify_fn,
+                                          queue_size=sd.QUEUE_SIZE, policy=sd.BACKPRESSURE_POLICY,
+                                          io_workers=sd.IO_WORKERS, key_fn=stream_of).start()
+        for config in self.configs:
+            monitor = StreamMonitor(config["name"], open_source(config), self.pipeline.submit)
+            self.monitors.append(monitor.start())
+            print(f"🎧 [{monitor.name}] {config['source']} stream started")
+        return self
+
+    def stop(self):
+        for monitor in self.monitors:
+            monitor.stop()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+
+    def stats(self):
+        return {
+            "streams": {m.name: m.stats() for m in self.monitors},
+            "pipeline": self.pipeline.stats(),
+            "latency_ms": self.pipeline.latency_ms(),
+            "batching": self.scheduler.stats(),
+        }
+
+
+def main(streams=STREAMS):
+    print(f"🎧 Multi-stream sound monitor ({len(streams)} streams, one shared model)\n")
+    sd.get_labels()
+    if sd.METRICS_PORT:
+        metrics.serve(sd.METRICS_PORT)
+    summary = metrics.LogSummary(sd.STATS_INTERVAL).start()
+    outbox = sd.get_outbox().start()
+    dispatcher = sd.get_dispatcher().start()
+    manager = StreamManager(streams).start()
+    last_stats = time.time()
+    try:
+        while any(m.alive for m in manager.monitors):
+            time.sleep(0.5)
+            if time.time() - last_stats > sd.STATS_INTERVAL:
+                last_stats = time.time()
+                print(f"[STREAMS] {manager.stats()}")
+                print(f"[OUTBOX] {outbox.stats()}")
+                print(f"[DUPLICATES] {sd.get_duplicate_filter().stats()}")
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        summary.stop()
+        manager.stop()
+        for archive in sd._archives.values():
+            archive.close()
+        if sd._vector_store is not None:
+            sd._vector_store.close()
+        dispatcher.stop()
+        outbox.stop()
+        print(f"[STREAMS] {manager.stats()}")
+        print(f"[OUTBOX] {outbox.stats()}")
+        print(f"[ALERTS] {dispatcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import collections
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+
+
+def percentiles(values, ps=(50, 95, 99)):
+    """{"p50": ..., ...} of `values` (nearest rank), or None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {f"p{p}": ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] for p in ps}
+
+
+def keep_louder(queued, incoming):
+    """Default coalesce rule: keep the louder event and count what it absorbed."""
+    merged = incoming if incoming.get("peak", 0) > queued.get("peak", 0) else queued
+    merged["coalesced"] = queued.get("coalesced", 0) + incoming.get("coalesced", 0) + 1
+    return merged
+
+
+# =========================
+# BOUNDED STAGE QUEUE
+# =========================
+class StageQueue:
+    """
+    Bounded FIFO between two pipeline stages. `put()` never blocks: when the
+    queue is full the backpressure policy either drops the oldest item or
+    coalesces the incoming item into the newest queued one.
+
+    With `key_fn` (e.g. the event's stream) the bound and the policy apply
+    per key: each key holds up to `maxsize` items, and a full key only drops
+    or coalesces its own items, so a burst on one key never evicts or
+    absorbs another key's events.
+    """
+
+    def __init__(self, maxsize, policy=DROP_OLDEST, coalesce_fn=keep_louder, key_fn=None):
+        if policy not in (DROP_OLDEST, COALESCE):
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.coalesce_fn = coalesce_fn
+        self.key_fn = key_fn or (lambda item: None)
+        self._items = collections.deque()
+        self._depths = collections.Counter()  # queued items per key
+        self._cond = threading.Condition()
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def put(self, item):
+        # None is the stop sentinel and always bypasses the policy
+        with self._cond:
+            if item is None:
+                self._items.append(None)
+                self._cond.notify()
+                return
+            self.enqueued += 1
+            key = self.key_fn(item)
+            if self._depths[key] >= self.maxsize:
+                same_key = [i for i, queued in enumerate(self._items)
+                            if queued is not None and self.key_fn(queued) == key]
+                if self.policy == COALESCE:
+                    self._items[same_key[-1]] = self.coalesce_fn(self._items[same_key[-1]], item)
+                    self.coalesced += 1
+                    return
+                del self._items[same_key[0]]
+                self._depths[key] -= 1
+                self.dropped += 1
+            self._items.append(item)
+            self._depths[key] += 1
+            self._cond.notify()
+
+    def get(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._items)
+            item = self._items.popleft()
+            if item is not None:
+                self._depths[self.key_fn(item)] -= 1
+            return item
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        return {"depth": len(self._items), "enqueued": self.enqueued,
+                "dropped": self.dropped, "coalesced": self.coalesced}
+
+
+# =========================
+# STAGED PIPELINE
+# =========================
+class DetectionPipeline:
+    """
+    detect -> infer -> persist -> notify, each stage on its own threads and
+    connected by bounded StageQueues.
+
+    The capture loop only calls `submit()`, which never blocks. Inference
+    runs on one worker thread; persistence (disk, GCS, Firestore) runs on a
+    small I/O pool; notifications run on their own thread. A stage function
+    returning None drops the event; one returning a Future hands the event
+    on when it resolves, so the stage thread is free for the next event.
+    `key_fn` partitions every queue's bound and backpressure (see StageQueue).
+    """
+
+    def __init__(self, infer_fn, persist_fn, notify_fn, queue_size=8,
+                 policy=DROP_OLDEST, io_workers=2, coalesce_fn=keep_louder, latency_window=4096, key_fn=None):
+        self.stages = [
+            ("infer", infer_fn, 1),
+            ("persist", persist_fn, io_workers),
+            ("notify", notify_fn, 1),
+        ]
+        self.queues = {name: StageQueue(queue_size, policy, coalesce_fn, key_fn)
+                       for name, _, _ in self.stages}
+        self.processed = {name: 0 for name, _, _ in self.stages}
+        self.failed = {name: 0 for name, _, _ in self.stages}
+        self.in_flight = {name: 0 for name, _, _ in self.stages}
+        # processed / failed / in_flight change on stage threads and in Future
+        # callbacks; stop() waits on this for in_flight to reach 0
+        self._counts = threading.Condition()
+        # seconds from a stage picking an event up to handing it on
+        self.latencies = {name: collections.deque(maxlen=latency_window) for name, _, _ in self.stages}
+        self._threads = []
+
+    def start(self):
+        for i, (name, fn, workers) in enumerate(self.stages):
+            next_name = self.stages[i + 1][0] if i + 1 < len(self.stages) else None
+            for n in range(workers):
+                t = threading.Thread(target=self._run_stage, args=(name, fn, next_name),
+                                     name=f"pipeline-{name}-{n}", daemon=True)
+                t.start()
+                self._threads.append((name, t))
+        return self
+
+    def submit(self, event):
+        self.queues["infer"].put(event)
+
+    def _run_stage(self, name, fn, next_name):
+        queue = self.queues[name]
+        while True:
+            event = queue.get()
+            if event is None:
+                break
+            start = time.perf_counter()
+            try:
+                event = fn(event)
+            except Exception as e:
+                with self._counts:
+                    self.failed[name] += 1
+                print(f"❌ Pipeline stage '{name}' failed: {e}")
+                traceback.print_exc()
+                continue
+            if isinstance(event, Future):
+                with self._counts:
+                    self.in_flight[name] += 1
+                event.add_done_callback(lambda f, n=name, nn=next_name, t=start: self._finish(n, nn, f, t))
+            else:
+                self._forward(name, next_name, event, start)
+
+    def _finish(self, name, next_name, future, start):
+        try:
+            event = future.result()
+        except Exception as e:
+            with self._counts:
+                self.failed[name] += 1
+            print(f"❌ Pipeline stage '{name}' failed: {e}")
+        else:
+            self._forward(name, next_name, event, start)
+        finally:
+            with self._counts:
+                self.in_flight[name] -= 1
+                self._counts.notify_all()
+
+    def _forward(self, name, next_name, event, start):
+        self.latencies[name].append(time.perf_counter() - start)
+        with self._counts:
+            self.processed[name] += 1
+        if event is not None and next_name is not None:
+            self.queues[next_name].put(event)
+
+    def stop(self, timeout=10.0):
+        """Drain each stage in order, then stop its workers."""
+        for name, _, workers in self.stages:
+            for _ in range(workers):
+                self.queues[name].put(None)
+            for stage_name, t in self._threads:
+                if stage_name == name:
+                    t.join(timeout)
+            with self._counts:
+                self._counts.wait_for(lambda: self.in_flight[name] == 0, timeout)
+
+    def stats(self):
+        with self._counts:
+            counts = {name: (self.processed[name], self.failed[name], self.in_flight[name])
+                      for name, _, _ in self.stages}
+        return {name: dict(self.queues[name].stats(),
+                           processed=counts[name][0],
+                           failed=counts[name][1],
+                           in_flight=counts[name][2])
+                for name, _, _ in self.stages}
+
+    def latency_ms(self):
+        """Per-stage p50/p95/p99 latency in ms over the last `latency_window` events."""
+        out = {}
+        for name, _, _ in self.stages:
+            p = percentiles(list(self.latencies[name]))
+            out[name] = None if p is None else {k: round(v * 1000, 2) for k, v in p.items()}
+        return out
@@ -0,0 +1,177 @@
+import collections
+import math
+import numpy as np
+
+
+# =========================
+# PRE-FILTER CASCADE
+# =========================
+class PrefilterCascade:
+    """
+    Cheap per-chunk gate in front of CNN14. Stages, in order:
+
+      level   - the static PEAK/RMS thresholds fire and the RMS clears an
+                adaptive noise floor by `on_margin_db`; once on, the gate
+                stays on until the level drops below floor + `off_margin_db`
+                (hysteresis); each on period escalates at most once, on
+                the first of its chunks that passes the later stages
+      gap     - at least `min_gap` seconds since the last escalation
+      flux    - spectral flux of the chunk's mel frames must exceed
+                `flux_ratio` x its running average (a real onset, not a
+                steady hum that happens to be loud)
+      novelty - the band-energy profile must differ from every event
+                escalated in the last `novelty_window` seconds
+
+    Mel frames come from StreamingMelFrontend, so the spectrum is computed
+    once per chunk and shared with the classifier input. All buffers are
+    preallocated; `update()` does not allocate arrays.
+    """
+
+    STAGES = ("level", "gap", "flux", "novelty")
+
+    def __init__(self, peak_threshold, rms_threshold, min_gap=0.30, n_mels=64, n_bands=8,
+                 max_frames=16, floor_alpha=0.01, on_margin_db=12.0, off_margin_db=6.0,
+                 flux_ratio=2.0, flux_alpha=0.05, novelty_similarity=0.97, novelty_window=60.0):
+        if n_mels % n_bands:
+            raise ValueError("n_mels must be a multiple of n_bands")
+        self.peak_threshold = peak_threshold
+        self.rms_threshold = rms_threshold
+        self.min_gap = min_gap
+        self.n_bands = n_bands
+        self.floor_alpha = floor_alpha
+        self.on_margin_db = on_margin_db
+        self.off_margin_db = off_margin_db
+        self.flux_ratio = flux_ratio
+        self.flux_alpha = flux_alpha
+        self.novelty_similarity = novelty_similarity
+        self.novelty_window = novelty_window
+
+        self._sq = None
+        self._log = np.zeros((max_frames + 1, n_mels), dtype=np.float32)
+        self._diff = np.zeros((max_frames, n_mels), dtype=np.float32)
+        self._bands = np.zeros(n_bands, dtype=np.float32)
+        self._have_prev = False
+
+        self.noise_floor_db = None
+        self.flux_avg = None
+        self.active = False
+        self.event_escalated = False  # the current on period has escalated
+        self.last_escalation = -math.inf
+        self._recent = collections.deque()  # (time, band profile)
+
+        self.chunks = 0
+        self.loud_chunks = 0  # chunks over the static PEAK/RMS thresholds
+        self.gate_on = 0      # off->on edges of the level gate
+        self.escalated = 0
+        self.rejected = {stage: 0 for stage in self.STAGES}
+
+    def _level(self, samples):
+        if self._sq is None or len(self._sq) != len(samples):
+            self._sq = np.zeros(len(samples), dtype=np.float32)
+        np.multiply(samples, samples, out=self._sq, dtype=np.float32)
+        rms = math.sqrt(float(self._sq.mean()))
+        peak = max(int(samples.max()), -int(samples.min()))
+        return rms, peak
+
+    def _spectral(self, mel):
+        """Spectral flux and normalised log band energies of (frames, n_mels)."""
+        m = min(len(mel), len(self._diff))
+        if m == 0:
+            return None, None
+        log = self._log
+        np.add(mel[:m], 1e-10, out=log[1:m + 1])
+        np.log10(log[1:m + 1], out=log[1:m + 1])
+        if not self._have_prev:
+            log[0] = log[1]
+            self._have_prev = True
+        diff = self._diff[:m]
+        np.subtract(log[1:m + 1], log[:m], out=diff)
+        np.maximum(diff, 0.0, out=diff)
+        flux = float(diff.sum()) / m
+        log[0] = log[m]
+
+        np.sum(log[1:m + 1].reshape(m, self.n_bands, -1), axis=(0, 2), out=self._bands)
+        self._bands -= self._bands.mean()
+        norm = float(np.sqrt(np.dot(self._bands, self._bands))) or 1.0
+        self._bands /= norm
+        return flux, self._bands
+
+    def _reject(self, stage, features):
+        self.rejected[stage] += 1
+        features["rejected_by"] = stage
+        return False, features
+
+    def update(self, samples, mel, now):
+        """
+        Feed one int16 chunk and its mel frames (numpy (frames, n_mels), may
+        be empty). Returns (escalate, features).
+        """
+        self.chunks += 1
+        rms, peak = self._level(samples)
+        level_db = 20.0 * math.log10(rms + 1e-9)
+        flux, bands = self._spectral(mel)
+
+        if self.noise_floor_db is None:
+            self.noise_floor_db = level_db
+        # The floor tracks quickly while the gate is off and slowly while on,
+        # so a new constant noise source is eventually absorbed
+        alpha = self.floor_alpha if not self.active else self.floor_alpha * 0.1
+        self.noise_floor_db += alpha * (level_db - self.noise_floor_db)
+
+        features = {"rms": rms, "peak": peak, "level_db": level_db,
+                    "noise_floor_db": self.noise_floor_db, "flux": flux}
+
+        was_active = self.active
+        above_floor = level_db - self.noise_floor_db
+        static_loud = peak > self.peak_threshold or rms > self.rms_threshold
+        if was_active:
+            self.active = static_loud and above_floor > self.off_margin_db
+        else:
+            self.active = static_loud and above_floor > self.on_margin_db
+
+        flux_avg = self.flux_avg
+        if flux is not None and not self.active:
+            self.flux_avg = flux if flux_avg is None else flux_avg + self.flux_alpha * (flux - flux_avg)
+
+        if self.active and not was_active:
+            self.gate_on += 1
+            self.event_escalated = False
+
+        if not static_loud:
+            features["rejected_by"] = None  # quiet chunk, not a trigger
+            return False, features
+        self.loud_chunks += 1
+        # Later chunks of an on period stay eligible until one escalates, so
+        # an event whose first chunk falls inside the gap (or is not yet a
+        # clear onset) is still classified
+        if not self.active or self.event_escalated:
+            return self._reject("level", features)
+
+        if now - self.last_escalation <= self.min_gap:
+            return self._reject("gap", features)
+
+        if flux is not None and flux_avg is not None and flux <= self.flux_ratio * flux_avg:
+            return self._reject("flux", features)
+
+        while self._recent and now - self._recent[0][0] > self.novelty_window:
+            self._recent.popleft()
+        if bands is not None:
+            for _, profile in self._recent:
+                if float(np.dot(profile, bands)) > self.novelty_similarity:
+                    return self._reject("novelty", features)
+            self._recent.append((now, bands.copy()))
+
+        self.last_escalation = now
+        self.event_escalated = True
+        self.escalated += 1
+        return True, features
+
+    def stats(self):
+        return {
+            "chunks": self.chunks,
+            "loud_chunks": self.loud_chunks,
+            "gate_on": self.gate_on,
+            "escalated": self.escalated,
+            "rejected": dict(self.rejected),
+            "noise_floor_db": round(self.noise_floor_db, 1) if self.noise_floor_db is not None else None,
+        }
@@ -0,0 +1,309 @@
+import argparse
+import functools
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import wave
+import numpy as np
+import torch
+
+from . import sound_detect as sd
+from .archive import ArchiveWriter
+from .batching import InferenceScheduler
+from .email_alert import AlertDispatcher
+from .pipeline import DetectionPipeline, percentiles
+from .ring_capture import ReplayCapture
+from common.fakes import FakeBucket, FakeFirestore, LocalSMTPServer
+from common.outbox import Outbox
+from common.vector_store import NearDuplicateFilter, VectorStore
+
+
+# run with python3 -m sound.replay from project root directory:
+#   python3 -m sound.replay rec1.wav rec2.wav      replay recordings through the pipeline
+#   python3 -m sound.replay --synthetic 300        five minutes of generated audio
+#   python3 -m sound.replay bench --save base.json record micro-benchmarks
+#   python3 -m sound.replay bench --check base.json  exit 1 on a regression
+#   python3 -m sound.replay triggers               camera button-to-trigger latency, push vs polling
+# --random-weights runs without the checkpoints (timings only).
+
+
+# =========================
+# SOURCES
+# =========================
+def load_wavs(paths, rate=sd.RATE):
+    """Concatenate WAV files as mono int16 at `rate` (resampled if needed)."""
+    import torchaudio
+
+    parts = []
+    for path in paths:
+        with wave.open(path, "rb") as wf:
+            channels, file_rate = wf.getnchannels(), wf.getframerate()
+            if wf.getsampwidth() != 2:
+                raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+            audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        audio = audio.reshape(-1, channels).mean(axis=1)
+        if file_rate != rate:
+            audio = torchaudio.functional.resample(torch.from_numpy(audio).float(), file_rate, rate).numpy()
+        parts.append(np.clip(audio, -32768, 32767).astype(np.int16))
+    return np.concatenate(parts)
+
+def synthetic_scene(seconds, rate=sd.RATE, event_every=6.0, seed=0):
+    """
+    Room noise with a loud event (tone sweep, noise burst or clap train)
+    every ~`event_every` seconds. Returns (audio, event start samples).
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * rate)
+    audio = 300 * rng.standard_normal(n) + 200 * np.sin(2 * np.pi * 50 * np.arange(n) / rate)
+    starts = []
+    t = event_every / 2
+    while t + 1.0 < seconds:
+        start = int((t + rng.uniform(-1, 1)) * rate)
+        length = int(rng.uniform(0.3, 0.9) * rate)
+        kind = rng.integers(3)
+        tt = np.arange(length) / rate
+        if kind == 0:
+            burst = 20000 * np.sin(2 * np.pi * (400 + 3000 * tt) * tt)
+        elif kind == 1:
+            burst = 15000 * rng.standard_normal(length)
+        else:
+            burst = 25000 * rng.standard_normal(length) * (np.sin(2 * np.pi * 8 * tt) > 0.7)
+        audio[start:start + length] += burst * np.hanning(length)
+        starts.append(start)
+        t += event_every
+    return np.clip(audio, -32768, 32767).astype(np.int16), starts
+
+def use_random_weights():
+    """Register untrained models so the harness runs without checkpoints."""
+    from .models import MODEL_REGISTRY
+
+    for name, (model_cls, _) in MODEL_REGISTRY.items():
+        sd._models[name] = model_cls().eval()
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def _ms(p):
+    return None if p is None else {k: round(v * 1000, 2) for k, v in p.items()}
+
+
+# =========================
+# REPLAY
+# =========================
+def replay(audio, rate=sd.RATE, speed=None, infer_fn=None, truth=None, verbose=False):
+    """
+    Run `audio` through detection -> inference -> persistence -> notify
+    exactly as main() wires them, with persistence going to a temporary
+    archive and vector store, the outbox draining into in-memory
+    Firestore/GCS fakes and alerts going to a local SMTP stand-in. Returns throughput, per-stage
+    latency percentiles and peak RSS.
+
+    `truth` (sample positions of known events, e.g. from synthetic_scene)
+    adds recall / false-trigger counts.
+    """
+    infer_fn = sd.INFER.time()(infer_fn or sd.get_classifier())
+    sd.get_labels()
+
+    with tempfile.TemporaryDirectory() as tmp, LocalSMTPServer() as smtp:
+        archive = ArchiveWriter(os.path.join(tmp, "archive"), codec=sd.ARCHIVE_CODEC)
+        vectors = None
+        duplicates = NearDuplicateFilter(window=sd.DUPLICATE_WINDOW, threshold=sd.DUPLICATE_SIMILARITY)
+        if sd.EMBEDDINGS:
+            model = sd.get_model(sd.embedding_model())
+            vectors = VectorStore(os.path.join(tmp, "vectors"), dim=model.fc1.out_features)
+        db, bucket = FakeFirestore(), FakeBucket()
+        outbox = Outbox(os.path.join(tmp, "outbox.db"), sd.TimedFirestoreSink(db), sd.TimedGCSSink(bucket),
+                        batch_size=sd.OUTBOX_BATCH_SIZE, upload_workers=sd.OUTBOX_UPLOAD_WORKERS,
+                        poll_interval=0.05).start()
+        dispatcher = AlertDispatcher(sd.TimedSMTPConnection(smtp.host, smtp.port, starttls=False, credentials=None),
+                                     sender="monitor@localhost", recipient="alerts@localhost",
+                                     window=0.2, min_interval=0.2).start()
+
+        end_to_end = []
+        detected = []
+
+        def notify(event):
+            event = sd.notify_event(event, dispatcher=dispatcher)
+            end_to_end.append(time.perf_counter() - event["detected_at"])
+            return event
+
+        capture = ReplayCapture(audio, rate, sd.CHUNK,
+                                pre_roll_seconds=sd.PRE_ROLL_SECONDS,
+                                post_roll_seconds=sd.POST_ROLL_SECONDS, speed=speed).start()
+        detector = sd.EventDetector(capture)
+        scheduler = InferenceScheduler(infer_fn, max_batch=sd.MAX_BATCH, max_wait=sd.MAX_BATCH_WAIT).start()
+        pipeline = DetectionPipeline(functools.partial(sd.infer_event, scheduler=scheduler, ring=capture.ring),
+                                     functools.partial(sd.persist_event, archive=archive, outbox=outbox,
+                                                       vectors=vectors, duplicates=duplicates),
+                                     notify, queue_size=sd.QUEUE_SIZE, policy=sd.BACKPRESSURE_POLICY,
+                                     io_workers=sd.IO_WORKERS).start()
+
+        detect_times = []
+        t0 = 1_700_000_000.0  # replay clock: wall time as if the audio were live
+        start = time.perf_counter()
+        while True:
+            chunk = capture.read_chunk()
+            if chunk is None:
+                break
+            chunk_start, samples = chunk
+            t = time.perf_counter()
+            event = detector.feed(chunk_start, samples, t0 + chunk_start / rate, verbose=verbose)
+            detect_times.append(time.perf_counter() - t)
+            if event is not None:
+                event["detected_at"] = time.perf_counter()
+                detected.append((event["clip_start"], event["clip_stop"]))
+                pipeline.submit(event)
+
+        pipeline.stop(timeout=60)
+        scheduler.stop()
+        outbox.flush(timeout=30)
+        wall = time.perf_counter() - start
+        dispatcher.stop()
+        outbox.stop()
+        archive.close()
+        if vectors is not None:
+            vectors.close()
+
+        latency = {"detect": _ms(percentiles(detect_times))}
+        latency.update(pipeline.latency_ms())
+        latency["end_to_end"] = _ms(percentiles(end_to_end))
+        report = {
+            "audio_seconds": round(len(audio) / rate, 2),
+            "wall_seconds": round(wall, 2),
+            "realtime_factor": round(len(audio) / rate / wall, 2),
+            "events_detected": len(detected),
+            "events_notified": len(end_to_end),
+            "latency_ms": latency,
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "prefilter": detector.cascade.stats(),
+            "batching": scheduler.stats(),
+            "pipeline_failed": {k: v["failed"] for k, v in pipeline.stats().items()},
+            "uploaded": len(bucket.blobs),
+            "documents": sum(len(docs) for docs in db.data.values()),
+            "emails": len(smtp.messages),
+            "duplicates": duplicates.stats(),
+        }
+    if truth is not None:
+        hits = sum(any(a <= s < b for a, b in detected) for s in truth)
+        report["recall"] = round(hits / len(truth), 3) if truth else None
+        report["false_triggers"] = sum(not any(a <= s < b for s in truth) for a, b in detected)
+    return report
+
+
+# =========================
+# MICRO-BENCHMARKS
+# =========================
+def bench(fn, runs=20, warmup=3):
+    """Latency of fn() in ms: mean and p50/p95/p99 over `runs` calls."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return {"mean": round(float(np.mean(times)) * 1000, 3), **_ms(percentiles(times))}
+
+def detector_check(seconds=60.0):
+    """
+    Per-chunk detector cost plus trigger counts on a fixed synthetic scene,
+    so a threshold change that alters detections shows up in --check.
+    """
+    audio, truth = synthetic_scene(seconds)
+    capture = ReplayCapture(audio, sd.RATE, sd.CHUNK, pre_roll_seconds=sd.PRE_ROLL_SECONDS,
+                            post_roll_seconds=sd.POST_ROLL_SECONDS).start()
+    detector = sd.EventDetector(capture)
+    times, clips = [], []
+    while (chunk := capture.read_chunk()) is not None:
+        t = time.perf_counter()
+        event = detector.feed(chunk[0], chunk[1], 1_700_000_000.0 + chunk[0] / sd.RATE, verbose=False)
+        times.append(time.perf_counter() - t)
+        if event is not None:
+            clips.append((event["clip_start"], event["clip_stop"]))
+    return {
+        "per_chunk_ms": {"mean": round(float(np.mean(times)) * 1000, 3), **_ms(percentiles(times))},
+        "triggers": len(clips),
+        "hits": sum(any(a <= s < b for a, b in clips) for s in truth),
+    }
+
+def run_benchmarks(runs=20):
+    clip = synthetic_scene(sd.RECORD_SECONDS + 1, event_every=2.0)[0][:int(sd.RATE * sd.RECORD_SECONDS)]
+    return {
+        "preprocess_waveform": bench(lambda: sd.preprocess_waveform(clip), runs),
+        "classify_audio": bench(lambda: sd.classify_audio(clip), runs),
+        "detector": detector_check(),
+    }
+
+def compare(results, baseline, tolerance=0.25):
+    """Regressions: p50 more than `tolerance` slower, or changed trigger counts."""
+    problems = []
+    for name, base in baseline.items():
+        cur = results.get(name)
+        if cur is None:
+            continue
+        if name == "detector":
+            for key in ("triggers", "hits"):
+                if cur[key] != base[key]:
+                    problems.append(f"detector {key}: {base[key]} -> {cur[key]}")
+            cur, base = cur["per_chunk_ms"], base["per_chunk_ms"]
+        if cur["p50"] > base["p50"] * (1 + tolerance):
+            problems.append(f"{name} p50: {base['p50']:.3f} -> {cur['p50']:.3f} ms")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m sound.replay")
+    parser.add_argument("wavs", nargs="*", help="WAV files to replay (or 'bench' / 'triggers')")
+    parser.add_argument("--synthetic", type=float, metavar="SECONDS", help="replay generated audio")
+    parser.add_argument("--speed", type=float, help="pace at this multiple of real time (default: unpaced)")
+    parser.add_argument("--random-weights", action="store_true", help="untrained models, for timing only")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--save", metavar="JSON", help="bench: write results as a baseline")
+    parser.add_argument("--check", metavar="JSON", help="bench: compare against a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--presses", type=int, default=10, help="triggers: simulated button presses")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="triggers: ThingSpeak poll interval")
+    args = parser.parse_args(argv)
+
+    if args.wavs[:1] == ["triggers"]:
+        from camera.trigger import replay_triggers
+        print(json.dumps(replay_triggers(args.presses, args.poll_interval), indent=2))
+        return 0
+
+    if args.random_weights:
+        use_random_weights()
+
+    if args.wavs[:1] == ["bench"]:
+        results = run_benchmarks(args.runs)
+        print(json.dumps(results, indent=2))
+        if args.save:
+            with open(args.save, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"✅ Baseline saved to {args.save}")
+        if args.check:
+            with open(args.check) as f:
+                problems = compare(results, json.load(f), args.tolerance)
+            for p in problems:
+                print(f"❌ {p}")
+            if problems:
+                return 1
+            print("✅ No regressions")
+        return 0
+
+    truth = None
+    if args.synthetic:
+        audio, truth = synthetic_scene(args.synthetic)
+    elif args.wavs:
+        audio = load_wavs(args.wavs)
+    else:
+        parser.error("give WAV files, --synthetic SECONDS, 'bench' or 'triggers'")
+    print(json.dumps(replay(audio, speed=args.speed, truth=truth, verbose=args.verbose), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
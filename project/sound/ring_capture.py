@@ -0,0 +1,319 @@
+import threading
+import time
+import numpy as np
+
+
+# =========================
+# RING BUFFER
+# =========================
+class AudioRingBuffer:
+    """
+    Fixed-size, preallocated ring of int16 samples.
+
+    Every sample is written twice (at i and i + capacity), so any window of
+    up to `capacity` samples is one contiguous slice and can be handed out
+    as a numpy view without copying.
+
+    Positions are absolute sample counts since the stream started.
+    One writer (the PyAudio callback) and one reading cursor (the main loop).
+    """
+
+    def __init__(self, capacity, dtype=np.int16):
+        self.capacity = int(capacity)
+        self._buf = np.zeros(2 * self.capacity, dtype=dtype)
+        self._cond = threading.Condition()
+        self.write_pos = 0
+        self.read_pos = 0
+        self.overrun_samples = 0
+        self.max_write = 0  # largest write so far: how far past oldest() a write under way may reach
+
+    def write(self, samples):
+        cap = self.capacity
+        n = len(samples)
+        if n > cap:
+            samples = samples[-cap:]
+            self.write_pos += n - cap
+            n = cap
+        self.max_write = max(self.max_write, n)  # before the samples go in, for copy()
+
+        start = self.write_pos % cap
+        first = min(n, cap - start)
+        rest = n - first
+        self._buf[start:start + first] = samples[:first]
+        self._buf[start + cap:start + cap + first] = samples[:first]
+        if rest:
+            self._buf[:rest] = samples[first:]
+            self._buf[cap:cap + rest] = samples[first:]
+
+        with self._cond:
+            self.write_pos += n
+            self._cond.notify_all()
+
+    def oldest(self):
+        return max(0, self.write_pos - self.capacity)
+
+    def is_valid(self, start):
+        """True while samples from `start` onwards have not been overwritten."""
+        return start >= self.oldest()
+
+    def view(self, start, stop):
+        """Zero-copy read-only view of samples [start, stop)."""
+        if stop - start > self.capacity:
+            raise ValueError("Requested window is larger than the ring buffer.")
+        if not self.is_valid(start) or stop > self.write_pos:
+            raise IndexError(f"Samples [{start}, {stop}) are not in the ring buffer.")
+        offset = start % self.capacity
+        out = self._buf[offset:offset + (stop - start)]
+        out.flags.writeable = False
+        return out
+
+    def copy(self, start, stop):
+        """
+        Copy of samples [start, stop), or None if they have been overwritten.
+        write() advances write_pos only after its samples are in, so a write
+        under way can be overwriting up to `max_write` samples past oldest();
+        the window is checked again after copying, with that margin.
+        """
+        try:
+            out = np.array(self.view(start, stop))
+        except IndexError:
+            return None
+        if start < self.oldest() + self.max_write:
+            return None
+        return out
+
+    def wait_until(self, position, timeout=None):
+        """Block until `position` samples have been written."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.write_pos >= position, timeout)
+
+    def next_chunk(self, size, timeout=None):
+        """
+        Return (start, view) for the next `size` samples at the read cursor
+        and advance it. Samples the reader fell too far behind to see are
+        skipped and counted in `overrun_samples`. Returns None on timeout.
+        """
+        if not self.wait_until(self.read_pos + size, timeout):
+            return None
+        oldest = self.oldest()
+        if self.read_pos < oldest:
+            self.overrun_samples += oldest - self.read_pos
+            self.read_pos = oldest
+        start = self.read_pos
+        self.read_pos += size
+        return start, self.view(start, start + size)
+
+    def seek(self, position):
+        self.read_pos = max(self.read_pos, position)
+
+
+# =========================
+# PYAUDIO CALLBACK CAPTURE
+# =========================
+class CallbackCapture:
+    """
+    PyAudio input stream in callback mode feeding an AudioRingBuffer.
+
+    The PortAudio thread only copies samples into the ring, so capture keeps
+    running while the main loop is busy classifying or uploading.
+    """
+
+    def __init__(self, rate, chunk, ring_seconds=30.0,
+                 pre_roll_seconds=0.5, post_roll_seconds=1.5, align=1, device_index=None):
+        self.rate = rate
+        self.chunk = chunk
+        self.pre_roll = int(pre_roll_seconds * rate)
+        self.post_roll = int(post_roll_seconds * rate)
+        self.align = align
+        self.device_index = device_index
+        self.ring = AudioRingBuffer(int(ring_seconds * rate))
+
+        self.input_overflows = 0
+        self.input_underflows = 0
+        self.callbacks = 0
+
+        self._pa = None
+        self._stream = None
+
+    def _callback(self, in_data, frame_count, time_info, status_flags):
+        import pyaudio
+
+        self.callbacks += 1
+        if status_flags & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        if status_flags & pyaudio.paInputUnderflow:
+            self.input_underflows += 1
+        self.ring.write(np.frombuffer(in_data, dtype=np.int16))
+        return (None, pyaudio.paContinue)
+
+    def start(self):
+        import pyaudio
+
+        self._pa = pyaudio.PyAudio()
+        self._stream = self._pa.open(format=pyaudio.paInt16, channels=1, rate=self.rate,
+                                     input=True, frames_per_buffer=self.chunk,
+                                     input_device_index=self.device_index,
+                                     stream_callback=self._callback)
+        self._stream.start_stream()
+        return self
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pa is not None:
+            self._pa.terminate()
+            self._pa = None
+
+    def read_chunk(self, timeout=1.0):
+        """Next CHUNK at the read cursor as (start, view), or None on timeout."""
+        return self.ring.next_chunk(self.chunk, timeout)
+
+    def clip_bounds(self, trigger_pos):
+        """Clip [start, stop) around `trigger_pos`, with start on the `align` grid."""
+        start = trigger_pos - self.pre_roll
+        start -= start % self.align
+        oldest = self.ring.oldest()
+        if start < oldest:
+            start = oldest + (-oldest % self.align)
+        return start, start + self.pre_roll + self.post_roll
+
+    def clip(self, trigger_pos, timeout=None):
+        """
+        Wait for the post-roll to arrive and return (start, view) of the clip
+        around `trigger_pos`. The view stays valid until the ring wraps past
+        `start`; take `ring.copy(start, stop)` before using it much later.
+        """
+        start, stop = self.clip_bounds(trigger_pos)
+        if not self.ring.wait_until(stop, timeout):
+            return None
+        return start, self.ring.view(start, stop)
+
+    def stats(self):
+        return {
+            "callbacks": self.callbacks,
+            "input_overflows": self.input_overflows,
+            "input_underflows": self.input_underflows,
+            "overrun_samples": self.ring.overrun_samples,
+            "samples_captured": self.ring.write_pos,
+            "read_lag_samples": self.ring.write_pos - self.ring.read_pos,
+        }
+
+
+# =========================
+# REPLAY SOURCE
+# =========================
+class ReplayCapture(CallbackCapture):
+    """
+    Drop-in for CallbackCapture that plays an int16 array instead of the
+    microphone. Each read_chunk() writes the next chunk into the ring and
+    returns it, so the detector runs as fast as the CPU allows (or at
+    `speed` x real time). read_chunk() returns None and `finished` is set
+    once the audio is exhausted.
+
+    By default the ring holds the whole recording, so clips queued behind a
+    slow stage are never overwritten; pass ring_seconds to bound memory.
+    """
+
+    def __init__(self, audio, rate, chunk, ring_seconds=None, pre_roll_seconds=0.5,
+                 post_roll_seconds=1.5, align=1, speed=None):
+        if ring_seconds is None:
+            ring_seconds = (len(audio) + 2 * chunk) / rate
+        super().__init__(rate, chunk, ring_seconds, pre_roll_seconds, post_roll_seconds, align)
+        self.audio = np.ascontiguousarray(audio, dtype=np.int16)
+        self.speed = speed
+        self.finished = False
+        self._pos = 0
+        self._t0 = None
+
+    def start(self):
+        self._t0 = time.monotonic()
+        return self
+
+    def stop(self):
+        pass
+
+    def read_chunk(self, timeout=1.0):
+        if self._pos + self.chunk > len(self.audio):
+            self.finished = True
+            return None
+        if self.speed:
+            due = self._t0 + (self._pos + self.chunk) / self.rate / self.speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.ring.write(self.audio[self._pos:self._pos + self.chunk])
+        self._pos += self.chunk
+        self.callbacks += 1
+        return self.ring.next_chunk(self.chunk, timeout)
+
+
+# =========================
+# NETWORK PCM SOURCE
+# =========================
+class SocketCapture(CallbackCapture):
+    """
+    Drop-in for CallbackCapture fed by a TCP client streaming raw mono
+    little-endian int16 PCM at `rate` (e.g. `arecord -f S16_LE -r 32000
+    -c 1 -t raw | nc host port`). One client at a time; when it
+    disconnects the next one is accepted and the stream continues at the
+    same absolute positions.
+    """
+
+    def __init__(self, rate, chunk, port, host="0.0.0.0", ring_seconds=30.0,
+                 pre_roll_seconds=0.5, post_roll_seconds=1.5, align=1):
+        super().__init__(rate, chunk, ring_seconds, pre_roll_seconds, post_roll_seconds, align)
+        self.host = host
+        self.port = port
+        self.clients = 0
+        self.bytes_received = 0
+        self._sock = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        import socket
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.listen(1)
+        self.port = self._sock.getsockname()[1]
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name=f"pcm-socket-{self.port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _serve(self):
+        while self._running:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self.clients += 1
+            leftover = b""
+            with conn:
+                while self._running:
+                    try:
+                        data = conn.recv(self.chunk * 2)
+                    except OSError:
+                        break
+                    if not data:
+                        break
+                    self.bytes_received += len(data)
+                    data = leftover + data
+                    usable = len(data) - len(data) % 2
+                    leftover = data[usable:]
+                    if usable:
+                        self.callbacks += 1
+                        self.ring.write(np.frombuffer(data[:usable], dtype="<i2"))
+
+    def stop(self):
+        self._running = False
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def stats(self):
+        return dict(super().stats(), clients=self.clients, bytes_received=self.bytes_received)
@@ -1,15 +1,25 @@
-import pyaudio
 import numpy as np
 import time
+import threading
+import functools
 import torch
-import torch.nn as nn
 import torchaudio
 import os
-import wave
 import csv
-from .cloud_upload import save_to_firebase
-from .email_alert import send_alert_email
-from .cloud_uploader_gcs import upload_wav_to_gcs
+from .ring_capture import CallbackCapture
+from .pipeline import DetectionPipeline
+from .mel_stream import StreamingMelFrontend
+from .models import MODEL_REGISTRY, load_cnn14, load_model, mmap_path, split_output
+from .inference import build_backend, calibration_mels
+from .batching import InferenceScheduler, then
+from .prefilter import PrefilterCascade
+from .continuous import ContinuousTagger
+from .cascade import ModelCascade
+from .archive import ArchiveWriter, wav_bytes
+from .email_alert import AlertDispatcher, SMTPConnection
+from common.outbox import Outbox, FirestoreSink, GCSSink
+from common.vector_store import NearDuplicateFilter, VectorStore, set_active
+from common import metrics
 
 
 # run with python3 -m sound.sound_detect from project root directory
@@ -23,13 +33,74 @@ RATE = 32000
 PEAK_THRESHOLD = 30000
 RMS_THRESHOLD = 7200
 MIN_GAP = 0.30
+NOISE_FLOOR_ALPHA = 0.01         # adaptive noise floor EMA rate (per chunk)
+ON_MARGIN_DB = 12.0              # dB above the noise floor to switch the gate on
+OFF_MARGIN_DB = 6.0              # ... and to keep it on (hysteresis)
+FLUX_RATIO = 2.0                 # onset: spectral flux vs its running average
+NOVELTY_SIMILARITY = 0.97        # band-profile cosine above which an event is a repeat
+NOVELTY_WINDOW = 60.0            # seconds an escalated event suppresses repeats
 RECORD_SECONDS = 2.0
+PRE_ROLL_SECONDS = 0.5           # audio kept from before the trigger
+POST_ROLL_SECONDS = RECORD_SECONDS - PRE_ROLL_SECONDS
+RING_SECONDS = 30.0              # capture history held in memory
+STATS_INTERVAL = 60.0            # seconds between capture stats prints
+METRICS_PORT = 9101              # Prometheus /metrics; None to disable
+QUEUE_SIZE = 8                   # bounded queue between pipeline stages
+BACKPRESSURE_POLICY = "drop_oldest"  # or "coalesce"
+IO_WORKERS = 2                   # threads for disk / GCS / Firestore
 DEVICE = "cpu"
-
-MODEL_PATH = "./sound/cnn14_32k.pth"
+INFERENCE_BACKEND = "eager"      # eager | script | compile | channels_last | dynamic_int8 | static_int8 | onnx
+MAX_BATCH = 8                    # clips per batched CNN14 forward pass
+MAX_BATCH_WAIT = 0.05            # max extra latency (s) spent waiting to fill a batch
+N_FFT = 1024
+HOP_LENGTH = 320
+N_MELS = 64
+CONTINUOUS_TAGGING = False       # also tag the whole stream with sliding windows
+TAGGING_WINDOW_FRAMES = 192      # ~2 s; window/hop/context are multiples of 64 frames
+TAGGING_HOP_FRAMES = 64          # ~0.64 s between score updates
+TAGGING_CONTEXT_FRAMES = 64      # left context recomputed per hop
+
+FIRST_TIER_MODEL = None          # e.g. "cnn6": small model first, CNN14 only when uncertain
+FIRST_TIER_BACKEND = "eager"
+UNCERTAIN_BAND = (0.2, 0.6)      # first-tier top scores in [lo, hi) escalate to CNN14
+ALERT_LABELS = {"Siren", "Screaming", "Glass", "Shatter", "Gunshot, gunfire",
+                "Smoke detector, smoke alarm", "Fire alarm", "Explosion"}
+
+ARCHIVE_DIR = "./sound/archive"  # hourly segments, see python3 -m sound.archive
+ARCHIVE_CODEC = "pcm16"          # pcm16 (zero-copy reads) | zlib (smaller, decoded on read)
+
+OUTBOX_PATH = "./sound/outbox.db"  # queued Firestore writes / GCS uploads, survives restarts
+OUTBOX_BATCH_SIZE = 100          # Firestore writes per batch commit
+OUTBOX_UPLOAD_WORKERS = 4        # parallel GCS uploads
+COLLECTION = "recordings"
+
+EMBEDDINGS = True                # keep the fc1 embedding of every classified clip
+VECTOR_STORE_DIR = "./sound/vectors"  # one subdirectory per embedding model
+DUPLICATE_SIMILARITY = 0.92      # embedding cosine above which an event repeats a recent one
+DUPLICATE_WINDOW = 300.0         # seconds after its last repeat that an event suppresses repeats
+
+MODEL_PATH = MODEL_REGISTRY["cnn14"][1]
+MMAP_MODEL_PATH = mmap_path(MODEL_PATH)  # from python3 -m sound.models convert
 LABELS_CSV_PATH = "./sound/class_labels_indices.csv"
 
-print("🎧 Loud sound detector with CNN14 classification\n")
+# =========================
+# METRICS
+# =========================
+STAGE_SECONDS = metrics.histogram("sound_stage_seconds", "Time spent in each sound pipeline stage", ["stage"])
+DETECT = STAGE_SECONDS.labels(stage="detect")
+PREPROCESS = STAGE_SECONDS.labels(stage="preprocess")
+INFER = STAGE_SECONDS.labels(stage="infer")
+ARCHIVE = STAGE_SECONDS.labels(stage="archive")
+ENQUEUE = STAGE_SECONDS.labels(stage="enqueue")  # outbox inserts, on the persist worker
+# audio waiting in the capture ring until the detector reads it (per chunk)
+CAPTURE = STAGE_SECONDS.labels(stage="capture")
+# the background sends, on the outbox / dispatcher threads: one GCS upload,
+# one Firestore batch commit, one email (incl. reconnects)
+UPLOAD = STAGE_SECONDS.labels(stage="upload")
+FIRESTORE = STAGE_SECONDS.labels(stage="firestore")
+EMAIL = STAGE_SECONDS.labels(stage="email")
+EVENTS = metrics.counter("sound_events_total", "Sound events reaching each stage", ["stage"])
+CHUNKS = metrics.counter("sound_chunks_total", "Audio chunks read from capture")
 
 # =========================
 # LOAD AUDIOSET LABELS
@@ -44,183 +115,411 @@ def load_audioset_labels(csv_path):
             labels[index] = display_name
     return labels
 
-print("Loading AudioSet labels...")
-LABELS = load_audioset_labels(LABELS_CSV_PATH)
-print(f"✅ Loaded {len(LABELS)} AudioSet labels.\n")
-
-# =========================
-# CNN14 ARCHITECTURE
-# =========================
-class ConvBlock(nn.Module):
-    def __init__(self, in_channels, out_channels):
-        super().__init__()
-        self.conv1 = nn.Conv2d(in_channels, out_channels, 3, padding=1, bias=False)
-        self.conv2 = nn.Conv2d(out_channels, out_channels, 3, padding=1, bias=False)
-        self.bn1 = nn.BatchNorm2d(out_channels)
-        self.bn2 = nn.BatchNorm2d(out_channels)
-
-    def forward(self, x, pool_size=(2, 2)):
-        x = nn.functional.relu_(self.bn1(self.conv1(x)))
-        x = nn.functional.relu_(self.bn2(self.conv2(x)))
-        x = nn.functional.avg_pool2d(x, kernel_size=pool_size)
-        return x
-
-class CNN14(nn.Module):
-    def __init__(self, classes_num=527):
-        super().__init__()
-        self.conv_block1 = ConvBlock(1, 64)
-        self.conv_block2 = ConvBlock(64, 128)
-        self.conv_block3 = ConvBlock(128, 256)
-        self.conv_block4 = ConvBlock(256, 512)
-        self.conv_block5 = ConvBlock(512, 1024)
-        self.conv_block6 = ConvBlock(1024, 2048)
-        self.fc1 = nn.Linear(2048, 2048)
-        self.fc_audioset = nn.Linear(2048, classes_num)
-
-    def forward(self, x):
-        x = self.conv_block1(x)
-        x = self.conv_block2(x)
-        x = self.conv_block3(x)
-        x = self.conv_block4(x)
-        x = self.conv_block5(x)
-        x = self.conv_block6(x)
-        x = torch.mean(x, dim=3)
-        x1, _ = torch.max(x, dim=2)
-        x2 = torch.mean(x, dim=2)
-        x = x1 + x2
-        x = nn.functional.relu_(self.fc1(x))
-        x = torch.sigmoid(self.fc_audioset(x))
-        return x
-
-# =========================
-# LOAD MODEL
-# =========================
-print("Loading CNN14 model...")
-cnn14 = CNN14()
-torch.serialization.add_safe_globals([np._core.multiarray._reconstruct])
-checkpoint = torch.load(MODEL_PATH, map_location=DEVICE, weights_only=False)
-state_dict = checkpoint["model"] if isinstance(checkpoint, dict) and "model" in checkpoint else checkpoint
-cnn14.load_state_dict(state_dict, strict=False)
-cnn14.to(DEVICE)
-cnn14.eval()
-print("✅ CNN14 model loaded.\n")
+# =========================
+# LAZY COMPONENTS
+# =========================
+# Nothing heavy happens at import time; labels, model and inference backend
+# are loaded on first use and cached.
+_labels = None
+_models = {}
+_backends = {}
+_classifier = None
+_archives = {}
+_outbox = None
+_dispatcher = None
+_vector_store = None
+_duplicate_filter = None
+_init_lock = threading.Lock()
+
+def get_labels():
+    global _labels
+    with _init_lock:
+        if _labels is None:
+            print("Loading AudioSet labels...")
+            _labels = load_audioset_labels(LABELS_CSV_PATH)
+            print(f"✅ Loaded {len(_labels)} AudioSet labels.\n")
+    return _labels
+
+def get_model(name="cnn14"):
+    with _init_lock:
+        if name not in _models:
+            print(f"Loading {name} model...")
+            start = time.perf_counter()
+            path = MODEL_REGISTRY[name][1]
+            if os.path.exists(mmap_path(path)):
+                _models[name] = load_model(name, mmap_path(path), DEVICE, mmap=True)
+            else:
+                _models[name] = load_model(name, path, DEVICE)
+            print(f"✅ {name} model loaded in {time.perf_counter() - start:.2f}s.\n")
+    return _models[name]
+
+def get_backend(name="cnn14", backend=INFERENCE_BACKEND):
+    model = get_model(name)
+    with _init_lock:
+        if (name, backend) not in _backends:
+            print(f"Preparing '{backend}' inference backend for {name}...")
+            calibration = calibration_mels(preprocess_waveform) if backend == "static_int8" else None
+            _backends[(name, backend)] = build_backend(backend, model, calibration=calibration,
+                                                       embedding=EMBEDDINGS)
+            print("✅ Inference backend ready.\n")
+    return _backends[(name, backend)]
+
+def get_classifier():
+    """Batched mel -> probs function: CNN14 alone, or the two-tier cascade."""
+    global _classifier
+    if _classifier is None:
+        if FIRST_TIER_MODEL:
+            _classifier = ModelCascade(get_backend(FIRST_TIER_MODEL, FIRST_TIER_BACKEND),
+                                       get_backend("cnn14"), get_labels(),
+                                       uncertain_band=UNCERTAIN_BAND, alert_labels=ALERT_LABELS)
+        else:
+            _classifier = get_backend("cnn14")
+    return _classifier
+
+def get_archive(stream=None):
+    """Archive writer for a stream; each named stream gets its own subdirectory."""
+    with _init_lock:
+        if stream not in _archives:
+            root = ARCHIVE_DIR if stream is None else os.path.join(ARCHIVE_DIR, stream)
+            _archives[stream] = ArchiveWriter(root, codec=ARCHIVE_CODEC)
+    return _archives[stream]
+
+class TimedFirestoreSink(FirestoreSink):
+    @FIRESTORE.time()
+    def write(self, docs):
+        return super().write(docs)
+
+class TimedGCSSink(GCSSink):
+    @UPLOAD.time()
+    def upload(self, name, data, content_type, public=True):
+        return super().upload(name, data, content_type, public)
+
+class TimedSMTPConnection(SMTPConnection):
+    @EMAIL.time()
+    def send(self, sender, recipients, message):
+        return super().send(sender, recipients, message)
+
+def get_outbox():
+    """Outbox bound to the real Firestore / GCS clients (imported on first use)."""
+    global _outbox
+    with _init_lock:
+        if _outbox is None:
+            from .cloud_upload import db, bucket
+            _outbox = Outbox(OUTBOX_PATH, TimedFirestoreSink(db), TimedGCSSink(bucket),
+                             batch_size=OUTBOX_BATCH_SIZE, upload_workers=OUTBOX_UPLOAD_WORKERS)
+    return _outbox
+
+def embedding_model():
+    """Name of the model whose embeddings are stored (the cascade's come from its first tier)."""
+    return FIRST_TIER_MODEL or "cnn14"
+
+def get_vector_store():
+    """Embeddings of persisted events, keyed by Firestore doc id."""
+    global _vector_store
+    name = embedding_model()
+    dim = get_model(name).fc1.out_features
+    with _init_lock:
+        if _vector_store is None:
+            _vector_store = VectorStore(os.path.join(VECTOR_STORE_DIR, name), dim=dim)
+            set_active(VECTOR_STORE_DIR, name)  # the webapp's similar-sound search follows it
+    return _vector_store
+
+def get_duplicate_filter():
+    global _duplicate_filter
+    with _init_lock:
+        if _duplicate_filter is None:
+            _duplicate_filter = NearDuplicateFilter(window=DUPLICATE_WINDOW, threshold=DUPLICATE_SIMILARITY)
+    return _duplicate_filter
+
+def get_dispatcher():
+    global _dispatcher
+    with _init_lock:
+        if _dispatcher is None:
+            _dispatcher = AlertDispatcher(connection=TimedSMTPConnection())
+    return _dispatcher
+
+def open_capture():
+    return CallbackCapture(RATE, CHUNK, ring_seconds=RING_SECONDS,
+                           pre_roll_seconds=PRE_ROLL_SECONDS,
+                           post_roll_seconds=POST_ROLL_SECONDS,
+                           align=HOP_LENGTH).start()
 
 # =========================
 # AUDIO HELPERS
 # =========================
-def record_audio(duration, stream):
-    frames = []
-    num_chunks = int(RATE / CHUNK * duration)
-    for _ in range(num_chunks):
-        data = stream.read(CHUNK, exception_on_overflow=False)
-        frames.append(np.frombuffer(data, dtype=np.int16))
-    return np.concatenate(frames)
-
-def save_recording(audio_np, timestamp):
-    os.makedirs("./sound/recordings", exist_ok=True)
-    filename = f"./sound/recordings/rec_{timestamp}.wav"
-    with wave.open(filename, 'wb') as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(RATE)
-        wf.writeframes(audio_np.tobytes())
-    print(f"[SAVED WAV] {filename}")
-    return filename
-
-def save_labels(timestamp, top_labels, top_probs):
-    os.makedirs("./sound/recording_data", exist_ok=True)
-    filename = f"./sound/recording_data/rec_{timestamp}.txt"
-    with open(filename, 'w') as f:
-        for label, prob in zip(top_labels, top_probs):
-            f.write(f"{label}: {prob:.3f}\n")
-    print(f"[SAVED LABELS] {filename}")
-    return filename
-
+@PREPROCESS.time()
 def preprocess_waveform(waveform):
     waveform = torch.tensor(waveform.astype(np.float32)/32768.0)
     if len(waveform.shape) == 1:
         waveform = waveform.unsqueeze(0)
     mel = torchaudio.transforms.MelSpectrogram(
-        sample_rate=RATE, n_fft=1024, hop_length=320, n_mels=64
+        sample_rate=RATE, n_fft=N_FFT, hop_length=HOP_LENGTH, n_mels=N_MELS
     )(waveform)
     mel = mel.unsqueeze(1)
     return mel
 
 def classify_audio(waveform_np, top_k=5):
-    mel = preprocess_waveform(waveform_np).to(DEVICE)
-    with torch.no_grad():
-        output = cnn14(mel).squeeze(0)
+    """(top labels, top probs, fc1 embedding or None if EMBEDDINGS is off)."""
+    return classify_mel(preprocess_waveform(waveform_np), top_k)
+
+def classify_mel(mel, top_k=5):
+    mel = mel.to(DEVICE)
+    probs, embedding = split_output(get_classifier()(mel).squeeze(0))
+    top_labels, top_probs = top_k_labels(probs, top_k)
+    return top_labels, top_probs, None if embedding is None else embedding.numpy()
+
+def top_k_labels(output, top_k=5):
     # Get top K
-    top_probs, top_idx = torch.topk(output, top_k)
-    top_labels = [LABELS.get(idx.item(), f"Class {idx.item()}") for idx in top_idx]
+    top_probs, top_idx = torch.topk(split_output(output)[0], top_k)
+    labels = get_labels()
+    top_labels = [labels.get(idx.item(), f"Class {idx.item()}") for idx in top_idx]
     top_probs = top_probs.tolist()
     return top_labels, top_probs
 
 # =========================
-# AUDIO STREAM SETUP
+# PIPELINE STAGES
 # =========================
-p = pyaudio.PyAudio()
-stream = p.open(format=pyaudio.paInt16, channels=1, rate=RATE,
-                input=True, frames_per_buffer=CHUNK)
-
-last_trigger = 0
-print("🎧 Listening for loud sounds...\n")
+def infer_event(event, scheduler, ring=None):
+    ring = event.pop("ring", ring)  # multi-stream events carry their own ring
+    if ring is None:
+        event["audio"] = np.array(event["audio"])
+    else:
+        # copy out of the ring before it wraps, checked again after the copy
+        start = event["clip_start"]
+        event["audio"] = ring.copy(start, start + len(event["audio"]))
+        if event["audio"] is None:
+            print(f"⚠️ Clip for {event['timestamp']} was overwritten before inference, dropping.")
+            return None
+
+    print("Classifying...")
+    mel = event.get("mel")
+    if mel is None:
+        mel = preprocess_waveform(event["audio"])
+    return then(scheduler.submit(mel.to(DEVICE)), lambda probs: label_event(event, probs))
+
+def label_event(event, output):
+    probs, embedding = split_output(output)
+    top_labels, top_probs = top_k_labels(probs, top_k=5)
+
+    # Console output: top 3
+    print(f"➡ Top 3 predictions ({event['timestamp']}):")
+    for label, prob in zip(top_labels[:3], top_probs[:3]):
+        print(f"   {label}: {prob:.3f}")
+
+    event["labels"] = top_labels[:3]
+    event["probs"] = top_probs[:3]
+    event["scores"] = probs
+    event["embedding"] = None if embedding is None else embedding.numpy()
+    EVENTS.inc(stage="classified")
+    return event
+
+def persist_event(event, archive=None, outbox=None, vectors=None, duplicates=None):
+    stream = event.get("stream")
+    archive = archive or get_archive(stream)
+    outbox = outbox or get_outbox()
+    timestamp = event["timestamp"]
+    # events from named streams are namespaced in GCS and Firestore
+    event["doc_id"] = f"{stream}_{timestamp}" if stream else str(timestamp)
+    embedding = event.get("embedding")
+    duplicate_of = None
+    if embedding is not None:
+        if duplicates is None:
+            duplicates = get_duplicate_filter()
+        duplicate_of = duplicates.match(embedding, timestamp, event["doc_id"], key=stream)
+    meta = {"labels": event["labels"], "probs": event["probs"], "peak": event["peak"], "rms": event["rms"]}
+    if duplicate_of:
+        meta["duplicate_of"] = duplicate_of
+    with ARCHIVE.time():
+        event["archive_ref"] = archive.append(
+            event["audio"], RATE, timestamp, probs=event["scores"].cpu().numpy(),
+            embedding=embedding, meta=meta,
+        )
+    print(f"[ARCHIVED] {event['archive_ref']}")
+    if duplicate_of:
+        # kept in the local archive, but no upload, record or email
+        print(f"[DUPLICATE] {event['doc_id']} repeats {duplicate_of}, not uploaded")
+        EVENTS.inc(stage="duplicate")
+        return None
+
+    # Queued, not sent: the outbox uploads / commits in the background
+    blob_name = f"{stream}/rec_{timestamp}.wav" if stream else f"rec_{timestamp}.wav"
+    wav = wav_bytes(event["audio"], RATE)
+    event["wav_url"] = outbox.public_url(blob_name)
+
+    record_data = {
+        "timestamp": timestamp,
+        "labels": event["labels"],
+        "probs": event["probs"],
+        "wav_url": event["wav_url"],
+        "archive_ref": event["archive_ref"],
+    }
+    if stream:
+        record_data["stream"] = stream
+    with ENQUEUE.time():
+        upload_id = outbox.put_blob(blob_name, wav, "audio/wav")
+        outbox.put_document(COLLECTION, event["doc_id"], record_data, depends_on=upload_id)
+    if embedding is not None:
+        if vectors is None:
+            vectors = get_vector_store()
+        vectors.add(event["doc_id"], embedding, timestamp)
+    EVENTS.inc(stage="persisted")
+    return event
+
+def notify_event(event, dispatcher=None):
+    # queued: the dispatcher coalesces bursts into digest emails on its own thread
+    (dispatcher or get_dispatcher()).submit(event["doc_id"], event["labels"], event["probs"], event["wav_url"])
+    EVENTS.inc(stage="notified")
+    return event
+
+def print_scores(t, probs):
+    top_labels, top_probs = top_k_labels(probs, top_k=3)
+    summary = ", ".join(f"{label} {prob:.2f}" for label, prob in zip(top_labels, top_probs))
+    print(f"[TAGS {t:8.2f}s] {summary}")
 
 # =========================
-# MAIN LOOP
+# DETECTION
 # =========================
-try:
-    while True:
-        data = stream.read(CHUNK, exception_on_overflow=False)
-        samples = np.frombuffer(data, dtype=np.int16)
-        rms = np.sqrt(np.mean(samples.astype(np.float32) ** 2))
-        peak = np.max(np.abs(samples))
-        now = time.time()
-
-        if (peak > PEAK_THRESHOLD or rms > RMS_THRESHOLD) and (now - last_trigger) > MIN_GAP:
-            last_trigger = now
-            timestamp = int(time.time())
-            print(f"\n🔊 Loud sound detected! Peak={peak}, RMS={int(rms)}")
-            print("Recording...")
-            audio_np = record_audio(RECORD_SECONDS, stream)
-            wav_path = save_recording(audio_np, timestamp)
-
-            print("Classifying...")
-            top_labels, top_probs = classify_audio(audio_np, top_k=5)
-
-            # Console output: top 3
-            print("➡ Top 3 predictions:")
-            for label, prob in zip(top_labels[:3], top_probs[:3]):
-                print(f"   {label}: {prob:.3f}")
-
-            # Save locally (optional)
-            save_labels(timestamp, top_labels[:3], top_probs[:3])
-
-            # --- NEW: Use WAV URL instead of uploading ---
-            # Example: If you have a server hosting WAVs:
-            # wav_url = f"https://your-server.com/rec_{timestamp}.wav"
-            # wav_url = f"https://storage.googleapis.com/iot-audio-recordings/rec_{timestamp}.wav"
-            blob_name = f"rec_{timestamp}.wav"
-            wav_url = upload_wav_to_gcs(wav_path, blob_name)
-
-
-
-            record_data = {
-                "timestamp": timestamp,
-                "labels": top_labels[:3],
-                "probs": top_probs[:3],
-                "wav_url": wav_url
+class EventDetector:
+    """
+    Per-chunk detection shared by the live loop and replay: streams the
+    chunk into the mel frontend, runs the pre-filter cascade, and returns
+    a complete event (audio view + clip mel) once a triggered clip's
+    post-roll has been read.
+    """
+
+    def __init__(self, capture):
+        self.capture = capture
+        self.frontend = StreamingMelFrontend(rate=RATE, n_fft=N_FFT, hop=HOP_LENGTH, n_mels=N_MELS,
+                                             chunk=CHUNK, history_seconds=RING_SECONDS)
+        self.cascade = PrefilterCascade(PEAK_THRESHOLD, RMS_THRESHOLD, min_gap=MIN_GAP, n_mels=N_MELS,
+                                        floor_alpha=NOISE_FLOOR_ALPHA, on_margin_db=ON_MARGIN_DB,
+                                        off_margin_db=OFF_MARGIN_DB, flux_ratio=FLUX_RATIO,
+                                        novelty_similarity=NOVELTY_SIMILARITY,
+                                        novelty_window=NOVELTY_WINDOW)
+        self.pending = None  # event waiting for its post-roll
+
+    def feed(self, chunk_start, samples, now, verbose=True):
+        with DETECT.time():
+            return self._feed(chunk_start, samples, now, verbose)
+
+    def _feed(self, chunk_start, samples, now, verbose):
+        first_frame, stop_frame = self.frontend.push(samples, chunk_start)
+        escalate, features = self.cascade.update(samples, self.frontend.frames(first_frame, stop_frame), now)
+
+        # Hand the clip over once its post-roll has been read;
+        # its mel frames are already in the frontend history by then
+        ready = None
+        pending = self.pending
+        if pending is not None and chunk_start + len(samples) >= pending["clip_stop"]:
+            pending["audio"] = self.capture.ring.view(pending["clip_start"], pending["clip_stop"])
+            with PREPROCESS.time():
+                pending["mel"] = self.frontend.clip_mel(pending["clip_start"], pending["audio"])
+            ready, self.pending = pending, None
+            EVENTS.inc(stage="detected")
+
+        if self.pending is None and escalate:
+            if verbose:
+                print(f"\n🔊 Loud sound detected! Peak={features['peak']}, RMS={int(features['rms'])}, "
+                      f"floor={features['noise_floor_db']:.1f} dB")
+            clip_start, clip_stop = self.capture.clip_bounds(chunk_start)
+            self.pending = {
+                "timestamp": int(now),
+                "peak": features["peak"],
+                "rms": features["rms"],
+                "clip_start": clip_start,
+                "clip_stop": clip_stop,
             }
+        return ready
 
-            save_to_firebase(record_data)
-            send_alert_email(timestamp, top_labels[:3], top_probs[:3], wav_url)
-
-
-
-except KeyboardInterrupt:
-    print("\nStopping...")
-
-finally:
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
+# =========================
+# MAIN LOOP
+# =========================
+def main():
+    print("🎧 Loud sound detector with CNN14 classification\n")
+    get_labels()
+    infer = get_classifier()
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    summary = metrics.LogSummary(STATS_INTERVAL).start()
+    # Cloud clients initialise on import; do it now so bad credentials fail fast
+    outbox = get_outbox().start()
+    dispatcher = get_dispatcher().start()
+
+    capture = open_capture()
+    detector = EventDetector(capture)
+    cascade = detector.cascade
+    tagger = None
+    if CONTINUOUS_TAGGING:
+        tagger = ContinuousTagger(get_model(), detector.frontend, window_frames=TAGGING_WINDOW_FRAMES,
+                                  hop_frames=TAGGING_HOP_FRAMES, context_frames=TAGGING_CONTEXT_FRAMES,
+                                  on_scores=print_scores).start()
+    metrics.gauge("sound_capture_lag_seconds", "Audio captured but not yet read by the detector",
+                  fn=lambda: (capture.ring.write_pos - capture.ring.read_pos) / RATE)
+    metrics.gauge("sound_capture_overrun_samples", "Samples lost to ring overruns",
+                  fn=lambda: capture.ring.overrun_samples)
+    scheduler = InferenceScheduler(INFER.time()(infer), max_batch=MAX_BATCH, max_wait=MAX_BATCH_WAIT).start()
+    pipeline = DetectionPipeline(functools.partial(infer_event, scheduler=scheduler, ring=capture.ring),
+                                 persist_event, notify_event,
+                                 queue_size=QUEUE_SIZE, policy=BACKPRESSURE_POLICY,
+                                 io_workers=IO_WORKERS).start()
+
+    last_stats = time.time()
+    print("🎧 Listening for loud sounds...\n")
+
+    try:
+        while True:
+            chunk = capture.read_chunk(timeout=1.0)
+            if chunk is None:
+                continue
+            chunk_start, samples = chunk
+            CHUNKS.inc()
+            CAPTURE.observe((capture.ring.write_pos - chunk_start - len(samples)) / RATE)
+            now = time.time()
+            event = detector.feed(chunk_start, samples, now)
+            if event is not None:
+                pipeline.submit(event)
+
+            if now - last_stats > STATS_INTERVAL:
+                last_stats = now
+                print(f"[CAPTURE] {capture.stats()}")
+                print(f"[PREFILTER] {cascade.stats()}")
+                print(f"[PIPELINE] {pipeline.stats()}")
+                print(f"[LATENCY] {pipeline.latency_ms()}")
+                print(f"[BATCHING] {scheduler.stats()}")
+                print(f"[OUTBOX] {outbox.stats()}")
+                print(f"[ALERTS] {dispatcher.stats()}")
+                print(f"[DUPLICATES] {get_duplicate_filter().stats()}")
+                if tagger is not None:
+                    print(f"[TAGGING] {tagger.stats()}")
+                if isinstance(infer, ModelCascade):
+                    print(f"[CASCADE] {infer.stats()}")
+
+    except KeyboardInterrupt:
+        print("\nStopping...")
+
+    finally:
+        summary.stop()
+        if tagger is not None:
+            tagger.stop()
+        capture.stop()
+        pipeline.stop()
+        scheduler.stop()
+        for archive in _archives.values():
+            archive.close()
+        if _vector_store is not None:
+            _vector_store.close()
+        dispatcher.stop()
+        outbox.stop()
+        print(f"[CAPTURE] {capture.stats()}")
+        print(f"[PREFILTER] {cascade.stats()}")
+        print(f"[PIPELINE] {pipeline.stats()}")
+        print(f"[LATENCY] {pipeline.latency_ms()}")
+        print(f"[BATCHING] {scheduler.stats()}")
+        print(f"[OUTBOX] {outbox.stats()}")
+        print(f"[ALERTS] {dispatcher.stats()}")
+        if isinstance(infer, ModelCascade):
+            print(f"[CASCADE] {infer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import os
+import statistics
+import subprocess
+import sys
+
+
+# run with python3 -m sound.startup_bench [runs] from project root directory
+
+# Each step runs in a fresh interpreter so import and load costs are not cached
+STEPS = {
+    "import sound.sound_detect": "import sound.sound_detect",
+    "labels": "import sound.sound_detect as sd; sd.get_labels()",
+    "model (torch.load)": "import sound.sound_detect as sd; sd.load_cnn14(sd.MODEL_PATH)",
+    "model (mmap)": "import sound.sound_detect as sd; sd.load_cnn14(sd.MMAP_MODEL_PATH, mmap=True)",
+    "first classification": (
+        "import numpy as np, sound.sound_detect as sd; "
+        "sd.classify_audio(np.zeros(int(sd.RATE * sd.RECORD_SECONDS), dtype=np.int16))"
+    ),
+}
+
+TIMER = (
+    "import time; _t = time.perf_counter(); {stmt}; "
+    "print('__elapsed__', time.perf_counter() - _t)"
+)
+
+
+def time_step(stmt, runs=3):
+    """Median wall time (s) of `stmt` in a fresh interpreter, or None if it fails."""
+    times = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", TIMER.format(stmt=stmt)],
+                              capture_output=True, text=True)
+        lines = [l for l in proc.stdout.splitlines() if l.startswith("__elapsed__")]
+        if proc.returncode != 0 or not lines:
+            print(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed")
+            return None
+        times.append(float(lines[-1].split()[1]))
+    return statistics.median(times)
+
+
+def main(runs=3):
+    from . import sound_detect as sd
+
+    baseline = None
+    for name, stmt in STEPS.items():
+        if "mmap" in name and not os.path.exists(sd.MMAP_MODEL_PATH):
+            print(f"{name:>26}: skipped, run python3 -m sound.models convert first")
+            continue
+        elapsed = time_step(stmt, runs)
+        if elapsed is None:
+            print(f"{name:>26}: failed")
+            continue
+        if baseline is None:
+            baseline = elapsed
+            print(f"{name:>26}: {elapsed * 1000:8.1f} ms")
+        else:
+            print(f"{name:>26}: {elapsed * 1000:8.1f} ms  (+{(elapsed - baseline) * 1000:.1f} ms over import)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+
+# Run from the project directory (as the scripts are): sound/ finds its
+# labels and checkpoints through ./sound/... paths.
+#
+#   python3 -m pytest                                    tests + benchmarks
+#   python3 -m pytest --benchmark-autosave               record a baseline
+#   python3 -m pytest --benchmark-compare --benchmark-compare-fail=median:25%
+#                                                        fail on a >25% slowdown
+
+@pytest.fixture(scope="session", autouse=True)
+def project_dir():
+    previous = os.getcwd()
+    os.chdir(PROJECT_DIR)
+    yield PROJECT_DIR
+    os.chdir(previous)
+
+@pytest.fixture(scope="session")
+def models():
+    """CNN14 from its checkpoint when there is one, else untrained (timings only)."""
+    import sound.sound_detect as sd
+    from sound.replay import use_random_weights
+
+    if not os.path.exists(sd.MODEL_PATH) and not os.path.exists(sd.MMAP_MODEL_PATH):
+        use_random_weights()
+    return sd
+
+@pytest.fixture(scope="session")
+def clip():
+    """The RECORD_SECONDS clip replay's micro-benchmarks use."""
+    import sound.sound_detect as sd
+    from sound.replay import synthetic_scene
+
+    audio = synthetic_scene(sd.RECORD_SECONDS + 1, event_every=2.0)[0]
+    return audio[:int(sd.RATE * sd.RECORD_SECONDS)]
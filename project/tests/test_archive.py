@@ -0,0 +1,91 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from sound.archive import ArchiveWriter, Segment, list_segments
+
+TIMESTAMP = time.mktime((2026, 10, 17, 12, 0, 0, 0, 0, -1))
+
+
+def clip(i):
+    return np.full(1600, i, dtype=np.int16)
+
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path)
+
+
+def write(root, n, start=0):
+    writer = ArchiveWriter(root)
+    refs = [writer.append(clip(i), 16000, TIMESTAMP + i, probs=np.full(4, i / 10)) for i in range(start, start + n)]
+    writer.close()
+    return refs
+
+def test_reopened_segment_appends_after_its_events(root):
+    write(root, 3)
+    refs = write(root, 2, start=3)
+    name = list_segments(root)[0]
+    assert refs == [f"{name}#3", f"{name}#4"]
+    segment = Segment(root, name)
+    assert [int(segment.audio(i)[0]) for i in range(len(segment))] == [0, 1, 2, 3, 4]
+    segment.close_data()
+
+def test_unindexed_tail_is_truncated(root):
+    write(root, 2)
+    name = list_segments(root)[0]
+    dat = os.path.join(root, name + ".dat")
+    size = os.path.getsize(dat)
+    with open(dat, "ab") as f:  # a crash after the data write, before its index row
+        f.write(b"\1" * 1000)
+    write(root, 1, start=2)
+    segment = Segment(root, name)
+    assert len(segment) == 3 and int(segment.audio(2)[0]) == 2
+    assert int(segment.index[2]["offset"]) == size
+    segment.close_data()
+
+def test_index_rows_past_the_data_are_dropped(root):
+    write(root, 3)
+    name = list_segments(root)[0]
+    segment = Segment(root, name)
+    keep = int(segment.index[2]["offset"])
+    segment.close_data()
+    os.truncate(os.path.join(root, name + ".dat"), keep + 100)  # the last record only partly on disk
+    write(root, 1, start=3)
+    segment = Segment(root, name)
+    assert [int(segment.audio(i)[0]) for i in range(len(segment))] == [0, 1, 3]
+    segment.close_data()
+
+@pytest.mark.parametrize("damage", ["delete", "truncate", "garble"])
+def test_data_without_a_usable_index_is_moved_aside(root, damage):
+    write(root, 3)
+    name = list_segments(root)[0]
+    dat, idx = (os.path.join(root, name + ext) for ext in (".dat", ".idx"))
+    size = os.path.getsize(dat)
+    if damage == "delete":
+        os.remove(idx)
+    elif damage == "truncate":
+        os.truncate(idx, 5)
+    else:
+        with open(idx, "r+b") as f:
+            f.write(b"garbage!")
+    write(root, 1, start=3)
+    aside = sorted(f for f in os.listdir(root) if ".corrupt-" in f)
+    assert [f.split(".corrupt-")[0] for f in aside] == ([name + ".dat"] if damage == "delete"
+                                                        else [name + ".dat", name + ".idx"])
+    assert os.path.getsize(os.path.join(root, aside[0])) == size
+    segment = Segment(root, name)
+    assert len(segment) == 1 and int(segment.audio(0)[0]) == 3
+    segment.close_data()
+
+def test_close_data_with_views_still_alive(root):
+    write(root, 1)
+    segment = Segment(root, list_segments(root)[0])
+    audio, probs = segment.audio(0), segment.probs(0)
+    segment.close_data()
+    assert int(audio[0]) == 0 and np.allclose(probs, 0.0)
+    segment = Segment(root, list_segments(root)[0])
+    segment.close_data()
+    assert segment._map is None
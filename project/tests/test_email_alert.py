@@ -0,0 +1,77 @@
+import email
+import time
+from email.header import decode_header, make_header
+
+import pytest
+
+from common.fakes import LocalSMTPServer
+from sound.email_alert import AlertDispatcher, SMTPConnection
+
+WINDOW = 0.3
+
+
+def alert(i, label="Dog"):
+    return 1700000000 + i, [label, "Bark", "Animal"], [0.9, 0.8, 0.5], f"https://x/rec_{i}.wav"
+
+def text(message):
+    """Subject and body of a message the SMTP stand-in received."""
+    parsed = email.message_from_string(message[2])
+    return str(make_header(decode_header(parsed["Subject"]))) + "\n" + parsed.get_payload(decode=True).decode()
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def smtp():
+    with LocalSMTPServer() as server:
+        yield server
+
+@pytest.fixture
+def dispatcher(smtp):
+    connection = SMTPConnection(smtp.host, smtp.port, starttls=False, credentials=None)
+    dispatcher = AlertDispatcher(connection, sender="monitor@localhost", recipient="alerts@localhost",
+                                 window=WINDOW, min_interval=WINDOW).start()
+    yield dispatcher
+    dispatcher.stop()
+
+
+def test_burst_within_the_window_is_one_digest_over_one_connection(smtp, dispatcher):
+    for i in range(12):
+        dispatcher.submit(*alert(i))
+    assert wait_for(lambda: smtp.messages)
+    time.sleep(WINDOW)  # nothing else follows
+    assert len(smtp.messages) == 1 and smtp.connections == 1
+    assert "12 Loud Sound Alerts" in text(smtp.messages[0])
+    assert dispatcher.stats()["coalesced"] == 11
+
+def test_reconnects_after_the_server_drops_the_session(smtp, dispatcher):
+    dispatcher.submit(*alert(0))
+    assert wait_for(lambda: len(smtp.messages) == 1)
+    smtp.drop_connections()  # the next send hits SMTPServerDisconnected on the pooled session
+    dispatcher.submit(*alert(1, "Siren"))
+    assert wait_for(lambda: len(smtp.messages) == 2)
+    assert smtp.connections == 2 and dispatcher.connection.connects == 2
+    assert dispatcher.failures == 0 and "Siren" in text(smtp.messages[1])
+
+def test_submit_does_not_wait_for_an_idle_close():
+    class SlowQuit:
+        connects = 0
+
+        def close(self):
+            time.sleep(1.0)  # a server slow to answer QUIT
+
+    dispatcher = AlertDispatcher(SlowQuit(), sender="monitor@localhost", window=10, idle_timeout=0.05).start()
+    time.sleep(0.2)  # idle: the dispatcher is closing the session
+    start = time.monotonic()
+    dispatcher.submit(*alert(0))
+    assert time.monotonic() - start < 0.1
+    dispatcher._running = False  # skip sending through the stub
+    with dispatcher._cond:
+        dispatcher._pending.clear()
+        dispatcher._cond.notify_all()
@@ -0,0 +1,13 @@
+import pytest
+
+from sound.mel_stream import check_parity
+
+
+# StreamingMelFrontend's clip spectrogram against the batch log-mel
+# (preprocess_waveform) of the same samples, for clips starting anywhere
+# relative to the chunk and hop grid.
+
+@pytest.mark.parametrize("chunk", [2048, 1000])
+@pytest.mark.parametrize("clip_start", [0, 319, 6145, 12345, 16000, 40017])
+def test_streaming_mel_matches_batch(clip_start, chunk):
+    assert check_parity(chunk=chunk, clip_start=clip_start) < 1e-5
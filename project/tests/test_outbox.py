@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from common.fakes import FakeBucket, FakeFirestore
+from common.outbox import QUEUED, FirestoreSink, GCSSink, Outbox
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "outbox.db")
+
+
+def test_poison_row_is_dead_lettered_while_its_batch_mates_commit(path):
+    db = FakeFirestore()
+    db.rejected_docs.add("bad")
+    outbox = Outbox(path, FirestoreSink(db), base_delay=0, max_rejections=3)
+    outbox.put_document("recordings", "bad", {"timestamp": -1})
+    for i in range(3):  # one pass per rejection, each with good documents next to the bad one
+        for j in range(4):
+            outbox.put_document("recordings", f"{i}_{j}", {"timestamp": i})
+        outbox.send_once()
+        assert set(db.data["recordings"]) == {f"{n}_{j}" for n in range(i + 1) for j in range(4)}
+    dead = outbox.dead_letters()
+    assert [(row[1], row[3]) for row in dead] == [("doc", "bad")]
+    assert "ValueError" in dead[0][5]
+    assert outbox.depth()["total"] == 0 and outbox.stats()["dead_lettered"] == 1
+    outbox.close()
+
+def test_outage_never_dead_letters(path):
+    db = FakeFirestore()
+    outbox = Outbox(path, FirestoreSink(db), base_delay=0, max_rejections=2)
+    for i in range(4):
+        outbox.put_document("recordings", i, {"timestamp": i})
+    db.offline = True
+    for _ in range(5):
+        outbox.send_once()
+    db.offline = False
+    outbox.send_once()
+    assert len(db.data["recordings"]) == 4 and not outbox.dead_letters()
+    outbox.close()
+
+def test_document_waits_for_its_upload(path):
+    db, bucket = FakeFirestore(), FakeBucket()
+    bucket.offline = True
+    outbox = Outbox(path, FirestoreSink(db), GCSSink(bucket), base_delay=0.01, max_delay=0.05,
+                    poll_interval=0.01).start()
+    blob_id = outbox.put_blob("rec_1.wav", b"RIFF", "audio/wav")
+    outbox.put_document("recordings", "1", {"wav_url": outbox.public_url("rec_1.wav")}, depends_on=blob_id)
+    outbox.put_document("recordings", "2", {"timestamp": 2})  # no upload to wait for
+    assert wait_for(lambda: "2" in db.data.get("recordings", {}))
+    time.sleep(0.1)
+    assert "1" not in db.data["recordings"]
+    bucket.offline = False
+    assert outbox.flush(timeout=5)
+    assert "rec_1.wav" in bucket.blobs and "1" in db.data["recordings"]
+    outbox.stop()
+    outbox.close()
+
+def test_queued_work_survives_a_restart(path):
+    outbox = Outbox(path)  # no sinks: nothing is sent before the "crash"
+    blob_id = outbox.put_blob("rec_1.wav", b"RIFF", "audio/wav")
+    outbox.put_document("recordings", "1", {"timestamp": 1}, depends_on=blob_id)
+    outbox.close()
+
+    db, bucket = FakeFirestore(), FakeBucket()
+    outbox = Outbox(path, FirestoreSink(db), GCSSink(bucket), poll_interval=0.01).start()
+    assert outbox.depth()["total"] == 2
+    assert outbox.flush(timeout=5)
+    assert list(bucket.blobs) == ["rec_1.wav"] and db.data["recordings"] == {"1": {"timestamp": 1}}
+    outbox.stop()
+    outbox.close()
+
+def test_queue_gauges_are_per_outbox(tmp_path):
+    first = Outbox(str(tmp_path / "camera.db"))
+    second = Outbox(str(tmp_path / "sound.db"))
+    first.put_document("snack_classifications", "a", {})
+    for i in range(3):
+        second.put_document("recordings", i, {})
+    lines = "\n".join(QUEUED.render())
+    assert f'outbox_queued{{outbox="{first.path}"}} 1.0' in lines
+    assert f'outbox_queued{{outbox="{second.path}"}} 3.0' in lines
+    first.close()
+    second.close()
+    assert first.path not in "\n".join(QUEUED.render())
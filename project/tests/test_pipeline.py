@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+from sound.multistream import stream_of
+from sound.pipeline import COALESCE, DROP_OLDEST, DetectionPipeline, StageQueue
+
+
+def event(stream, n, peak=1000):
+    return {"stream": stream, "doc_id": f"{stream}_{n}", "peak": peak}
+
+def drain(queue):
+    items = []
+    while len(queue):
+        items.append(queue.get())
+    return items
+
+
+@pytest.mark.parametrize("policy", [DROP_OLDEST, COALESCE])
+def test_burst_on_one_stream_keeps_the_other_streams_event(policy):
+    queue = StageQueue(4, policy, key_fn=stream_of)
+    queue.put(event("B", 0, peak=10))  # quiet stream, queued first
+    for n in range(50):
+        queue.put(event("A", n, peak=30000))
+    items = drain(queue)
+    assert [e["doc_id"] for e in items if e["stream"] == "B"] == ["B_0"]
+    assert sum(e["stream"] == "A" for e in items) == 4
+
+def test_drop_oldest_stays_within_the_stream():
+    queue = StageQueue(2, DROP_OLDEST, key_fn=stream_of)
+    for n in range(3):
+        queue.put(event("A", n))
+    queue.put(event("B", 0))
+    assert [e["doc_id"] for e in drain(queue)] == ["A_1", "A_2", "B_0"]
+    assert queue.dropped == 1
+
+def test_coalesce_merges_only_same_stream_events():
+    queue = StageQueue(1, COALESCE, key_fn=stream_of)
+    queue.put(event("A", 0, peak=100))
+    queue.put(event("B", 0, peak=5))
+    queue.put(event("A", 1, peak=200))  # louder: replaces A_0, not B_0
+    items = drain(queue)
+    assert [e["doc_id"] for e in items] == ["A_1", "B_0"]
+    assert items[0]["coalesced"] == 1 and "coalesced" not in items[1]
+
+def test_without_key_fn_the_bound_is_shared():
+    queue = StageQueue(2, DROP_OLDEST)
+    for e in (event("B", 0), event("A", 0), event("A", 1)):
+        queue.put(e)
+    assert [e["doc_id"] for e in drain(queue)] == ["A_0", "A_1"]
+
+
+def test_pipeline_delivers_quiet_stream_event_during_a_burst():
+    release = threading.Event()
+    notified = []
+
+    def infer(e):
+        release.wait(5)  # inference backed up while the burst arrives
+        return e
+
+    pipeline = DetectionPipeline(infer, lambda e: e, notified.append, queue_size=2,
+                                 policy=COALESCE, key_fn=stream_of).start()
+    pipeline.submit(event("A", -1))  # occupies the infer worker
+    pipeline.submit(event("B", 0, peak=10))
+    for n in range(20):
+        pipeline.submit(event("A", n, peak=30000))
+    release.set()
+    pipeline.stop()
+    assert "B_0" in [e["doc_id"] for e in notified]
@@ -0,0 +1,44 @@
+import threading
+
+import numpy as np
+
+from sound.ring_capture import AudioRingBuffer
+
+
+def test_copy_of_a_wrapped_window_is_none():
+    ring = AudioRingBuffer(100, dtype=np.int32)
+    for pos in range(0, 150, 10):
+        ring.write(np.arange(pos, pos + 10, dtype=np.int32))
+    assert ring.copy(40, 90) is None
+    assert ring.copy(55, 105) is None  # within one write of the tail: may be under a write
+    assert np.array_equal(ring.copy(60, 110), np.arange(60, 110))
+
+def test_copy_never_returns_samples_overwritten_during_the_copy():
+    """Samples are their absolute positions; the writer laps the ring while clips near its tail are copied."""
+    capacity, chunk, clip = 4096, 512, 2048
+    ring = AudioRingBuffer(capacity, dtype=np.int32)
+    for pos in range(0, capacity, chunk):
+        ring.write(np.arange(pos, pos + chunk, dtype=np.int32))
+    stop = threading.Event()
+
+    def writer():
+        pos = capacity
+        while not stop.is_set():
+            ring.write(np.arange(pos, pos + chunk, dtype=np.int32))
+            pos += chunk
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    rng = np.random.default_rng(0)
+    copies = 0
+    try:
+        for _ in range(5000):
+            start = ring.oldest() + int(rng.integers(0, 2 * chunk))  # at or near the tail being overwritten
+            out = ring.copy(start, start + clip)
+            if out is not None:
+                copies += 1
+                assert np.array_equal(out, np.arange(start, start + clip))
+    finally:
+        stop.set()
+        thread.join()
+    assert copies and ring.write_pos > 2 * capacity
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import sound.sound_detect as sd
+from sound.replay import detector_check, synthetic_scene
+from sound.ring_capture import ReplayCapture
+
+
+def escalations(audio):
+    """Events the detector escalates on int16 `audio` (replayed chunk by chunk)."""
+    capture = ReplayCapture(audio, sd.RATE, sd.CHUNK, pre_roll_seconds=sd.PRE_ROLL_SECONDS,
+                            post_roll_seconds=sd.POST_ROLL_SECONDS).start()
+    detector = sd.EventDetector(capture)
+    while (chunk := capture.read_chunk()) is not None:
+        detector.feed(chunk[0], chunk[1], 1_700_000_000.0 + chunk[0] / sd.RATE, verbose=False)
+    return detector.cascade.escalated
+
+def room(seconds, seed=0):
+    return 300 * np.random.default_rng(seed).standard_normal(int(seconds * sd.RATE))
+
+def tone(seconds, amplitude, freq=1000):
+    t = np.arange(int(seconds * sd.RATE)) / sd.RATE
+    return amplitude * np.sin(2 * np.pi * freq * t)
+
+def int16(audio):
+    return np.clip(audio, -32768, 32767).astype(np.int16)
+
+
+def test_preprocess_waveform(benchmark, clip):
+    mel = benchmark(sd.preprocess_waveform, clip)
+    assert mel.shape == (1, 1, sd.N_MELS, len(clip) // sd.HOP_LENGTH + 1)
+
+def test_classify_audio(benchmark, models, clip):
+    labels, probs, _ = benchmark(sd.classify_audio, clip)
+    assert len(labels) == len(probs) == 5
+    assert all(0.0 <= p <= 1.0 for p in probs)
+    assert probs == sorted(probs, reverse=True)
+
+def test_detector_replay(benchmark):
+    """Per-chunk cost and trigger counts on replay's fixed synthetic scene."""
+    result = benchmark.pedantic(detector_check, rounds=3)
+    assert (result["triggers"], result["hits"]) == (2, 2)  # a threshold change shows up here
+
+
+# =========================
+# DETECTOR THRESHOLDS
+# =========================
+def test_room_noise_is_not_an_event():
+    assert escalations(int16(room(10))) == 0
+
+def test_loud_onset_is_an_event():
+    audio = room(6)
+    start = 3 * sd.RATE
+    audio[start:start + sd.RATE // 2] += tone(0.5, 20000)  # RMS ~14000 > RMS_THRESHOLD
+    assert escalations(int16(audio)) == 1
+
+def test_onset_below_static_thresholds_is_ignored():
+    audio = room(6)
+    start = 3 * sd.RATE
+    amplitude = 0.8 * min(sd.PEAK_THRESHOLD, sd.RMS_THRESHOLD * np.sqrt(2))
+    audio[start:start + sd.RATE // 2] += tone(0.5, amplitude)
+    assert escalations(int16(audio)) == 0
+
+def test_constant_loud_hum_is_absorbed_by_the_noise_floor():
+    assert escalations(int16(room(10) + tone(10, 20000, freq=120))) == 0
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_synthetic_scene_has_no_false_triggers(seed):
+    audio, starts = synthetic_scene(30, seed=seed)
+    assert 1 <= escalations(audio) <= len(starts)
@@ -0,0 +1,61 @@
+import pytest
+
+from camera.trigger import ThingSpeakPoller, TriggerQueue
+from common.fakes import LocalThingSpeak
+
+
+@pytest.fixture
+def thingspeak():
+    with LocalThingSpeak() as fake:
+        yield fake
+
+def poller_for(thingspeak, queue, **kwargs):
+    poller = ThingSpeakPoller(queue, "1", base_url=thingspeak.base_url, **kwargs)
+    poller.poll_once()  # startup: learns the channel position
+    return poller
+
+
+def test_latched_press_triggers_once(thingspeak):
+    queue = TriggerQueue()
+    poller = poller_for(thingspeak, queue, dedup_window=0)
+    thingspeak.write(field2=1)
+    assert poller.poll_once()
+    assert queue.get(timeout=0)["source"] == "thingspeak"
+    for _ in range(3):
+        thingspeak.write(field2=1)  # the ESP32 re-logs the latched button on every update
+        assert not poller.poll_once()
+    assert poller.triggers == 1
+
+def test_press_between_polls_is_not_lost(thingspeak):
+    queue = TriggerQueue()
+    poller = poller_for(thingspeak, queue, dedup_window=0)
+    thingspeak.write(field2=1)
+    thingspeak.write(field2=0)  # released before the next poll: last.json would read 0
+    thingspeak.write(field2=0)
+    assert poller.poll_once()
+    assert poller.last_entry_id == 3
+
+def test_entries_before_startup_are_not_presses(thingspeak):
+    thingspeak.write(field2=0)
+    thingspeak.write(field2=1)
+    poller = poller_for(thingspeak, TriggerQueue(), dedup_window=0)
+    thingspeak.write(field2=1)
+    assert not poller.poll_once()
+
+def test_press_after_a_push_is_deduplicated(thingspeak):
+    queue = TriggerQueue()
+    poller = poller_for(thingspeak, queue, dedup_window=60)
+    queue.put("esp32")
+    thingspeak.write(field2=1)  # the same press, logged by the ESP32
+    assert not poller.poll_once()
+    assert poller.deduplicated == 1 and poller.triggers == 0
+
+def test_poller_repeats_are_deduplicated(thingspeak):
+    queue = TriggerQueue()
+    poller = poller_for(thingspeak, queue, dedup_window=60)
+    thingspeak.write(field2=1)
+    assert poller.poll_once()
+    thingspeak.write(field2=0)
+    thingspeak.write(field2=1)  # a bounce within the window of the poller's own trigger
+    assert not poller.poll_once()
+    assert poller.deduplicated == 1 and poller.triggers == 1
@@ -1,7 +1,9 @@
 # webapp/app.py
 import os
+import sys
+import threading
 import time
-from flask import Flask, jsonify, render_template, send_from_directory
+from flask import Flask, Response, g, jsonify, render_template, request, send_from_directory
 import firebase_admin
 from firebase_admin import credentials, firestore
 from google.cloud import storage
@@ -12,45 +14,164 @@ FIREBASE_CRED_PATH = os.path.join(os.path.dirname(__file__), "..", "embedsystem-
 GCS_SIGNED_URL_ENABLED = True  # set False if you already have public wav_url in your documents
 SIGNED_URL_EXPIRATION_SECONDS = 3600  # 1 hour
 GCS_BUCKET_NAME = ""  # only needed for signed URL path method
+# embeddings written by the sound monitor (sound/sound_detect.py VECTOR_STORE_DIR); the
+# model subdirectory it writes is read from there
+VECTOR_STORE_DIR = os.path.join(os.path.dirname(__file__), "..", "sound", "vectors")
+LIVE_VIEW_SIZE = 500  # newest docs per collection served from memory (0 = query Firestore every request)
 # END CONFIG
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import metrics
+from common.live_view import LiveView
+from common.paging import CursorNotFound, fetch_page
+from common.vector_store import VectorStore, active_dir
+
+REQUEST_SECONDS = metrics.histogram("webapp_request_seconds", "Request handling time",
+                                    ["route", "method", "status"])
+PAGES = metrics.counter("webapp_pages_total", "API pages by where they were read from",
+                        ["collection", "source"])
+
 # Flask app
 app = Flask(__name__, static_folder="static", template_folder="templates")
 
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _record_timing(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        # the route pattern, not the raw path, so /static/<path:fn> is one series
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - start, route=route,
+                                method=request.method, status=response.status_code)
+    return response
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 import requests
 
+MAX_IN_LABELS = 10  # Firestore caps "in" / "array_contains_any" at 10 values
+PAGE_PARAMS = ("limit", "start_after", "since_id", "since", "label", "exclude_label")
+
+def page_args():
+    """
+    Paging and filter query parameters of /api/images and /api/recordings.
+    Without any of them the routes answer the newest page as a bare JSON
+    array, as they always did (the ESP32 firmware reads doc[0]["id"]):
+      ?limit=        page size (default 50, max 500)
+      ?start_after=  id of the oldest item the client has -> older items
+      ?since_id=     id of the newest item the client has -> only newer items
+      ?since=        unix timestamp -> only items after it
+      ?label=a,b     only these labels (server-side)
+      ?exclude_label=none   skip these labels (case-insensitive)
+    """
+    def names(key):
+        return [v.strip() for v in request.args.get(key, "").split(",") if v.strip()]
+
+    since = request.args.get("since")
+    return {
+        "limit": request.args.get("limit", type=int),
+        "start_after": request.args.get("start_after") or None,
+        "since_id": request.args.get("since_id") or None,
+        "since": float(since) if since else None,  # ValueError -> 400
+        "labels": names("label")[:MAX_IN_LABELS],
+        "exclude": {v.lower() for v in names("exclude_label")},
+        "paged": any(key in request.args for key in PAGE_PARAMS),
+    }
+
+_live_views = {}
+_live_views_lock = threading.Lock()
+
+def get_live_view(collection):
+    """
+    The in-memory view of `collection`, started on first use and restarted
+    if its listener has stopped (None while LIVE_VIEW_SIZE is 0).
+    """
+    if not LIVE_VIEW_SIZE:
+        return None
+    with _live_views_lock:
+        view = _live_views.get(collection)
+        if view is None or not view.listening:  # also when it died before its first snapshot
+            if view is not None:
+                print(f"Live view of {collection} stopped, restarting")
+                view.stop()
+            view = _live_views[collection] = LiveView(db.collection(collection), LIVE_VIEW_SIZE).start()
+        return view
+
+def page_response(collection, args, to_dict, label_field):
+    """
+    A page for `args` as {"items", "more", "newest_id", "next_start_after"}
+    JSON (a bare array of the items without paging parameters), from the
+    live view when it holds the answer, else from Firestore.
+    `label_field` is "label" (one per doc) or "labels" (a list, top first).
+    """
+    def labels_of(data):
+        value = data.get(label_field)
+        return value if isinstance(value, list) else [value]
+
+    exclude = None
+    if args["exclude"]:
+        exclude = lambda data: str((labels_of(data) or [None])[0] or "").lower() in args["exclude"]
+    match = None
+    if args["labels"] or exclude:
+        match = lambda data: ((not args["labels"] or any(l in args["labels"] for l in labels_of(data)))
+                              and not (exclude and exclude(data)))
+    try:
+        view = get_live_view(collection)
+        page = view.page(args["limit"], start_after=args["start_after"], since=args["since"],
+                         since_id=args["since_id"], match=match) if view is not None else None
+        PAGES.inc(collection=collection, source="memory" if page is not None else "firestore")
+        if page is None:
+            op = "array_contains_any" if label_field == "labels" else "in"
+            page = fetch_page(db.collection(collection), args["limit"], start_after=args["start_after"],
+                              since=args["since"], since_id=args["since_id"],
+                              filters=[(label_field, op, args["labels"])] if args["labels"] else [],
+                              exclude=exclude)
+    except CursorNotFound as e:
+        return jsonify({"error": f"Unknown cursor {e}"}), 400
+    items = [to_dict(doc) for doc in page["docs"]]
+    if not args["paged"]:
+        return jsonify(items)
+    return jsonify({
+        "items": items,
+        "more": page["more"],
+        "newest_id": page["newest_id"],
+        "next_start_after": page["next_start_after"],
+    })
+
 @app.route("/api/images")
 def api_images():
     """
-    Returns all documents in `images` collection, newest first.
+    A page of `snack_classifications`, newest first (see page_args()).
     Includes signed URLs if GCS signing is enabled.
     """
-    docs = (
-        db.collection("snack_classifications")
-        .order_by("timestamp", direction=firestore.Query.DESCENDING)
-        .stream()
-    )
-
-    out = []
-    for doc in docs:
-        data = doc.to_dict() or {}
-        data["id"] = doc.id
+    try:
+        args = page_args()
+    except ValueError:
+        return jsonify({"error": "since must be a unix timestamp"}), 400
+    return page_response("snack_classifications", args, image_dict, label_field="label")
 
-        img = data.get("image_url")
+def image_dict(doc):
+    data = doc.to_dict() or {}
+    data["id"] = doc.id
 
-        # Generate signed URL if gs://
-        if GCS_SIGNED_URL_ENABLED and img and img.startswith("gs://"):
-            try:
-                data["image_signed_url"] = make_signed_url(img)
-            except Exception as e:
-                print("Signed URL error:", e)
-                data["image_signed_url"] = None
-        else:
-            data["image_signed_url"] = img  # pass-through
+    img = data.get("image_url")
 
-        out.append(data)
+    # Generate signed URL if gs://
+    if GCS_SIGNED_URL_ENABLED and img and img.startswith("gs://"):
+        try:
+            data["image_signed_url"] = make_signed_url(img)
+        except Exception as e:
+            print("Signed URL error:", e)
+            data["image_signed_url"] = None
+    else:
+        data["image_signed_url"] = img  # pass-through
 
-    return jsonify(out)
+    return data
 
 
 
@@ -127,24 +248,66 @@ def index():
 @app.route("/api/recordings")
 def api_recordings():
     """
-    Returns all documents in `recordings` collection, newest first.
-    Each doc becomes a dict with id and fields.
+    A page of `recordings`, newest first (see page_args()). ?label= matches
+    any of a recording's labels, ?exclude_label= its top label. Each doc
+    becomes a dict with id and fields.
+    """
+    try:
+        args = page_args()
+    except ValueError:
+        return jsonify({"error": "since must be a unix timestamp"}), 400
+    return page_response("recordings", args, recording_dict, label_field="labels")
+
+def recording_dict(doc):
+    data = doc.to_dict() or {}
+    data["id"] = doc.id
+    # if wav_url is present and is gs://, and signed URLs enabled, convert
+    wav = data.get("wav_url")
+    if GCS_SIGNED_URL_ENABLED and wav and (wav.startswith("gs://") or wav.startswith("gs:/")):
+        try:
+            data["wav_signed_url"] = make_signed_url(wav)
+        except Exception as e:
+            data["wav_signed_url"] = None
+    else:
+        data["wav_signed_url"] = wav
+    return data
+
+_vector_store = None
+
+def get_vector_store():
+    """
+    Read-only view of the embeddings of the model the sound monitor is
+    writing (reopened when that changes), refreshed on each call.
+    """
+    global _vector_store
+    root = active_dir(VECTOR_STORE_DIR)
+    if root is None or not os.path.exists(os.path.join(root, "meta.json")):
+        return None
+    if _vector_store is None or _vector_store.root != root:
+        _vector_store = VectorStore(root, readonly=True)
+    _vector_store.refresh()
+    return _vector_store
+
+@app.route("/api/recordings/<doc_id>/similar")
+def api_similar_recordings(doc_id):
+    """
+    Recordings whose audio embedding is closest to `doc_id`'s, most similar
+    first, each with a `similarity` (cosine) field. ?k= sets how many.
     """
-    docs = db.collection("recordings").order_by("timestamp", direction=firestore.Query.DESCENDING).stream()
+    k = min(request.args.get("k", 5, type=int), 50)
+    store = get_vector_store()
+    vector = store.get(doc_id) if store is not None else None
+    if vector is None:
+        return jsonify({"error": f"No embedding for {doc_id}"}), 404
+    hits = store.search(vector, k=k, exclude={doc_id})
+    refs = [db.collection("recordings").document(hit_id) for hit_id, _, _ in hits]
+    docs = {doc.id: doc for doc in db.get_all(refs) if doc.exists}
     out = []
-    for doc in docs:
-        data = doc.to_dict() or {}
-        data["id"] = doc.id
-        # if wav_url is present and is gs://, and signed URLs enabled, convert
-        wav = data.get("wav_url")
-        if GCS_SIGNED_URL_ENABLED and wav and (wav.startswith("gs://") or wav.startswith("gs:/")):
-            try:
-                data["wav_signed_url"] = make_signed_url(wav)
-            except Exception as e:
-                data["wav_signed_url"] = None
-        else:
-            data["wav_signed_url"] = wav
-        out.append(data)
+    for hit_id, similarity, _ in hits:
+        if hit_id in docs:
+            data = recording_dict(docs[hit_id])
+            data["similarity"] = round(similarity, 4)
+            out.append(data)
     return jsonify(out)
 
 @app.route("/api/thingspeak_dashboard")
@@ -41,30 +41,37 @@ async function startup() {
 }
 
 
+// Newest labeled images; polls only ask for what came after imagesSinceId
+const GALLERY_SIZE = 5;
+let galleryImages = [];
+let imagesSinceId = null;
+
 async function loadImages() {
-  const res = await fetch("/api/images");
-  const data = await res.json();
+  const params = new URLSearchParams({ limit: GALLERY_SIZE, exclude_label: "none" });
+  if (imagesSinceId) params.set("since_id", imagesSinceId);
+  const res = await fetch(`/api/images?${params}`);
+  if (res.status === 400 && imagesSinceId) {
+    // the newest image we had is gone: start over
+    imagesSinceId = null;
+    galleryImages = [];
+    return loadImages();
+  }
+  const page = await res.json();
+  if (!res.ok) return;
+
+  // a delta with `more` skipped some images, but the gallery only needs the newest 5 anyway
+  galleryImages = page.items.concat(page.more ? [] : galleryImages).slice(0, GALLERY_SIZE);
+  imagesSinceId = page.newest_id;
 
   const div = document.getElementById("image-gallery");
   div.innerHTML = "";
 
-  // Filter out images with label "none"
-  let filtered = data.filter(img =>
-    img.label && img.label.toLowerCase() !== "none"
-  );
-
-  // Sort by timestamp newest → oldest
-  filtered = filtered.sort((a, b) => (b.timestamp || 0) - (a.timestamp || 0));
-
-  // Limit to 5 newest
-  filtered = filtered.slice(0, 5);
-
-  if (!filtered.length) {
+  if (!galleryImages.length) {
     div.innerHTML = "<p class='muted'>No labeled images found.</p>";
     return;
   }
 
-  filtered.forEach((img) => {
+  galleryImages.forEach((img) => {
     const ts = new Date((img.timestamp || 0) * 1000).toLocaleString();
     const url = img.image_signed_url || img.image_url || "";
 
@@ -87,38 +94,110 @@ async function loadImages() {
 
 
 // ----------------- Firestore recordings table -----------------
+// Polls prepend only new rows, so playing audio and open "Similar" rows survive a refresh
+const RECORDS_PAGE = 50;
+let recordsNewestId = null;
+let recordsOldestId = null;
+
+async function fetchRecords(params) {
+  const res = await fetch(`/api/recordings?${new URLSearchParams({ limit: RECORDS_PAGE, ...params })}`);
+  return { ok: res.ok, status: res.status, page: await res.json() };
+}
+
 async function loadRecords() {
-  const res = await fetch("/api/recordings");
-  const data = await res.json();
   const tbody = document.querySelector("#records tbody");
-  tbody.innerHTML = "";
-
-  data.forEach((rec) => {
-    const tr = document.createElement("tr");
-
-    const ts = new Date((rec.timestamp || 0) * 1000).toLocaleString();
-    const labels = (rec.labels || []).slice(0, 3).join(", ");
-    const probs = (rec.probs || [])
-      .slice(0, 3)
-      .map((p) => p.toFixed(3))
-      .join(", ");
-    const audioUrl = rec.wav_signed_url || rec.wav_url || "";
-
-    tr.innerHTML = `
-      <td>${ts}<br><span class="muted">${rec.id}</span></td>
-      <td class="labels">${labels}</td>
-      <td>${probs}</td>
-      <td>${
-        audioUrl
-          ? `<audio controls src="${audioUrl}"></audio>`
-          : '<span class="muted">No audio</span>'
-      }</td>
-      <td><a target="_blank" href="https://console.firebase.google.com/project/embedsystem-ef7e5/firestore/databases/-default-/data/~2Frecordings~2F${
-        rec.id
-      }">Open</a></td>
-    `;
-    tbody.appendChild(tr);
+  let res = recordsNewestId ? await fetchRecords({ since_id: recordsNewestId }) : null;
+  if (res && !res.ok && res.status !== 400) return; // transient error: keep the table as it is
+  if (!res || !res.ok || res.page.more) {
+    // first load, a gap too large for one delta, or our newest recording is gone: reload the newest page
+    res = await fetchRecords({});
+    if (!res.ok) return;
+    tbody.innerHTML = "";
+    recordsOldestId = res.page.next_start_after;
+    setLoadOlder(res.page.more);
+  }
+  if (res.page.newest_id) recordsNewestId = res.page.newest_id;
+  tbody.prepend(...res.page.items.map(recordRow));
+}
+
+async function loadOlderRecords() {
+  if (!recordsOldestId) return;
+  const { ok, page } = await fetchRecords({ start_after: recordsOldestId });
+  if (!ok) return;
+  document.querySelector("#records tbody").append(...page.items.map(recordRow));
+  recordsOldestId = page.next_start_after;
+  setLoadOlder(page.more);
+}
+
+function setLoadOlder(more) {
+  document.getElementById("load-older").style.display = more ? "" : "none";
+}
+
+function recordRow(rec) {
+  const tr = document.createElement("tr");
+
+  const ts = new Date((rec.timestamp || 0) * 1000).toLocaleString();
+  const labels = (rec.labels || []).slice(0, 3).join(", ");
+  const probs = (rec.probs || [])
+    .slice(0, 3)
+    .map((p) => p.toFixed(3))
+    .join(", ");
+  const audioUrl = rec.wav_signed_url || rec.wav_url || "";
+
+  tr.innerHTML = `
+    <td>${ts}<br><span class="muted">${rec.id}</span></td>
+    <td class="labels">${labels}</td>
+    <td>${probs}</td>
+    <td>${
+      audioUrl
+        ? `<audio controls src="${audioUrl}"></audio>`
+        : '<span class="muted">No audio</span>'
+    }</td>
+    <td><a target="_blank" href="https://console.firebase.google.com/project/embedsystem-ef7e5/firestore/databases/-default-/data/~2Frecordings~2F${
+      rec.id
+    }">Open</a><br><a href="#" class="similar">Similar</a></td>
+  `;
+  tr.querySelector(".similar").addEventListener("click", (e) => {
+    e.preventDefault();
+    showSimilar(tr, rec.id);
   });
+  return tr;
+}
+
+// Row under `tr` listing the recordings that sound most like `id`
+async function showSimilar(tr, id) {
+  const next = tr.nextElementSibling;
+  if (next && next.classList.contains("similar-row")) {
+    next.remove();
+    return;
+  }
+  const row = document.createElement("tr");
+  row.className = "similar-row";
+  row.innerHTML = '<td colspan="5" class="muted">Searching...</td>';
+  tr.after(row);
+
+  const res = await fetch(`/api/recordings/${encodeURIComponent(id)}/similar?k=5`);
+  const data = await res.json();
+  const cell = row.querySelector("td");
+  if (!res.ok) {
+    cell.textContent = data.error || "Search failed";
+    return;
+  }
+  if (data.length === 0) {
+    cell.textContent = "No similar recordings yet.";
+    return;
+  }
+  cell.classList.remove("muted");
+  cell.innerHTML = data
+    .map((rec) => {
+      const ts = new Date((rec.timestamp || 0) * 1000).toLocaleString();
+      const labels = (rec.labels || []).slice(0, 3).join(", ");
+      const audioUrl = rec.wav_signed_url || rec.wav_url || "";
+      return `<div>${rec.similarity.toFixed(3)} &middot; ${ts} &middot; ${labels} ${
+        audioUrl ? `<audio controls src="${audioUrl}"></audio>` : ""
+      }</div>`;
+    })
+    .join("");
 }
 
 // ----------------- ThingSpeak dashboard -----------------